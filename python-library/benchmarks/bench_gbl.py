@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for gbl.py.
+
+Measures parse, index, encode, build, CRC and round-trip throughput and peak
+memory over the sample files in gbl-tool-cli/src/main/assets and over
+generated images (a single huge PROG tag, many tiny tags) from 1 KiB up to
+256 MiB. Each time is also stored relative to a fixed reference workload
+timed in the same process right before it, and those ratios are what
+--compare checks, so a baseline from one machine can be compared on
+another. Results are written as JSON and can be compared against a stored
+baseline; a case that got slower or bigger than the threshold is reported
+as a regression and makes the script exit with status 1.
+
+Usage:
+    python benchmarks/bench_gbl.py --quick --output results.json
+    python benchmarks/bench_gbl.py --quick --compare benchmarks/baseline.json
+    python benchmarks/bench_gbl.py --quick --output benchmarks/baseline.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import struct
+import sys
+import time
+import tracemalloc
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from gbl import Gbl, GblBuilder, create_end_tag_with_crc  # noqa: E402
+
+ASSETS = os.path.join(HERE, os.pardir, os.pardir, "gbl-tool-cli", "src", "main", "assets")
+SAMPLES = ["empty", "simple_gbl", "bootloader_prog_gbl", "compressed_prog_gbl", "encrypted_gbl", "se_upgrade_gbl"]
+
+KIB = 1024
+MIB = 1024 * KIB
+FULL_SIZES = [1 * KIB, 64 * KIB, 1 * MIB, 16 * MIB, 256 * MIB]
+QUICK_SIZES = [1 * KIB, 64 * KIB, 1 * MIB]
+TINY_TAG_PAYLOAD = 16
+
+
+def huge_prog_builder(size: int) -> GblBuilder:
+    builder = GblBuilder.create()
+    builder.application(version=0x10000)
+    builder.prog(0x08000000, os.urandom(size))
+    return builder
+
+
+def tiny_tags_builder(size: int) -> GblBuilder:
+    builder = GblBuilder.create()
+    for i in range(max(1, size // (8 + TINY_TAG_PAYLOAD))):
+        builder.metadata(i.to_bytes(TINY_TAG_PAYLOAD, 'little'))
+    return builder
+
+
+def cases(sizes: List[int]) -> List[Tuple[str, bytes, Optional[Callable[[], GblBuilder]]]]:
+    result = []
+    for name in SAMPLES:
+        path = os.path.join(ASSETS, name + ".gbl")
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                result.append((f"sample/{name}", f.read(), None))
+
+    for size in sizes:
+        builder = huge_prog_builder(size)
+        result.append((f"huge_prog/{_size_name(size)}", builder.build_to_byte_array(), lambda b=builder: b))
+        if size <= 16 * MIB:
+            builder = tiny_tags_builder(size)
+            result.append((f"tiny_tags/{_size_name(size)}", builder.build_to_byte_array(), lambda b=builder: b))
+    return result
+
+
+def operations(data: bytes, builder: Optional[Callable[[], GblBuilder]]) -> Dict[str, Callable[[], object]]:
+    gbl = Gbl()
+    tags = gbl.parse_byte_array(data).result_list
+
+    def round_trip():
+        encoded = gbl.encode(gbl.parse_byte_array(data).result_list)
+        if encoded != data:
+            raise AssertionError("round trip is not byte-exact")
+
+    ops = {
+        "parse": lambda: gbl.parse_byte_array(data),
+        "index": lambda: gbl.index_byte_array(data),
+        "encode": lambda: gbl.encode(tags),
+        "crc": lambda: create_end_tag_with_crc(tags),
+    }
+    if tags and tags[-1].tag_type.name == "END":
+        ops["round_trip"] = round_trip
+    if builder is not None:
+        ops["build"] = lambda: builder().build_to_byte_array()
+    return ops
+
+
+def measure(func: Callable[[], object], repeat: int, min_time: float) -> Tuple[float, int]:
+    times = []
+    start = time.perf_counter()
+    while len(times) < repeat or (time.perf_counter() - start < min_time and len(times) < 1000):
+        gc.collect()
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Best of the runs: the fastest run is the least disturbed by other load.
+    return min(times), peak
+
+
+_REFERENCE_DATA = bytes(range(256)) * (256 * KIB // 256)
+
+
+def reference_workload() -> None:
+    """
+    Fixed mix of the work the parser does - header unpacking in a Python
+    loop, many small objects kept alive, slicing and CRC32 - independent
+    of gbl.py, so its time tracks the speed of the machine, interpreter
+    and allocator only.
+    """
+    data = _REFERENCE_DATA
+    unpack_from = struct.unpack_from
+    for _ in range(8):
+        records = []
+        for offset in range(0, len(data), 64):
+            tag_id, length = unpack_from('<II', data, offset)
+            records.append((tag_id, length, data[offset + 8:offset + 64]))
+        zlib.crc32(b''.join(record[2] for record in records))
+
+
+def run(sizes: List[int], repeat: int, min_time: float, only: Optional[str]) -> Dict:
+    results = []
+    references = []
+    for case, data, builder in cases(sizes):
+        if only and only not in case:
+            continue
+        for op, func in operations(data, builder).items():
+            # The reference is timed right before each case: on a shared
+            # host the speed drifts during a run.
+            reference, _ = measure(reference_workload, 3, 0.0)
+            references.append(reference)
+            seconds, peak = measure(func, repeat, min_time)
+            results.append({
+                "case": case,
+                "op": op,
+                "bytes": len(data),
+                "seconds": seconds,
+                "relative": seconds / reference,
+                "mb_per_s": len(data) / seconds / 1e6 if seconds else None,
+                "peak_bytes": peak,
+            })
+            print(f"{case:<28}{op:<12}{len(data):>12}{seconds * 1000:>12.3f} ms"
+                  f"{results[-1]['mb_per_s'] or 0:>12.1f} MB/s{peak / KIB:>12.0f} KiB", file=sys.stderr)
+
+    reference = sorted(references)[len(references) // 2] if references else None
+    print(f"{'reference (median)':<40}{(reference or 0) * 1000:>12.3f} ms", file=sys.stderr)
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "system": platform.system(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "reference_seconds": reference,
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float, noise_floor: float = 0.0) -> List[str]:
+    """
+    Returns one line per (case, op) whose time relative to the reference
+    workload, or whose peak memory, grew by more than threshold (a
+    fraction) against the baseline. Slowdowns that come to less than
+    noise_floor seconds in the current run are ignored.
+    """
+    if "reference_seconds" not in baseline["meta"]:
+        raise ValueError("Baseline has no relative timings; regenerate it with --output")
+    previous = {(r["case"], r["op"]): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        old = previous.get((result["case"], result["op"]))
+        if old is None:
+            continue
+        for metric in ("relative", "peak_bytes"):
+            if metric == "relative" and result["seconds"] * (1 - old[metric] / result[metric]) < noise_floor:
+                continue
+            if old[metric] and result[metric] > old[metric] * (1 + threshold):
+                change = result[metric] / old[metric] - 1
+                regressions.append(f"{result['case']} {result['op']} {metric}: "
+                                   f"{old[metric]:.6g} -> {result[metric]:.6g} (+{change:.0%})")
+    return regressions
+
+
+def _size_name(size: int) -> str:
+    return f"{size // MIB}MiB" if size >= MIB else f"{size // KIB}KiB"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark suite for gbl.py.")
+    parser.add_argument("--quick", action="store_true", help="generated images up to 1 MiB only")
+    parser.add_argument("--repeat", type=int, default=5, help="minimum timed runs per case")
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum seconds per case")
+    parser.add_argument("--only", help="run cases whose name contains this text")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown or memory growth before a regression (fraction)")
+    parser.add_argument("--noise-floor", type=float, default=0.001,
+                        help="ignore slowdowns smaller than this many seconds")
+    args = parser.parse_args(argv)
+
+    current = run(QUICK_SIZES if args.quick else FULL_SIZES, args.repeat, args.min_time, args.only)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+            f.write("\n")
+    else:
+        json.dump(current, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        try:
+            regressions = compare(current, baseline, args.threshold, args.noise_floor)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 2
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+        print("No regressions against baseline.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
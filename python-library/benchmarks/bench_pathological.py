@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Pathological-input benchmark for the GBL parser.
+
+Parses adversarial images of growing size and prints the time and peak
+memory per tag, with and without ParseLimits. Time per tag should stay flat
+as the input grows (linear parsing), and with limits the peak memory should
+stay bounded no matter how large the input is.
+
+Usage: python benchmarks/bench_pathological.py [--max-tags N]
+"""
+
+import argparse
+import os
+import struct
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from gbl import Gbl, GblType, ParseLimits, ParseResultFatal  # noqa: E402
+
+
+def zero_length_unknown(count: int) -> bytes:
+    return struct.pack('<II', 0x12345678, 0) * count
+
+
+def zero_length_known(count: int) -> bytes:
+    return struct.pack('<II', GblType.ERASEPROG.value, 0) * count
+
+
+def tiny_metadata(count: int) -> bytes:
+    return (struct.pack('<II', GblType.METADATA.value, 1) + b'M') * count
+
+
+def truncated_huge_tag(count: int) -> bytes:
+    header = struct.pack('<IIII', GblType.HEADER_V3.value, 8, 0x03000000, 0)
+    return header + struct.pack('<II', GblType.PROG.value, 0xFFFFFFF0) + bytes(count * 8)
+
+
+def damaged_capture(count: int) -> bytes:
+    # Tag ids scattered through garbage, none with a consistent length.
+    pattern = struct.pack('<II', GblType.PROG.value, 0xFFFFFF00)
+    return (pattern + bytes(8)) * (count // 2)
+
+
+CASES = {
+    "zero_length_unknown": zero_length_unknown,
+    "zero_length_known": zero_length_known,
+    "tiny_metadata": tiny_metadata,
+    "truncated_huge_tag": truncated_huge_tag,
+    "damaged_capture": damaged_capture,
+}
+
+
+def measure(parse, data: bytes):
+    # Timed and traced separately: tracemalloc slows allocation-heavy code.
+    start = time.perf_counter()
+    result = parse(data)
+    elapsed = time.perf_counter() - start
+    del result
+
+    tracemalloc.start()
+    result = parse(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def describe(result) -> str:
+    if isinstance(result, ParseResultFatal):
+        error = result.error
+        return f"limit {error.limit}" if hasattr(error, 'limit') else "fatal"
+    return f"{len(result.result_list)} tags"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--max-tags", type=int, default=100_000,
+                        help="largest input size, in tags")
+    args = parser.parse_args(argv)
+
+    sizes = []
+    size = 10_000
+    while size <= args.max_tags:
+        sizes.append(size)
+        size *= 10
+
+    limits = ParseLimits(max_tags=50_000, max_total_bytes=64 * 1024 * 1024,
+                         max_tag_length=16 * 1024 * 1024, deadline=5.0)
+    modes = [
+        ("parse", lambda data: Gbl().parse_byte_array(data)),
+        ("parse+limits", lambda data: Gbl(limits).parse_byte_array(data)),
+        ("recover+limits", lambda data: Gbl(limits).recover_byte_array(data)),
+    ]
+
+    print(f"{'case':<22}{'mode':<16}{'tags':>10}{'ms':>10}{'ns/tag':>10}{'peak KiB':>12}  result")
+    for name, generate in CASES.items():
+        for mode, parse in modes:
+            for count in sizes:
+                data = generate(count)
+                result, elapsed, peak = measure(parse, data)
+                print(f"{name:<22}{mode:<16}{count:>10}{elapsed * 1000:>10.1f}"
+                      f"{elapsed * 1e9 / count:>10.0f}{peak / 1024:>12.0f}  {describe(result)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
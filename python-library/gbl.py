@@ -4,12 +4,17 @@ GBL (Gecko Bootloader) Library - Python Implementation
 Converted from Kotlin with maintained functionality and structure.
 """
 
+import hashlib
+import itertools
+import os
 import struct
+import sys
+import time
 import zlib
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
-from typing import List, Optional, Union, Set, Tuple, Any
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 import io
 
 
@@ -33,10 +38,7 @@ class GblType(Enum):
 
     @classmethod
     def from_value(cls, value: int) -> Optional['GblType']:
-        for item in cls:
-            if item.value == value:
-                return item
-        return None
+        return cls._value2member_map_.get(value)
 
 
 class ImageType(Enum):
@@ -54,6 +56,8 @@ class ContainerErrorCode(Enum):
 
 @dataclass
 class TagHeader:
+    __slots__ = ('id', 'length')
+
     id: int
     length: int
 
@@ -63,6 +67,8 @@ class TagHeader:
 
 @dataclass
 class ApplicationData:
+    __slots__ = ('type', 'version', 'capabilities', 'product_id')
+
     type: int
     version: int
     capabilities: int
@@ -79,6 +85,8 @@ class ApplicationData:
 
 @dataclass
 class ApplicationCertificate:
+    __slots__ = ('struct_version', 'flags', 'key', 'version', 'signature')
+
     struct_version: int
     flags: int
     key: int
@@ -93,6 +101,25 @@ class ParseResult:
 @dataclass
 class ParseResultSuccess(ParseResult):
     result_list: List['Tag']
+    stopped_at: Optional[int] = None
+    stop_reason: Optional[str] = None
+    # SHA-256 of the signed range, when requested and a signature tag was found.
+    signed_digest: Optional[bytes] = None
+
+    def verify_signature(self, verify: Callable[[bytes, int, int], bool]) -> bool:
+        """
+        Calls verify(digest, r, s) for the first signature tag. False when
+        there is no signature or no digest was computed.
+        """
+        signature = next((tag for tag in self.result_list if isinstance(tag, GblSignatureEcdsaP256)), None)
+        if signature is None or self.signed_digest is None:
+            return False
+        return bool(verify(self.signed_digest, signature.r, signature.s))
+
+
+@dataclass
+class ParseResultRecovered(ParseResultSuccess):
+    damaged_ranges: List[Tuple[int, int]] = field(default_factory=list)
 
 
 @dataclass
@@ -100,6 +127,89 @@ class ParseResultFatal(ParseResult):
     error: Any = None
 
 
+@dataclass
+class ParseLimits:
+    """
+    Resource limits for parsing untrusted input. None disables a limit.
+    deadline is in seconds from the start of the parse and is checked on the
+    first tag, every check_interval tags and after every
+    DEADLINE_CHECK_BYTES bytes of payload.
+    """
+    max_tags: Optional[int] = None
+    max_total_bytes: Optional[int] = None
+    max_tag_length: Optional[int] = None
+    deadline: Optional[float] = None
+    check_interval: int = 1024
+
+
+class ParseLimitError(Exception):
+    def __init__(self, limit: str, value: Union[int, float], maximum: Union[int, float], offset: int):
+        super().__init__(f"Parse limit {limit} exceeded at offset {offset}: {value} > {maximum}")
+        self.limit = limit
+        self.value = value
+        self.maximum = maximum
+        self.offset = offset
+
+
+# Payload bytes after which the deadline is checked regardless of tag count.
+DEADLINE_CHECK_BYTES = 1 << 20
+
+
+class _LimitGuard:
+    __slots__ = ('limits', 'tags', 'total_bytes', 'deadline', 'unchecked_bytes')
+
+    def __init__(self, limits: ParseLimits):
+        self.limits = limits
+        self.tags = 0
+        self.total_bytes = 0
+        self.unchecked_bytes = 0
+        self.deadline = time.monotonic() + limits.deadline if limits.deadline is not None else None
+
+    def check(self, offset: int, tag_length: int) -> None:
+        limits = self.limits
+        self.tags += 1
+        self.total_bytes += tag_length
+
+        if limits.max_tag_length is not None and tag_length > limits.max_tag_length:
+            raise ParseLimitError('max_tag_length', tag_length, limits.max_tag_length, offset)
+        if limits.max_tags is not None and self.tags > limits.max_tags:
+            raise ParseLimitError('max_tags', self.tags, limits.max_tags, offset)
+        if limits.max_total_bytes is not None and self.total_bytes > limits.max_total_bytes:
+            raise ParseLimitError('max_total_bytes', self.total_bytes, limits.max_total_bytes, offset)
+        if self.deadline is None:
+            return
+        self.unchecked_bytes += tag_length
+        if (self.tags == 1 or self.tags % limits.check_interval == 0
+                or self.unchecked_bytes >= DEADLINE_CHECK_BYTES):
+            self.unchecked_bytes = 0
+            now = time.monotonic()
+            if now > self.deadline:
+                raise ParseLimitError('deadline', now - self.deadline + limits.deadline, limits.deadline, offset)
+
+
+def _limit_guard(limits: Optional[ParseLimits]) -> Optional[_LimitGuard]:
+    return _LimitGuard(limits) if limits is not None else None
+
+
+class GblObserver:
+    """
+    Instrumentation hooks for the parse and build pipelines. Pass an
+    instance to Gbl, GblBuilder, encode_tags or create_end_tag_with_crc;
+    without one no timestamps are taken at all. Times are perf_counter_ns
+    deltas.
+
+    Per-tag stages: 'scan' (header read and payload slice), 'decode' (typed
+    tag construction), 'encode' and 'crc'. Whole-operation stages: 'parse',
+    'encode', 'crc', 'content' (GblBuilder output) and 'read' (file I/O).
+    """
+
+    def on_tag(self, stage: str, tag_id: int, length: int, elapsed_ns: int) -> None:
+        pass
+
+    def on_stage(self, stage: str, size: int, elapsed_ns: int) -> None:
+        pass
+
+
 class ParseTagResult:
     pass
 
@@ -131,6 +241,8 @@ class ContainerResultError(ContainerResult):
 
 
 class Tag(ABC):
+    __slots__ = ('tag_type',)
+
     def __init__(self, tag_type: GblType):
         self.tag_type = tag_type
 
@@ -145,22 +257,74 @@ class Tag(ABC):
         return bytes()
 
 
+def _single_buffer(prefix: bytes, data, tag_data: bytes) -> bytes:
+    """
+    Returns the one buffer a tag keeps for its fixed fields and payload.
+    tag_data is kept when it already holds prefix + data (parser and builder
+    pass both); otherwise it is built from the fields.
+    """
+    if data is None or len(tag_data) == len(prefix) + len(data):
+        return tag_data
+    return prefix + bytes(data)
+
+
 class TagWithHeader(Tag):
+    __slots__ = ('tag_header', 'tag_data', '_origin')
+
     def __init__(self, tag_header: TagHeader, tag_type: GblType, tag_data: bytes):
         super().__init__(tag_type)
         self.tag_header = tag_header
         self.tag_data = tag_data
+        self._origin = None
+
+    @property
+    def source_offset(self) -> Optional[int]:
+        """Offset of the tag header in the parsed source, None if not parsed."""
+        return self._origin[1] if self._origin is not None else None
+
+    @property
+    def is_dirty(self) -> bool:
+        """
+        True unless the tag still matches the bytes it was parsed from:
+        same tag_data object, same header, and fixed fields that agree with
+        the start of tag_data.
+        """
+        origin = self._origin
+        if origin is None:
+            return True
+        _, _, tag_id, tag_data = origin
+        if self.tag_data is not tag_data or self.tag_header.id != tag_id \
+                or self.tag_header.length != len(tag_data):
+            return True
+        fixed = self._fixed_fields()
+        return bool(fixed) and tag_data[:len(fixed)] != fixed
+
+    def mark_dirty(self) -> None:
+        self._origin = None
+
+    def _set_origin(self, token: int, offset: int) -> None:
+        self._origin = (token, offset, self.tag_header.id, self.tag_data)
+
+    def _fixed_fields(self) -> bytes:
+        return b''
 
 
 class DefaultTag(TagWithHeader):
+    __slots__ = ()
+
     def __init__(self, tag_header: TagHeader, tag_type: GblType, tag_data: bytes):
         super().__init__(tag_header, tag_type, tag_data)
 
     def copy(self) -> 'DefaultTag':
         return DefaultTag(self.tag_header, self.tag_type, bytes())
 
+    def _generate_tag_data(self) -> bytes:
+        return self.tag_data
+
 
 class GblHeader(TagWithHeader):
+    __slots__ = ('version', 'gbl_type')
+
     def __init__(self, tag_header: TagHeader, tag_type: GblType, version: int, gbl_type: int, tag_data: bytes):
         super().__init__(tag_header, tag_type, tag_data)
         self.version = version
@@ -172,24 +336,46 @@ class GblHeader(TagWithHeader):
     def _generate_tag_data(self) -> bytes:
         return struct.pack('<II', self.version, self.gbl_type)
 
+    def _fixed_fields(self) -> bytes:
+        return struct.pack('<II', self.version, self.gbl_type)
+
 
 class GblBootloader(TagWithHeader):
+    __slots__ = ('bootloader_version', 'address')
+
     def __init__(self, tag_header: TagHeader, tag_type: GblType, bootloader_version: int,
-                 address: int, data: bytes, tag_data: bytes):
-        super().__init__(tag_header, tag_type, tag_data)
+                 address: int, data: Optional[bytes], tag_data: bytes):
+        super().__init__(tag_header, tag_type,
+                         _single_buffer(struct.pack('<II', bootloader_version, address), data, tag_data))
         self.bootloader_version = bootloader_version
         self.address = address
-        self.data = data
+
+    @property
+    def data(self) -> bytes:
+        return bytes(self.data_view)
+
+    @data.setter
+    def data(self, value: bytes) -> None:
+        self.tag_data = struct.pack('<II', self.bootloader_version, self.address) + bytes(value)
+
+    @property
+    def data_view(self) -> memoryview:
+        return memoryview(self.tag_data)[8:]
 
     def copy(self) -> 'GblBootloader':
         return GblBootloader(self.tag_header, self.tag_type, self.bootloader_version,
-                             self.address, self.data, bytes())
+                             self.address, None, self.tag_data)
 
     def _generate_tag_data(self) -> bytes:
-        return struct.pack('<II', self.bootloader_version, self.address) + self.data
+        return struct.pack('<II', self.bootloader_version, self.address) + self.data_view
+
+    def _fixed_fields(self) -> bytes:
+        return struct.pack('<II', self.bootloader_version, self.address)
 
 
 class GblApplication(TagWithHeader):
+    __slots__ = ('application_data',)
+
     def __init__(self, tag_header: TagHeader, tag_type: GblType, application_data: ApplicationData, tag_data: bytes):
         super().__init__(tag_header, tag_type, tag_data)
         self.application_data = application_data
@@ -204,30 +390,57 @@ class GblApplication(TagWithHeader):
             result += remaining_data
         return result
 
+    def _fixed_fields(self) -> bytes:
+        return self.application_data.content()
+
 
 class GblProg(TagWithHeader):
+    __slots__ = ('flash_start_address',)
+
     def __init__(self, tag_header: TagHeader, tag_type: GblType, flash_start_address: int,
-                 data: bytes, tag_data: bytes):
-        super().__init__(tag_header, tag_type, tag_data)
+                 data: Optional[bytes], tag_data: bytes):
+        super().__init__(tag_header, tag_type,
+                         _single_buffer(struct.pack('<I', flash_start_address), data, tag_data))
         self.flash_start_address = flash_start_address
-        self.data = data
+
+    @property
+    def data(self) -> bytes:
+        return bytes(self.data_view)
+
+    @data.setter
+    def data(self, value: bytes) -> None:
+        self.tag_data = struct.pack('<I', self.flash_start_address) + bytes(value)
+
+    @property
+    def data_view(self) -> memoryview:
+        return memoryview(self.tag_data)[4:]
 
     def copy(self) -> 'GblProg':
-        return GblProg(self.tag_header, self.tag_type, self.flash_start_address, self.data, bytes())
+        return GblProg(self.tag_header, self.tag_type, self.flash_start_address, None, self.tag_data)
 
     def _generate_tag_data(self) -> bytes:
-        return struct.pack('<I', self.flash_start_address) + self.data
+        return struct.pack('<I', self.flash_start_address) + self.data_view
+
+    def _fixed_fields(self) -> bytes:
+        return struct.pack('<I', self.flash_start_address)
 
 
 class GblEraseProg(TagWithHeader):
+    __slots__ = ()
+
     def __init__(self, tag_header: TagHeader, tag_type: GblType, tag_data: bytes):
         super().__init__(tag_header, tag_type, tag_data)
 
     def copy(self) -> 'GblEraseProg':
         return GblEraseProg(self.tag_header, self.tag_type, bytes())
 
+    def _generate_tag_data(self) -> bytes:
+        return self.tag_data
+
 
 class GblEnd(TagWithHeader):
+    __slots__ = ('gbl_crc',)
+
     def __init__(self, tag_header: TagHeader, tag_type: GblType, gbl_crc: int, tag_data: bytes):
         super().__init__(tag_header, tag_type, tag_data)
         self.gbl_crc = gbl_crc
@@ -238,52 +451,97 @@ class GblEnd(TagWithHeader):
     def _generate_tag_data(self) -> bytes:
         return struct.pack('<I', self.gbl_crc)
 
+    def _fixed_fields(self) -> bytes:
+        return struct.pack('<I', self.gbl_crc)
+
 
 class GblMetadata(TagWithHeader):
-    def __init__(self, tag_header: TagHeader, tag_type: GblType, meta_data: bytes, tag_data: bytes):
-        super().__init__(tag_header, tag_type, tag_data)
-        self.meta_data = meta_data
+    __slots__ = ()
+
+    def __init__(self, tag_header: TagHeader, tag_type: GblType, meta_data: Optional[bytes], tag_data: bytes):
+        super().__init__(tag_header, tag_type, _single_buffer(b'', meta_data, tag_data))
+
+    @property
+    def meta_data(self) -> bytes:
+        return bytes(self.tag_data)
+
+    @meta_data.setter
+    def meta_data(self, value: bytes) -> None:
+        self.tag_data = bytes(value)
+
+    @property
+    def meta_data_view(self) -> memoryview:
+        return memoryview(self.tag_data)
 
     def copy(self) -> 'GblMetadata':
-        return GblMetadata(self.tag_header, self.tag_type, self.meta_data, bytes())
+        return GblMetadata(self.tag_header, self.tag_type, None, self.tag_data)
 
     def _generate_tag_data(self) -> bytes:
-        return self.meta_data
+        return self.tag_data
 
 
 class GblSeUpgrade(TagWithHeader):
+    __slots__ = ('blob_size', 'version')
+
     def __init__(self, tag_header: TagHeader, tag_type: GblType, blob_size: int,
-                 version: int, data: bytes, tag_data: bytes):
-        super().__init__(tag_header, tag_type, tag_data)
+                 version: int, data: Optional[bytes], tag_data: bytes):
+        super().__init__(tag_header, tag_type,
+                         _single_buffer(struct.pack('<II', blob_size, version), data, tag_data))
         self.blob_size = blob_size
         self.version = version
-        self.data = data
+
+    @property
+    def data(self) -> bytes:
+        return bytes(self.data_view)
+
+    @data.setter
+    def data(self, value: bytes) -> None:
+        self.tag_data = struct.pack('<II', self.blob_size, self.version) + bytes(value)
+
+    @property
+    def data_view(self) -> memoryview:
+        return memoryview(self.tag_data)[8:]
 
     def copy(self) -> 'GblSeUpgrade':
         return GblSeUpgrade(self.tag_header, self.tag_type, self.blob_size,
-                            self.version, self.data, bytes())
+                            self.version, None, self.tag_data)
 
     def _generate_tag_data(self) -> bytes:
-        return struct.pack('<II', self.blob_size, self.version) + self.data
+        return struct.pack('<II', self.blob_size, self.version) + self.data_view
+
+    def _fixed_fields(self) -> bytes:
+        return struct.pack('<II', self.blob_size, self.version)
 
 
 class GblProgLz4(TagWithHeader):
+    __slots__ = ()
+
     def __init__(self, tag_header: TagHeader, tag_type: GblType, tag_data: bytes):
         super().__init__(tag_header, tag_type, tag_data)
 
     def copy(self) -> 'GblProgLz4':
         return GblProgLz4(self.tag_header, self.tag_type, bytes())
 
+    def _generate_tag_data(self) -> bytes:
+        return self.tag_data
+
 
 class GblProgLzma(TagWithHeader):
+    __slots__ = ()
+
     def __init__(self, tag_header: TagHeader, tag_type: GblType, tag_data: bytes):
         super().__init__(tag_header, tag_type, tag_data)
 
     def copy(self) -> 'GblProgLzma':
         return GblProgLzma(self.tag_header, self.tag_type, bytes())
 
+    def _generate_tag_data(self) -> bytes:
+        return self.tag_data
+
 
 class GblCertificateEcdsaP256(TagWithHeader):
+    __slots__ = ('certificate',)
+
     def __init__(self, tag_header: TagHeader, tag_type: GblType, tag_data: bytes,
                  certificate: ApplicationCertificate):
         super().__init__(tag_header, tag_type, tag_data)
@@ -300,8 +558,20 @@ class GblCertificateEcdsaP256(TagWithHeader):
                            self.certificate.version,
                            self.certificate.signature)
 
+    def _fixed_fields(self) -> bytes:
+        return self._generate_tag_data()
+
 
 class GblSignatureEcdsaP256(TagWithHeader):
+    """
+    r and s are the big-endian values of the two 32-byte signature halves.
+    The legacy 2-byte form with one byte each is still read and written.
+    """
+    __slots__ = ('r', 's')
+
+    COMPONENT_SIZE = 32
+    LEGACY_COMPONENT_SIZE = 1
+
     def __init__(self, tag_header: TagHeader, tag_type: GblType, tag_data: bytes, r: int, s: int):
         super().__init__(tag_header, tag_type, tag_data)
         self.r = r
@@ -311,34 +581,73 @@ class GblSignatureEcdsaP256(TagWithHeader):
         return GblSignatureEcdsaP256(self.tag_header, self.tag_type, self.tag_data, self.r, self.s)
 
     def _generate_tag_data(self) -> bytes:
+        if self.tag_header.length >= 2 * self.COMPONENT_SIZE:
+            return self.r.to_bytes(self.COMPONENT_SIZE, 'big') + self.s.to_bytes(self.COMPONENT_SIZE, 'big')
         return struct.pack('<BB', self.r, self.s)
 
+    def _fixed_fields(self) -> bytes:
+        return self._generate_tag_data()
+
 
 class GblEncryptionData(TagWithHeader):
+    """
+    The whole payload is ciphertext: encrypted_gbl_data is tag_data.
+    """
+    __slots__ = ()
+
     def __init__(self, tag_header: TagHeader, tag_type: GblType, tag_data: bytes,
-                 encrypted_gbl_data: bytes):
-        super().__init__(tag_header, tag_type, tag_data)
-        self.encrypted_gbl_data = encrypted_gbl_data
+                 encrypted_gbl_data: Optional[bytes]):
+        super().__init__(tag_header, tag_type, _single_buffer(b'', encrypted_gbl_data, tag_data))
+
+    @property
+    def encrypted_gbl_data(self) -> bytes:
+        return bytes(self.encrypted_gbl_data_view)
+
+    @encrypted_gbl_data.setter
+    def encrypted_gbl_data(self, value: bytes) -> None:
+        self.tag_data = bytes(value)
+
+    @property
+    def encrypted_gbl_data_view(self) -> memoryview:
+        return memoryview(self.tag_data)
 
     def copy(self) -> 'GblEncryptionData':
-        return GblEncryptionData(self.tag_header, self.tag_type, self.tag_data, self.encrypted_gbl_data)
+        return GblEncryptionData(self.tag_header, self.tag_type, self.tag_data, None)
 
     def _generate_tag_data(self) -> bytes:
-        return self.encrypted_gbl_data
+        return bytes(self.tag_data)
 
 
 class GblEncryptionInitAesCcm(TagWithHeader):
+    """
+    nonce is the integer value of the nonce bytes read big-endian. Tags of
+    16 bytes or more carry the 12-byte AES-CCM nonce; the 5-byte form with
+    a single nonce byte is still read and written.
+    """
+    __slots__ = ('msg_len', 'nonce')
+
+    NONCE_SIZE = 12
+    LEGACY_NONCE_SIZE = 1
+
     def __init__(self, tag_header: TagHeader, tag_type: GblType, tag_data: bytes,
                  msg_len: int, nonce: int):
         super().__init__(tag_header, tag_type, tag_data)
         self.msg_len = msg_len
         self.nonce = nonce
 
+    @property
+    def nonce_bytes(self) -> bytes:
+        size = self.NONCE_SIZE if self.tag_header.length >= 4 + self.NONCE_SIZE else self.LEGACY_NONCE_SIZE
+        return self.nonce.to_bytes(size, 'big')
+
     def copy(self) -> 'GblEncryptionInitAesCcm':
         return GblEncryptionInitAesCcm(self.tag_header, self.tag_type, bytes(), self.msg_len, self.nonce)
 
     def _generate_tag_data(self) -> bytes:
-        return struct.pack('<IB', self.msg_len, self.nonce)
+        return struct.pack('<I', self.msg_len) + self.nonce_bytes
+
+    def _fixed_fields(self) -> bytes:
+        return self._generate_tag_data()
 
 
 def parse_tag(byte_array: bytes, offset: int = 0) -> ParseTagResult:
@@ -361,10 +670,396 @@ def parse_tag(byte_array: bytes, offset: int = 0) -> ParseTagResult:
     return ParseTagResultSuccess(tag_header=tag_header, tag_data=tag_data)
 
 
+_PARSE_ORIGINS = itertools.count(1)
+
+
+def mark_parsed(tags: Iterable[Tuple[Tag, Optional[int]]]) -> Iterator[Tag]:
+    """
+    Yields the tags of (tag, source offset) pairs marked as one unmodified
+    parse, as if read from those offsets of a single image, so encoding them
+    passes their bytes and the END CRC through. Tags with no offset stay
+    dirty. Only use it for tags known to hold the bytes read from those
+    offsets; otherwise the passed-through END CRC is wrong.
+    """
+    origin = next(_PARSE_ORIGINS)
+    for tag, offset in tags:
+        if offset is not None and isinstance(tag, TagWithHeader):
+            tag._set_origin(origin, offset)
+        yield tag
+
+
+@dataclass
+class TagIndexEntry:
+    __slots__ = ('offset', 'id', 'length')
+
+    offset: int
+    id: int
+    length: int
+
+    @property
+    def tag_type(self) -> Optional[GblType]:
+        return GblType.from_value(self.id)
+
+    @property
+    def data_offset(self) -> int:
+        return self.offset + 8
+
+    @property
+    def end(self) -> int:
+        return self.offset + 8 + self.length
+
+
+def scan_tags(byte_array, offset: int = 0,
+              limits: Optional[ParseLimits] = None) -> Tuple[List[TagIndexEntry], int]:
+    """
+    Header-only walk over the tag boundaries of a GBL image. Works on any
+    buffer (bytes, memoryview, mmap) without copying tag payloads.
+    Returns the entries and the offset where the walk stopped; raises
+    ParseLimitError when limits are exceeded.
+    """
+    size = len(byte_array)
+    entries = []
+    unpack_from = struct.unpack_from
+    guard = _limit_guard(limits)
+
+    while offset + 8 <= size:
+        tag_id, tag_length = unpack_from('<II', byte_array, offset)
+        if offset + 8 + tag_length > size:
+            break
+        if guard is not None:
+            guard.check(offset, tag_length)
+        entries.append(TagIndexEntry(offset, tag_id, tag_length))
+        offset += 8 + tag_length
+
+    return entries, offset
+
+
+# Smallest payload each known tag type needs to be decoded.
+TAG_MIN_LENGTHS = {
+    GblType.HEADER_V3.value: 8,
+    GblType.BOOTLOADER.value: 8,
+    GblType.APPLICATION.value: 13,
+    GblType.PROG.value: 4,
+    GblType.SE_UPGRADE.value: 8,
+    GblType.END.value: 4,
+    GblType.ENCRYPTION_INIT.value: 5,
+    GblType.SIGNATURE_ECDSA_P256.value: 2,
+    GblType.CERTIFICATE_ECDSA_P256.value: 8,
+}
+
+KNOWN_TAG_IDS = frozenset(item.value for item in GblType if item != GblType.TAG)
+
+# Tag id -> (struct format, field names) of the fixed fields in front of the payload.
+FIXED_FIELDS: Dict[int, Tuple[str, Tuple[str, ...]]] = {
+    GblType.HEADER_V3.value: ('<II', ('version', 'gbl_type')),
+    GblType.APPLICATION.value: ('<IIIB', ('type', 'version', 'capabilities', 'product_id')),
+    GblType.BOOTLOADER.value: ('<II', ('bootloader_version', 'address')),
+    GblType.PROG.value: ('<I', ('flash_start_address',)),
+    GblType.PROG_LZ4.value: ('<II', ('flash_start_address', 'decompressed_size')),
+    GblType.PROG_LZMA.value: ('<II', ('flash_start_address', 'decompressed_size')),
+    GblType.SE_UPGRADE.value: ('<II', ('blob_size', 'version')),
+    GblType.END.value: ('<I', ('gbl_crc',)),
+    GblType.ENCRYPTION_INIT.value: ('<I', ('msg_len',)),
+}
+
+# Tag id -> (address field, size field) of the tags written to flash. A size
+# field of None means the payload after the fixed fields is written as is.
+FLASH_LAYOUTS: Dict[int, Tuple[str, Optional[str]]] = {
+    GblType.PROG.value: ('flash_start_address', None),
+    GblType.PROG_LZ4.value: ('flash_start_address', 'decompressed_size'),
+    GblType.PROG_LZMA.value: ('flash_start_address', 'decompressed_size'),
+    GblType.BOOTLOADER.value: ('address', None),
+}
+
+
+def fixed_field_offset(tag_id: int, name: str) -> int:
+    """
+    Payload offset of the fixed field name of tag_id, see FIXED_FIELDS.
+    """
+    fmt, names = FIXED_FIELDS[tag_id]
+    return struct.calcsize(fmt[:names.index(name) + 1])
+
+
+# Tag id -> payload offset of the little-endian u32 flash address.
+FLASH_ADDRESS_OFFSETS: Dict[int, int] = {
+    tag_id: fixed_field_offset(tag_id, address) for tag_id, (address, _) in FLASH_LAYOUTS.items()
+}
+
+
+class TagIdFinder:
+    """
+    Finds the next occurrence of any known tag id in a buffer. Each id is
+    searched with bytes.find and its next hit is cached, so scanning a
+    damaged region touches it once per id instead of once per byte.
+    """
+
+    def __init__(self, byte_array):
+        self.byte_array = byte_array if hasattr(byte_array, 'find') else bytes(byte_array)
+        self._patterns = [struct.pack('<I', tag_id) for tag_id in sorted(KNOWN_TAG_IDS)]
+        self._next = [-1] * len(self._patterns)
+
+    def find(self, start: int) -> int:
+        best = -1
+        for i, pattern in enumerate(self._patterns):
+            position = self._next[i]
+            if position != -2 and position < start:
+                position = self.byte_array.find(pattern, start)
+                self._next[i] = position if position >= 0 else -2
+            if position >= 0 and (best < 0 or position < best):
+                best = position
+        return best
+
+
+def plausible_tag(byte_array, offset: int) -> bool:
+    """
+    True when a known tag header at offset has a length that fits in the
+    buffer and is large enough for the tag's fixed fields.
+    """
+    if offset + 8 > len(byte_array):
+        return False
+    tag_id, tag_length = struct.unpack_from('<II', byte_array, offset)
+    return tag_id in KNOWN_TAG_IDS and TAG_MIN_LENGTHS.get(tag_id, 0) <= tag_length \
+        and offset + 8 + tag_length <= len(byte_array)
+
+
+def _consistent_tag(byte_array, offset: int, chained: bool) -> bool:
+    """
+    Length-consistency check for recovery. A known tag reached by following
+    a valid chain only has to fit. Unknown tags in the chain, and every
+    resynchronization candidate (which must be a known tag), also have to be
+    followed by the end of the buffer or another plausible tag.
+    """
+    size = len(byte_array)
+    if offset + 8 > size:
+        return False
+    tag_id, tag_length = struct.unpack_from('<II', byte_array, offset)
+    end = offset + 8 + tag_length
+    if end > size or TAG_MIN_LENGTHS.get(tag_id, 0) > tag_length:
+        return False
+    known = tag_id in KNOWN_TAG_IDS
+    if chained and known:
+        return True
+    if not chained and not known:
+        return False
+    return end == size or tag_id == GblType.END.value or plausible_tag(byte_array, end)
+
+
+def recover_tags(byte_array, limits: Optional[ParseLimits] = None) -> Tuple[List['Tag'], List[Tuple[int, int]]]:
+    """
+    Parses as many tags as possible from a truncated or corrupted image.
+    Whenever the tag chain breaks, scans forward for the next known tag id
+    that passes a length-consistency check. Returns the recovered tags and
+    the [start, end) byte ranges that were skipped.
+    """
+    size = len(byte_array)
+    guard = _limit_guard(limits)
+    finder = TagIdFinder(byte_array)
+    origin = next(_PARSE_ORIGINS)
+    tags = []
+    damaged = []
+    offset = 0
+    chained = True
+
+    while offset < size:
+        if _consistent_tag(byte_array, offset, chained):
+            tag_id, tag_length = struct.unpack_from('<II', byte_array, offset)
+            if guard is not None:
+                guard.check(offset, tag_length)
+            data = bytes(byte_array[offset + 8:offset + 8 + tag_length])
+            tag = parse_tag_type(tag_id=tag_id, length=tag_length, byte_array=data)
+            tag._set_origin(origin, offset)
+            tags.append(tag)
+            offset += 8 + tag_length
+            chained = True
+            continue
+
+        damage_start = offset
+        candidate = finder.find(offset + 1)
+        while candidate >= 0 and not _consistent_tag(byte_array, candidate, False):
+            candidate = finder.find(candidate + 1)
+
+        if candidate < 0:
+            damaged.append((damage_start, size))
+            break
+        damaged.append((damage_start, candidate))
+        offset = candidate
+        chained = False
+
+    return tags, damaged
+
+
+class GblIndex(ParseResult):
+    """
+    Lazy view of a GBL image: tag boundaries plus the small fixed fields of
+    the header, application and end tags. Tags are decoded on demand from
+    the source buffer.
+    """
+
+    SIDECAR_MAGIC = b'GBLX'
+    SIDECAR_VERSION = 1
+    SIDECAR_SUFFIX = '.gblidx'
+
+    _SIDECAR_HEADER = struct.Struct('<4sHHQqII')
+    _SIDECAR_FIELDS = struct.Struct('<IIIIIBI')
+    _SIDECAR_ENTRY = struct.Struct('<QII')
+
+    _FLAG_HEADER = 0x01
+    _FLAG_APPLICATION = 0x02
+    _FLAG_END = 0x04
+    _FLAG_CRC_VALID = 0x08
+
+    def __init__(self, entries: List[TagIndexEntry], size: int, source=None, path: Optional[str] = None):
+        self.entries = entries
+        self.size = size
+        self.source = source
+        self.path = path
+        self.header_version: Optional[int] = None
+        self.gbl_type: Optional[int] = None
+        self.application: Optional[ApplicationData] = None
+        self.gbl_crc: Optional[int] = None
+        self.computed_crc: Optional[int] = None
+        self.crc_valid: Optional[bool] = None
+        self._origin = next(_PARSE_ORIGINS)
+
+    @classmethod
+    def from_byte_array(cls, byte_array, limits: Optional[ParseLimits] = None) -> 'GblIndex':
+        entries, _ = scan_tags(byte_array, limits=limits)
+        index = cls(entries, len(byte_array), byte_array)
+
+        for entry in entries:
+            start = entry.data_offset
+            if entry.id == GblType.HEADER_V3.value and entry.length >= 8:
+                index.header_version, index.gbl_type = struct.unpack_from('<II', byte_array, start)
+            elif entry.id == GblType.APPLICATION.value and entry.length >= 13:
+                index.application = ApplicationData(*struct.unpack_from('<IIIB', byte_array, start))
+            elif entry.id == GblType.END.value and entry.length >= 4:
+                index.gbl_crc = struct.unpack_from('<I', byte_array, start)[0]
+
+        return index
+
+    def verify_crc(self) -> bool:
+        """
+        Computes the CRC over everything up to the END tag payload and
+        compares it with the stored value. Needs the source data.
+        """
+        if self.source is None:
+            raise ValueError("Index is detached from its source data")
+
+        end_entries = self.find(GblType.END)
+        if not end_entries or self.gbl_crc is None:
+            self.crc_valid = False
+            return False
+
+        crc_range = memoryview(self.source)[:end_entries[-1].data_offset]
+        self.computed_crc = zlib.crc32(crc_range) & 0xFFFFFFFF
+        self.crc_valid = self.computed_crc == self.gbl_crc
+        return self.crc_valid
+
+    def to_sidecar_bytes(self, mtime_ns: int) -> bytes:
+        flags = 0
+        if self.header_version is not None:
+            flags |= self._FLAG_HEADER
+        if self.application is not None:
+            flags |= self._FLAG_APPLICATION
+        if self.gbl_crc is not None:
+            flags |= self._FLAG_END
+        if self.crc_valid:
+            flags |= self._FLAG_CRC_VALID
+
+        application = self.application or ApplicationData(0, 0, 0, 0)
+        buffer = io.BytesIO()
+        buffer.write(self._SIDECAR_HEADER.pack(
+            self.SIDECAR_MAGIC, self.SIDECAR_VERSION, flags, self.size, mtime_ns,
+            self.computed_crc or 0, len(self.entries)
+        ))
+        buffer.write(self._SIDECAR_FIELDS.pack(
+            self.header_version or 0, self.gbl_type or 0,
+            application.type, application.version, application.capabilities, application.product_id,
+            self.gbl_crc or 0
+        ))
+        for entry in self.entries:
+            buffer.write(self._SIDECAR_ENTRY.pack(entry.offset, entry.id, entry.length))
+
+        body = buffer.getvalue()
+        return body + struct.pack('<I', zlib.crc32(body) & 0xFFFFFFFF)
+
+    @classmethod
+    def from_sidecar_bytes(cls, data: bytes, size: int, mtime_ns: int,
+                           path: Optional[str] = None) -> Optional['GblIndex']:
+        """
+        Restores an index written by to_sidecar_bytes. Returns None when the
+        sidecar is damaged, from another format version, or does not match
+        the given file size and modification time.
+        """
+        fixed_size = cls._SIDECAR_HEADER.size + cls._SIDECAR_FIELDS.size
+        if len(data) < fixed_size + 4:
+            return None
+        if struct.unpack_from('<I', data, len(data) - 4)[0] != zlib.crc32(data[:-4]) & 0xFFFFFFFF:
+            return None
+
+        magic, version, flags, file_size, file_mtime_ns, computed_crc, count = \
+            cls._SIDECAR_HEADER.unpack_from(data, 0)
+        if magic != cls.SIDECAR_MAGIC or version != cls.SIDECAR_VERSION:
+            return None
+        if file_size != size or file_mtime_ns != mtime_ns:
+            return None
+        if len(data) != fixed_size + count * cls._SIDECAR_ENTRY.size + 4:
+            return None
+
+        header_version, gbl_type, app_type, app_version, app_capabilities, app_product_id, gbl_crc = \
+            cls._SIDECAR_FIELDS.unpack_from(data, cls._SIDECAR_HEADER.size)
+        entries = [TagIndexEntry(*fields) for fields in
+                   cls._SIDECAR_ENTRY.iter_unpack(data[fixed_size:len(data) - 4])]
+
+        index = cls(entries, file_size, path=path)
+        if flags & cls._FLAG_HEADER:
+            index.header_version, index.gbl_type = header_version, gbl_type
+        if flags & cls._FLAG_APPLICATION:
+            index.application = ApplicationData(app_type, app_version, app_capabilities, app_product_id)
+        if flags & cls._FLAG_END:
+            index.gbl_crc = gbl_crc
+            index.computed_crc = computed_crc
+            index.crc_valid = bool(flags & cls._FLAG_CRC_VALID)
+        return index
+
+    @property
+    def payload_bytes(self) -> int:
+        return sum(entry.length for entry in self.entries)
+
+    def find(self, tag_type: GblType) -> List[TagIndexEntry]:
+        return [entry for entry in self.entries if entry.id == tag_type.value]
+
+    def tag_data(self, position: int) -> bytes:
+        entry = self.entries[position]
+        if self.source is not None:
+            return bytes(self.source[entry.data_offset:entry.end])
+        if self.path is not None:
+            with open(self.path, 'rb') as f:
+                f.seek(entry.data_offset)
+                return f.read(entry.length)
+        raise ValueError("Index is detached from its source data")
+
+    def tag(self, position: int) -> 'Tag':
+        entry = self.entries[position]
+        tag = parse_tag_type(tag_id=entry.id, length=entry.length, byte_array=self.tag_data(position))
+        if isinstance(tag, TagWithHeader):
+            tag._set_origin(self._origin, entry.offset)
+        return tag
+
+    def tags(self) -> List['Tag']:
+        return [self.tag(position) for position in range(len(self.entries))]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
 def parse_tag_type(tag_id: int, length: int, byte_array: bytes) -> Tag:
     tag_type = GblType.from_value(tag_id)
     tag_header = TagHeader(id=tag_id, length=length)
 
+    if tag_type is None:
+        return DefaultTag(tag_header, GblType.TAG, byte_array)
+
     if tag_type == GblType.HEADER_V3:
         version = struct.unpack('<I', byte_array[0:4])[0]
         gbl_type = struct.unpack('<I', byte_array[4:8])[0]
@@ -373,8 +1068,7 @@ def parse_tag_type(tag_id: int, length: int, byte_array: bytes) -> Tag:
     elif tag_type == GblType.BOOTLOADER:
         bootloader_version = struct.unpack('<I', byte_array[0:4])[0]
         address = struct.unpack('<I', byte_array[4:8])[0]
-        data = byte_array[8:]
-        return GblBootloader(tag_header, tag_type, bootloader_version, address, data, byte_array)
+        return GblBootloader(tag_header, tag_type, bootloader_version, address, None, byte_array)
 
     elif tag_type == GblType.APPLICATION:
         app_type = struct.unpack('<I', byte_array[0:4])[0]
@@ -385,12 +1079,11 @@ def parse_tag_type(tag_id: int, length: int, byte_array: bytes) -> Tag:
         return GblApplication(tag_header, tag_type, app_data, byte_array)
 
     elif tag_type == GblType.METADATA:
-        return GblMetadata(tag_header, tag_type, byte_array, byte_array)
+        return GblMetadata(tag_header, tag_type, None, byte_array)
 
     elif tag_type == GblType.PROG:
         flash_start_address = struct.unpack('<I', byte_array[0:4])[0]
-        data = byte_array[4:]
-        return GblProg(tag_header, tag_type, flash_start_address, data, byte_array)
+        return GblProg(tag_header, tag_type, flash_start_address, None, byte_array)
 
     elif tag_type == GblType.PROG_LZ4:
         return GblProgLz4(tag_header, tag_type, byte_array)
@@ -404,25 +1097,31 @@ def parse_tag_type(tag_id: int, length: int, byte_array: bytes) -> Tag:
     elif tag_type == GblType.SE_UPGRADE:
         blob_size = struct.unpack('<I', byte_array[0:4])[0]
         version = struct.unpack('<I', byte_array[4:8])[0]
-        data = byte_array[8:]
-        return GblSeUpgrade(tag_header, tag_type, blob_size, version, data, byte_array)
+        return GblSeUpgrade(tag_header, tag_type, blob_size, version, None, byte_array)
 
     elif tag_type == GblType.END:
         gbl_crc = struct.unpack('<I', byte_array[0:4])[0]
         return GblEnd(tag_header, tag_type, gbl_crc, byte_array)
 
     elif tag_type == GblType.ENCRYPTION_DATA:
-        encrypted_data = byte_array[8:] if len(byte_array) > 8 else byte_array
-        return GblEncryptionData(tag_header, tag_type, byte_array, encrypted_data)
+        return GblEncryptionData(tag_header, tag_type, byte_array, None)
 
     elif tag_type == GblType.ENCRYPTION_INIT:
         msg_len = struct.unpack('<I', byte_array[0:4])[0]
-        nonce = byte_array[4]
+        if len(byte_array) >= 4 + GblEncryptionInitAesCcm.NONCE_SIZE:
+            nonce = int.from_bytes(byte_array[4:4 + GblEncryptionInitAesCcm.NONCE_SIZE], 'big')
+        else:
+            nonce = byte_array[4]
         return GblEncryptionInitAesCcm(tag_header, tag_type, byte_array, msg_len, nonce)
 
     elif tag_type == GblType.SIGNATURE_ECDSA_P256:
-        r = byte_array[0]
-        s = byte_array[1]
+        size = GblSignatureEcdsaP256.COMPONENT_SIZE
+        if len(byte_array) >= 2 * size:
+            r = int.from_bytes(byte_array[0:size], 'big')
+            s = int.from_bytes(byte_array[size:2 * size], 'big')
+        else:
+            r = byte_array[0]
+            s = byte_array[1]
         return GblSignatureEcdsaP256(tag_header, tag_type, byte_array, r, s)
 
     elif tag_type == GblType.CERTIFICATE_ECDSA_P256:
@@ -439,51 +1138,208 @@ def parse_tag_type(tag_id: int, length: int, byte_array: bytes) -> Tag:
         return DefaultTag(tag_header, GblType.TAG, byte_array)
 
 
+class TagStreamParser:
+    """
+    Incremental (push) parser for a GBL byte stream. feed() takes data as it
+    arrives, in chunks of any size, and returns the tags it completed;
+    close() marks the end of the stream. Tags carry source offsets like
+    those from Gbl.parse_byte_array, so an unmodified stream parse encodes
+    back to the original bytes. Limits are checked as soon as a tag header
+    arrives, before its payload is buffered; exceeding one raises
+    ParseLimitError. With signed_digest set, the SHA-256 of the signed range
+    is computed as tags complete and read from the signed_digest property.
+    """
+
+    # Consumed bytes are dropped from the buffer once they exceed this size.
+    COMPACT_SIZE = 64 * 1024
+    # Payloads at least this large are collected as a list of chunks and
+    # joined once, instead of growing the buffer.
+    LARGE_TAG_SIZE = 1024 * 1024
+
+    def __init__(self, limits: Optional[ParseLimits] = None, observer: Optional[GblObserver] = None,
+                 signed_digest: bool = False):
+        self._buffer = bytearray()
+        self._start = 0
+        self._checked = -1
+        self._large: Optional[Tuple[int, int, List[bytes]]] = None
+        self._large_received = 0
+        self._origin = next(_PARSE_ORIGINS)
+        self._guard = _limit_guard(limits)
+        self._signed_range = SignedRangeHash() if signed_digest else None
+        self.observer = observer
+        self.offset = 0
+        self.received = 0
+        self.stop_reason: Optional[str] = None
+        self.closed = False
+
+    @property
+    def buffered(self) -> int:
+        """Bytes received but not yet returned as tags."""
+        if self._large is not None:
+            return 8 + self._large_received
+        return len(self._buffer) - self._start
+
+    @property
+    def needed(self) -> int:
+        """Bytes still missing to complete the next tag (at least 1)."""
+        if self._large is not None:
+            return self._large[1] - self._large_received
+        available = self.buffered
+        if available < 8:
+            return 8 - available
+        length = struct.unpack_from('<I', self._buffer, self._start + 4)[0]
+        return max(1, 8 + length - available)
+
+    def feed(self, data) -> List[Tag]:
+        if self.closed:
+            raise ValueError("feed() after close()")
+        if self.stop_reason is not None:
+            return []
+
+        self.received += len(data)
+        tags: List[Tag] = []
+
+        if self._large is not None:
+            tag_id, length, chunks = self._large
+            take = min(length - self._large_received, len(data))
+            chunks.append(bytes(data[:take]))
+            self._large_received += take
+            if self._large_received < length:
+                return tags
+            self._large = None
+            if not self._emit(tag_id, length, b''.join(chunks), tags):
+                return tags
+            data = data[take:]
+
+        buffer = self._buffer
+        buffer += data
+        start = self._start
+        size = len(buffer)
+        guard = self._guard
+
+        while start + 8 <= size:
+            tag_id, length = struct.unpack_from('<II', buffer, start)
+            if guard is not None and self._checked != self.offset:
+                guard.check(self.offset, length)
+                self._checked = self.offset
+            end = start + 8 + length
+            if end > size:
+                if length >= self.LARGE_TAG_SIZE:
+                    with memoryview(buffer) as view:
+                        self._large = (tag_id, length, [bytes(view[start + 8:size])])
+                    self._large_received = size - start - 8
+                    start = size
+                break
+
+            with memoryview(buffer) as view:
+                payload = bytes(view[start + 8:end])
+            if not self._emit(tag_id, length, payload, tags):
+                break
+            start = end
+
+        if start >= self.COMPACT_SIZE or start == size:
+            del buffer[:start]
+            start = 0
+        self._start = start
+        return tags
+
+    def _emit(self, tag_id: int, length: int, payload: bytes, tags: List[Tag]) -> bool:
+        observer = self.observer
+        if observer is not None:
+            t0 = time.perf_counter_ns()
+        try:
+            tag = parse_tag_type(tag_id, length, payload)
+        except Exception as e:
+            self.stop_reason = f"Failed to decode tag 0x{tag_id:08X}: {e}"
+            return False
+        if observer is not None:
+            observer.on_tag('decode', tag_id, length, time.perf_counter_ns() - t0)
+
+        if isinstance(tag, TagWithHeader):
+            tag._set_origin(self._origin, self.offset)
+        if self._signed_range is not None:
+            self._signed_range.update(tag_id, self.offset, struct.pack('<II', tag_id, length), payload)
+        tags.append(tag)
+        self.offset += 8 + length
+        return True
+
+    def close(self) -> Optional[str]:
+        """
+        Ends the stream. Returns why parsing stopped early, or None if the
+        stream ended exactly at a tag boundary.
+        """
+        self.closed = True
+        if self.stop_reason is None and self.buffered:
+            if self._large is not None:
+                self.stop_reason = f"Invalid tag length: {self._large[1]}"
+            elif self.buffered < 8:
+                self.stop_reason = f"Invalid offset: {self.offset}"
+            else:
+                length = struct.unpack_from('<I', self._buffer, self._start + 4)[0]
+                self.stop_reason = f"Invalid tag length: {length}"
+        self._buffer = bytearray()
+        self._start = 0
+        self._large = None
+        return self.stop_reason
+
+    @property
+    def stopped_at(self) -> Optional[int]:
+        return self.offset if self.stop_reason is not None else None
+
+    @property
+    def signed_digest(self) -> Optional[bytes]:
+        return self._signed_range.digest if self._signed_range is not None else None
+
+
 def generate_tag_data(tag: Tag) -> bytes:
+    if isinstance(tag, TagWithHeader) and not tag.is_dirty:
+        return tag.tag_data
     if hasattr(tag, '_generate_tag_data'):
         return tag._generate_tag_data()
     return bytes()
 
 
-def encode_tags(tags: List[Tag]) -> bytes:
-    TAG_ID_SIZE = 4
-    TAG_LENGTH_SIZE = 4
-
-    total_size = sum(TAG_ID_SIZE + TAG_LENGTH_SIZE + tag.tag_header.length
-                     for tag in tags if isinstance(tag, TagWithHeader))
-
-    buffer = io.BytesIO()
+def encode_tags(tags: List[Tag], observer: Optional[GblObserver] = None) -> bytes:
+    parts = []
+    if observer is not None:
+        start = time.perf_counter_ns()
 
     for tag in tags:
         if not isinstance(tag, TagWithHeader):
             continue
 
-        buffer.write(struct.pack('<I', tag.tag_header.id))
-        buffer.write(struct.pack('<I', tag.tag_header.length))
-
-        tag_data = generate_tag_data(tag)
-        buffer.write(tag_data)
+        if observer is not None:
+            t0 = time.perf_counter_ns()
+        parts.append(struct.pack('<II', tag.tag_header.id, tag.tag_header.length))
+        parts.append(generate_tag_data(tag))
+        if observer is not None:
+            observer.on_tag('encode', tag.tag_header.id, tag.tag_header.length, time.perf_counter_ns() - t0)
 
-    return buffer.getvalue()
+    result = b''.join(parts)
+    if observer is not None:
+        observer.on_stage('encode', len(result), time.perf_counter_ns() - start)
+    return result
 
 
-def create_end_tag_with_crc(tags: List[Tag]) -> GblEnd:
-    TAG_ID_SIZE = 4
+def create_end_tag_with_crc(tags: List[Tag], observer: Optional[GblObserver] = None) -> GblEnd:
     TAG_LENGTH_SIZE = 4
 
     crc = zlib.crc32(b'')
+    if observer is not None:
+        start = time.perf_counter_ns()
+        total = 0
 
     for tag in tags:
         if not isinstance(tag, TagWithHeader):
             continue
 
-        tag_id_bytes = struct.pack('<I', tag.tag_header.id)
-        tag_length_bytes = struct.pack('<I', tag.tag_header.length)
-        tag_data = generate_tag_data(tag)
-
-        crc = zlib.crc32(tag_id_bytes, crc)
-        crc = zlib.crc32(tag_length_bytes, crc)
-        crc = zlib.crc32(tag_data, crc)
+        if observer is not None:
+            t0 = time.perf_counter_ns()
+        crc = zlib.crc32(struct.pack('<II', tag.tag_header.id, tag.tag_header.length), crc)
+        crc = zlib.crc32(generate_tag_data(tag), crc)
+        if observer is not None:
+            observer.on_tag('crc', tag.tag_header.id, tag.tag_header.length, time.perf_counter_ns() - t0)
+            total += 8 + tag.tag_header.length
 
     end_tag_id = GblType.END.value
     end_tag_length = TAG_LENGTH_SIZE
@@ -496,6 +1352,8 @@ def create_end_tag_with_crc(tags: List[Tag]) -> GblEnd:
 
     crc_value = crc & 0xFFFFFFFF
     crc_bytes = struct.pack('<I', crc_value)
+    if observer is not None:
+        observer.on_stage('crc', total + 8, time.perf_counter_ns() - start)
 
     return GblEnd(
         tag_header=TagHeader(id=GblType.END.value, length=TAG_LENGTH_SIZE),
@@ -505,6 +1363,82 @@ def create_end_tag_with_crc(tags: List[Tag]) -> GblEnd:
     )
 
 
+def signature_tag(r: int, s: int) -> GblSignatureEcdsaP256:
+    """
+    Returns a 64-byte SIGNATURE_ECDSA_P256 tag.
+    """
+    size = GblSignatureEcdsaP256.COMPONENT_SIZE
+    tag_data = r.to_bytes(size, 'big') + s.to_bytes(size, 'big')
+    return GblSignatureEcdsaP256(
+        tag_header=TagHeader(id=GblType.SIGNATURE_ECDSA_P256.value, length=len(tag_data)),
+        tag_type=GblType.SIGNATURE_ECDSA_P256,
+        tag_data=tag_data,
+        r=r,
+        s=s
+    )
+
+
+class SignedRangeHash:
+    """
+    SHA-256 of the signed range of an image: every byte before the first
+    SIGNATURE_ECDSA_P256 tag. Parsers and encoders feed it each tag's bytes
+    as they pass them; digest is set when the signature tag is reached.
+    """
+    __slots__ = ('_sha', 'digest', 'signature_offset')
+
+    def __init__(self):
+        self._sha = hashlib.sha256()
+        self.digest: Optional[bytes] = None
+        self.signature_offset: Optional[int] = None
+
+    def update(self, tag_id: int, offset: int, *chunks) -> None:
+        """
+        Adds the tag at offset, given as its encoded bytes in one or more
+        chunks (header included).
+        """
+        if self.digest is not None:
+            return
+        if tag_id == GblType.SIGNATURE_ECDSA_P256.value:
+            self.digest = self._sha.digest()
+            self.signature_offset = offset
+            return
+        for chunk in chunks:
+            self._sha.update(chunk)
+
+    def finish(self, offset: int) -> bytes:
+        """
+        Ends the range at offset when no signature tag was seen, e.g. to
+        sign an image before its signature tag is added.
+        """
+        if self.digest is None:
+            self.digest = self._sha.digest()
+            self.signature_offset = offset
+        return self.digest
+
+
+def passthrough_end_tag(tags: List[Tag]) -> Optional[GblEnd]:
+    """
+    Returns the original END tag when tags are an unmodified, complete and
+    in-order parse of one source, so its CRC can be reused as is.
+    """
+    if not tags or not isinstance(tags[-1], GblEnd):
+        return None
+
+    token = None
+    expected_offset = 0
+    for tag in tags:
+        if not isinstance(tag, TagWithHeader) or tag.is_dirty:
+            return None
+        tag_token, offset, _, _ = tag._origin
+        if token is None:
+            token = tag_token
+        if tag_token != token or offset != expected_offset:
+            return None
+        expected_offset = offset + 8 + tag.tag_header.length
+
+    return tags[-1]
+
+
 class Container(ABC):
     @abstractmethod
     def create(self) -> ContainerResult:
@@ -534,9 +1468,10 @@ class TagContainer(Container):
     HEADER_GBL_TYPE = 0
     PROTECTED_TAG_TYPES = {GblType.HEADER_V3, GblType.END}
 
-    def __init__(self):
+    def __init__(self, observer: Optional[GblObserver] = None):
         self._content: Set[Tag] = set()
         self.is_created = False
+        self.observer = observer
 
     def create(self) -> ContainerResult:
         try:
@@ -653,13 +1588,19 @@ class TagContainer(Container):
                     ContainerErrorCode.CONTAINER_NOT_CREATED
                 )
 
+            observer = self.observer
+            if observer is not None:
+                start = time.perf_counter_ns()
+
             tags_result = self.build()
             if isinstance(tags_result, ContainerResultSuccess):
                 tags_without_end = [tag for tag in tags_result.data if not isinstance(tag, GblEnd)]
-                end_tag = create_end_tag_with_crc(tags_without_end)
+                end_tag = create_end_tag_with_crc(tags_without_end, observer)
                 final_tags = tags_without_end + [end_tag]
 
-                byte_array = encode_tags(final_tags)
+                byte_array = encode_tags(final_tags, observer)
+                if observer is not None:
+                    observer.on_stage('content', len(byte_array), time.perf_counter_ns() - start)
                 return ContainerResultSuccess(byte_array)
             else:
                 return ContainerResultError(
@@ -743,41 +1684,60 @@ class TagContainer(Container):
 
 
 class GblBuilder:
-    def __init__(self):
-        self.container = TagContainer()
+    def __init__(self, observer: Optional[GblObserver] = None):
+        self.container = TagContainer(observer)
 
     @classmethod
-    def create(cls) -> 'GblBuilder':
-        builder = cls()
+    def create(cls, observer: Optional[GblObserver] = None) -> 'GblBuilder':
+        builder = cls(observer)
         builder.container.create()
         return builder
 
     @classmethod
-    def empty(cls) -> 'GblBuilder':
-        return cls()
+    def empty(cls, observer: Optional[GblObserver] = None) -> 'GblBuilder':
+        return cls(observer)
 
     def encryption_data(self, encrypted_gbl_data: bytes) -> 'GblBuilder':
         tag = GblEncryptionData(
             tag_header=TagHeader(id=GblType.ENCRYPTION_DATA.value, length=len(encrypted_gbl_data)),
             tag_type=GblType.ENCRYPTION_DATA,
-            tag_data=encrypted_gbl_data.copy(),
+            tag_data=bytes(encrypted_gbl_data),
             encrypted_gbl_data=encrypted_gbl_data
         )
         self.container.add(tag)
         return self
 
-    def encryption_init(self, msg_len: int, nonce: int) -> 'GblBuilder':
+    def encryption_init(self, msg_len: int, nonce: Union[int, bytes]) -> 'GblBuilder':
+        """
+        nonce is the 12-byte AES-CCM nonce, or an int for the legacy
+        single-byte form.
+        """
+        if isinstance(nonce, int):
+            nonce_data = struct.pack('<B', nonce)
+        elif len(nonce) == GblEncryptionInitAesCcm.NONCE_SIZE:
+            nonce_data = bytes(nonce)
+        else:
+            raise ValueError(f"Nonce must be {GblEncryptionInitAesCcm.NONCE_SIZE} bytes, got {len(nonce)}")
+
+        tag_data = struct.pack('<I', msg_len) + nonce_data
         tag = GblEncryptionInitAesCcm(
-            tag_header=TagHeader(id=GblType.ENCRYPTION_INIT.value, length=5),
+            tag_header=TagHeader(id=GblType.ENCRYPTION_INIT.value, length=len(tag_data)),
             tag_type=GblType.ENCRYPTION_INIT,
-            tag_data=struct.pack('<IB', msg_len, nonce),
+            tag_data=tag_data,
             msg_len=msg_len,
-            nonce=nonce
+            nonce=int.from_bytes(nonce_data, 'big')
         )
         self.container.add(tag)
         return self
 
     def signature_ecdsa_p256(self, r: int, s: int) -> 'GblBuilder':
+        """
+        Writes the 64-byte signature, or the legacy 2-byte form when both
+        values fit in one byte.
+        """
+        if r > 0xFF or s > 0xFF:
+            self.container.add(signature_tag(r, s))
+            return self
         tag = GblSignatureEcdsaP256(
             tag_header=TagHeader(id=GblType.SIGNATURE_ECDSA_P256.value, length=2),
             tag_type=GblType.SIGNATURE_ECDSA_P256,
@@ -809,7 +1769,7 @@ class GblBuilder:
         tag = DefaultTag(
             tag_header=TagHeader(id=GblType.VERSION_DEPENDENCY.value, length=len(dependency_data)),
             tag_type=GblType.VERSION_DEPENDENCY,
-            tag_data=dependency_data.copy()
+            tag_data=bytes(dependency_data)
         )
         self.container.add(tag)
         return self
@@ -822,7 +1782,7 @@ class GblBuilder:
             tag_type=GblType.BOOTLOADER,
             bootloader_version=bootloader_version,
             address=address,
-            data=data,
+            data=None,
             tag_data=tag_data
         )
         self.container.add(tag)
@@ -832,8 +1792,8 @@ class GblBuilder:
         tag = GblMetadata(
             tag_header=TagHeader(id=GblType.METADATA.value, length=len(meta_data)),
             tag_type=GblType.METADATA,
-            meta_data=meta_data,
-            tag_data=meta_data.copy()
+            meta_data=None,
+            tag_data=bytes(meta_data)
         )
         self.container.add(tag)
         return self
@@ -845,7 +1805,7 @@ class GblBuilder:
             tag_header=TagHeader(id=GblType.PROG.value, length=4 + len(data)),
             tag_type=GblType.PROG,
             flash_start_address=flash_start_address,
-            data=data,
+            data=None,
             tag_data=tag_data
         )
         self.container.add(tag)
@@ -882,7 +1842,7 @@ class GblBuilder:
             tag_type=GblType.SE_UPGRADE,
             blob_size=blob_size,
             version=version,
-            data=data,
+            data=None,
             tag_data=tag_data
         )
         self.container.add(tag)
@@ -924,12 +1884,12 @@ class GblBuilder:
     def build_to_list(self) -> List[Tag]:
         tags = self._get_or_default([])
         tags_without_end = [tag for tag in tags if not isinstance(tag, GblEnd)]
-        end_tag = create_end_tag_with_crc(tags_without_end)
+        end_tag = create_end_tag_with_crc(tags_without_end, self.container.observer)
         return tags_without_end + [end_tag]
 
     def build_to_byte_array(self) -> bytes:
         tags = self.build_to_list()
-        return encode_tags(tags)
+        return encode_tags(tags, self.container.observer)
 
     def has_tag(self, tag_type: GblType) -> bool:
         return self.container.has_tag(tag_type)
@@ -964,46 +1924,188 @@ class Gbl:
     TAG_ID_SIZE = 4
     TAG_LENGTH_SIZE = 4
 
-    def parse_byte_array(self, byte_array: bytes) -> ParseResult:
+    def __init__(self, limits: Optional[ParseLimits] = None, observer: Optional[GblObserver] = None,
+                 signed_digest: bool = False):
+        self.limits = limits
+        self.observer = observer
+        self.signed_digest = signed_digest
+
+    def parse_byte_array(self, byte_array: bytes, limits: Optional[ParseLimits] = None) -> ParseResult:
+        """
+        With signed_digest set, the SHA-256 of the signed range is computed
+        during the parse and returned as result.signed_digest.
+        """
         offset = 0
         size = len(byte_array)
         raw_tags = []
+        origin = next(_PARSE_ORIGINS)
+        guard = _limit_guard(limits or self.limits)
+        observer = self.observer
+        signed_range = SignedRangeHash() if self.signed_digest else None
+        if observer is not None:
+            start = time.perf_counter_ns()
 
         if len(byte_array) < self.HEADER_SIZE:
             return ParseResultFatal(
                 f"File is too small to be a valid gbl file. Expected at least {self.HEADER_SIZE} bytes, got {len(byte_array)} bytes."
             )
 
+        stop_reason = None
+
         while offset < size:
+            if observer is not None:
+                t0 = time.perf_counter_ns()
+            if guard is not None and offset + 8 <= size:
+                # Check the header before parse_tag copies the payload.
+                _, tag_length = struct.unpack_from('<II', byte_array, offset)
+                if offset + 8 + tag_length <= size:
+                    try:
+                        guard.check(offset, tag_length)
+                    except ParseLimitError as e:
+                        return ParseResultFatal(e)
             result = parse_tag(byte_array, offset)
 
             if isinstance(result, ParseTagResultFatal):
+                stop_reason = result.error
                 break
 
             if isinstance(result, ParseTagResultSuccess):
                 header, data = result.tag_header, result.tag_data
 
                 try:
+                    if observer is not None:
+                        t1 = time.perf_counter_ns()
                     parsed_tag = parse_tag_type(
                         tag_id=header.id,
                         length=header.length,
                         byte_array=data
                     )
+                    if observer is not None:
+                        t2 = time.perf_counter_ns()
+                        observer.on_tag('scan', header.id, header.length, t1 - t0)
+                        observer.on_tag('decode', header.id, header.length, t2 - t1)
 
+                    if isinstance(parsed_tag, TagWithHeader):
+                        parsed_tag._set_origin(origin, offset)
                     raw_tags.append(parsed_tag)
 
-                    offset += self.TAG_ID_SIZE + self.TAG_LENGTH_SIZE + header.length
+                    end = offset + self.TAG_ID_SIZE + self.TAG_LENGTH_SIZE + header.length
+                    if signed_range is not None and signed_range.digest is None:
+                        with memoryview(byte_array) as view:
+                            signed_range.update(header.id, offset, view[offset:end])
+                    offset = end
 
                 except Exception as e:
+                    stop_reason = f"Failed to decode tag 0x{header.id:08X}: {e}"
                     break
 
-        return ParseResultSuccess(raw_tags)
+        if observer is not None:
+            observer.on_stage('parse', offset, time.perf_counter_ns() - start)
+        digest = signed_range.digest if signed_range is not None else None
+        if stop_reason is None:
+            return ParseResultSuccess(raw_tags, signed_digest=digest)
+        return ParseResultSuccess(raw_tags, stopped_at=offset, stop_reason=stop_reason, signed_digest=digest)
+
+    def recover_byte_array(self, byte_array, limits: Optional[ParseLimits] = None) -> ParseResult:
+        """
+        Recovery-mode parse for truncated or corrupted images, see recover_tags.
+        """
+        if len(byte_array) < self.HEADER_SIZE:
+            return ParseResultFatal(
+                f"File is too small to be a valid gbl file. Expected at least {self.HEADER_SIZE} bytes, got {len(byte_array)} bytes."
+            )
+
+        try:
+            tags, damaged_ranges = recover_tags(byte_array, limits or self.limits)
+        except ParseLimitError as e:
+            return ParseResultFatal(e)
+        stopped_at = damaged_ranges[0][0] if damaged_ranges else None
+        stop_reason = f"{len(damaged_ranges)} damaged range(s)" if damaged_ranges else None
+        return ParseResultRecovered(tags, stopped_at, stop_reason, damaged_ranges=damaged_ranges)
+
+    def index_byte_array(self, byte_array, limits: Optional[ParseLimits] = None) -> ParseResult:
+        if len(byte_array) < self.HEADER_SIZE:
+            return ParseResultFatal(
+                f"File is too small to be a valid gbl file. Expected at least {self.HEADER_SIZE} bytes, got {len(byte_array)} bytes."
+            )
+
+        try:
+            return GblIndex.from_byte_array(byte_array, limits or self.limits)
+        except ParseLimitError as e:
+            return ParseResultFatal(e)
+
+    def index_file(self, path, use_sidecar: bool = True, sidecar_dir: Optional[str] = None) -> ParseResult:
+        """
+        Indexes a GBL file. When use_sidecar is set, a valid sidecar index
+        (next to the file, or in sidecar_dir) is loaded instead of reading the
+        file; otherwise the file is scanned, its CRC verified and a fresh
+        sidecar written.
+        """
+        path = os.fspath(path)
+        st = os.stat(path)
+        sidecar_path = self.sidecar_path(path, sidecar_dir)
+
+        if use_sidecar:
+            try:
+                with open(sidecar_path, 'rb') as f:
+                    sidecar = f.read()
+            except OSError:
+                sidecar = None
+
+            if sidecar is not None:
+                index = GblIndex.from_sidecar_bytes(sidecar, st.st_size, st.st_mtime_ns, path=path)
+                if index is not None:
+                    return index
+
+        if self.observer is not None:
+            start = time.perf_counter_ns()
+        with open(path, 'rb') as f:
+            byte_array = f.read()
+        if self.observer is not None:
+            self.observer.on_stage('read', len(byte_array), time.perf_counter_ns() - start)
+
+        result = self.index_byte_array(byte_array)
+        if not isinstance(result, GblIndex):
+            return result
+
+        result.path = path
+        result.verify_crc()
+
+        if use_sidecar and os.stat(path).st_mtime_ns == st.st_mtime_ns:
+            try:
+                if sidecar_dir is not None:
+                    os.makedirs(sidecar_dir, exist_ok=True)
+                temp_path = f"{sidecar_path}.{os.getpid()}.tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(result.to_sidecar_bytes(st.st_mtime_ns))
+                os.replace(temp_path, sidecar_path)
+            except OSError:
+                pass
+
+        return result
+
+    @staticmethod
+    def sidecar_path(path, sidecar_dir: Optional[str] = None) -> str:
+        path = os.fspath(path)
+        if sidecar_dir is None:
+            return path + GblIndex.SIDECAR_SUFFIX
+
+        key = hashlib.sha1(os.path.realpath(path).encode('utf-8')).hexdigest()
+        return os.path.join(sidecar_dir, key + GblIndex.SIDECAR_SUFFIX)
 
     def encode(self, tags: List[Tag]) -> bytes:
+        """
+        Encodes tags with a freshly computed END tag. Unmodified parsed tags
+        are written from their original bytes, and when the whole list is an
+        unmodified parse the original END tag and CRC are kept.
+        """
+        if passthrough_end_tag(tags) is not None:
+            return encode_tags(tags, self.observer)
+
         tags_without_end = [tag for tag in tags if not isinstance(tag, GblEnd)]
-        end_tag = create_end_tag_with_crc(tags_without_end)
+        end_tag = create_end_tag_with_crc(tags_without_end, self.observer)
         final_tags = tags_without_end + [end_tag]
-        return encode_tags(final_tags)
+        return encode_tags(final_tags, self.observer)
 
     @property
     def GblBuilder(self):
@@ -1073,4 +2175,6 @@ def test_gbl_parsing():
 
 
 if __name__ == "__main__":
-    test_gbl_parsing()
\ No newline at end of file
+    # The command-line tool lives in gbl_cli, which imports gbl by name.
+    from gbl_cli import main
+    sys.exit(main())
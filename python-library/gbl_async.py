@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+GBL asyncio API - parses tags incrementally from an asyncio.StreamReader and
+writes GBL images to an asyncio.StreamWriter with flow control. CRC work on
+large payloads runs in an executor so the event loop stays responsive.
+"""
+
+import asyncio
+import functools
+import inspect
+import struct
+import zlib
+from concurrent.futures import Executor
+from typing import AsyncIterator, Callable, List, Optional, Tuple, TypeVar
+
+from gbl import (GblBuilder, GblEnd, GblObserver, GblType, ParseLimitError, ParseLimits,
+                 ParseResult, ParseResultFatal, ParseResultSuccess, SignedRangeHash, Tag,
+                 TagStreamParser, TagWithHeader, generate_tag_data, passthrough_end_tag, signature_tag)
+
+READ_CHUNK_SIZE = 64 * 1024
+WRITE_CHUNK_SIZE = 256 * 1024
+# Payloads at least this large are processed in the executor.
+OFFLOAD_THRESHOLD = 1024 * 1024
+
+T = TypeVar('T')
+
+
+async def offload(func: Callable[..., T], *args, size: int, executor: Optional[Executor] = None,
+                  threshold: int = OFFLOAD_THRESHOLD) -> T:
+    """
+    Runs func(*args) inline when size is below threshold, otherwise in
+    executor (the loop's default executor if None). Use it for other
+    CPU-heavy steps too, e.g. compressing data before GblBuilder.prog_lzma.
+    """
+    if size < threshold:
+        return func(*args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args))
+
+
+async def iter_tags(reader: asyncio.StreamReader, parser: Optional[TagStreamParser] = None,
+                    chunk_size: int = READ_CHUNK_SIZE, executor: Optional[Executor] = None,
+                    threshold: int = OFFLOAD_THRESHOLD) -> AsyncIterator[Tag]:
+    """
+    Yields tags as soon as each one has been received. Pass a parser to set
+    limits or an observer and to read its stop_reason afterwards. Raises
+    ParseLimitError when a limit is exceeded. A read that completes a tag of
+    threshold bytes or more is handed to the parser in the executor, since
+    assembling the payload copies it.
+    """
+    if parser is None:
+        parser = TagStreamParser()
+
+    while True:
+        data = await reader.read(chunk_size)
+        if not data:
+            break
+        size = parser.buffered + len(data) if len(data) >= parser.needed else 0
+        for tag in await offload(parser.feed, data, size=size, executor=executor, threshold=threshold):
+            yield tag
+        if parser.stop_reason is not None:
+            break
+    parser.close()
+
+
+async def parse_stream(reader: asyncio.StreamReader, limits: Optional[ParseLimits] = None,
+                       observer: Optional[GblObserver] = None, chunk_size: int = READ_CHUNK_SIZE,
+                       executor: Optional[Executor] = None, threshold: int = OFFLOAD_THRESHOLD,
+                       signed_digest: bool = False) -> ParseResult:
+    """
+    Async counterpart of Gbl.parse_byte_array reading from a stream.
+    """
+    parser = TagStreamParser(limits, observer, signed_digest)
+    tags = []
+    try:
+        async for tag in iter_tags(reader, parser, chunk_size, executor, threshold):
+            tags.append(tag)
+    except ParseLimitError as e:
+        return ParseResultFatal(e)
+
+    if parser.received < 8:
+        return ParseResultFatal(
+            f"File is too small to be a valid gbl file. Expected at least 8 bytes, got {parser.received} bytes."
+        )
+    if parser.stop_reason is None:
+        return ParseResultSuccess(tags, signed_digest=parser.signed_digest)
+    return ParseResultSuccess(tags, stopped_at=parser.stopped_at, stop_reason=parser.stop_reason,
+                              signed_digest=parser.signed_digest)
+
+
+async def write_tags(writer: asyncio.StreamWriter, tags: List[Tag], executor: Optional[Executor] = None,
+                     threshold: int = OFFLOAD_THRESHOLD, chunk_size: int = WRITE_CHUNK_SIZE,
+                     signer: Optional[Callable[[bytes], Tuple[int, int]]] = None) -> int:
+    """
+    Async counterpart of Gbl.encode writing to a stream: the END tag CRC is
+    computed in the same pass as the write, and the writer is drained after
+    every chunk so a slow peer slows the producer down instead of growing
+    the transport buffer. Returns the number of bytes written.
+
+    With signer, the signed range is hashed in the same pass and the first
+    signature tag is written as signer(digest) -> (r, s); if tags have no
+    signature tag, one is added before END. signer may be a coroutine
+    function.
+    """
+    if signer is None and passthrough_end_tag(tags) is not None:
+        body, crc = tags, None
+    else:
+        body, crc = [tag for tag in tags if not isinstance(tag, GblEnd)], zlib.crc32(b'')
+    signed_range = SignedRangeHash() if signer is not None else None
+
+    written = 0
+    for tag in body:
+        if not isinstance(tag, TagWithHeader):
+            continue
+        if signed_range is not None and signed_range.digest is None and \
+                tag.tag_header.id == GblType.SIGNATURE_ECDSA_P256.value:
+            signed_range.update(tag.tag_header.id, written)
+            tag = await _sign(signer, signed_range.digest)
+        header, data, crc = await offload(_encode_tag, tag, crc, signed_range, written, size=tag.tag_header.length,
+                                          executor=executor, threshold=threshold)
+        written += await _write(writer, header, data, chunk_size)
+
+    if signed_range is not None and signed_range.signature_offset is None:
+        tag = await _sign(signer, signed_range.finish(written))
+        header, data, crc = _encode_tag(tag, crc, None, written)
+        written += await _write(writer, header, data, chunk_size)
+
+    if crc is not None:
+        header = struct.pack('<II', GblType.END.value, 4)
+        crc = zlib.crc32(header, crc) & 0xFFFFFFFF
+        written += await _write(writer, header, struct.pack('<I', crc), chunk_size)
+    return written
+
+
+async def write_builder(writer: asyncio.StreamWriter, builder: GblBuilder, executor: Optional[Executor] = None,
+                        threshold: int = OFFLOAD_THRESHOLD, chunk_size: int = WRITE_CHUNK_SIZE,
+                        signer: Optional[Callable[[bytes], Tuple[int, int]]] = None) -> int:
+    """
+    Writes the same bytes as builder.build_to_byte_array() to writer, or
+    a signed image when signer is given (see write_tags).
+    """
+    return await write_tags(writer, builder.get(), executor, threshold, chunk_size, signer)
+
+
+async def _sign(signer: Callable[[bytes], Tuple[int, int]], digest: bytes) -> TagWithHeader:
+    r_s = signer(digest)
+    if inspect.isawaitable(r_s):
+        r_s = await r_s
+    return signature_tag(*r_s)
+
+
+def _encode_tag(tag: TagWithHeader, crc: Optional[int], signed_range: Optional[SignedRangeHash] = None,
+                offset: int = 0) -> Tuple[bytes, bytes, Optional[int]]:
+    header = struct.pack('<II', tag.tag_header.id, tag.tag_header.length)
+    data = generate_tag_data(tag)
+    if crc is not None:
+        crc = zlib.crc32(data, zlib.crc32(header, crc))
+    if signed_range is not None:
+        signed_range.update(tag.tag_header.id, offset, header, data)
+    return header, data, crc
+
+
+async def _write(writer: asyncio.StreamWriter, header: bytes, data, chunk_size: int) -> int:
+    writer.write(header)
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        writer.write(bytes(view[start:start + chunk_size]))
+        await writer.drain()
+    if not view:
+        await writer.drain()
+    return len(header) + len(view)
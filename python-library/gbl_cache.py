@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+GBL parse cache - keeps parsed results of files in memory, keyed by path and
+file signature, so repeated lookups of unchanged files skip parsing.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
+
+from gbl import Gbl, ParseResult, ParseResultFatal
+
+
+@dataclass
+class CacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+    entries: int
+    current_bytes: int
+    max_bytes: int
+
+
+@dataclass
+class _CacheEntry:
+    signature: Tuple[int, int, int, int]
+    digest: Optional[bytes]
+    result: Any
+    nbytes: int
+
+
+class GblCache:
+    """
+    LRU cache in front of Gbl.parse_byte_array and Gbl.index_byte_array.
+
+    Entries are keyed by the real path of the file and validated against
+    (size, mtime_ns, ctime_ns, inode) on every lookup, so a file rewritten in
+    place is parsed again. With verify_digest=True the file content is also
+    hashed on each lookup, for filesystems with unreliable timestamps.
+    Memory is bounded by the total size of the cached files.
+    """
+
+    KIND_PARSE = "parse"
+    KIND_INDEX = "index"
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, verify_digest: bool = False,
+                 digest_algorithm: str = "sha256", gbl: Optional[Gbl] = None):
+        self.max_bytes = max_bytes
+        self.verify_digest = verify_digest
+        self.digest_algorithm = digest_algorithm
+        self.gbl = gbl or Gbl()
+
+        self._entries: 'OrderedDict[Tuple[str, str], _CacheEntry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._current_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def parse_file(self, path) -> ParseResult:
+        return self._get(self.KIND_PARSE, path)
+
+    def index_file(self, path) -> ParseResult:
+        return self._get(self.KIND_INDEX, path)
+
+    def invalidate(self, path=None) -> None:
+        with self._lock:
+            if path is None:
+                self._invalidations += len(self._entries)
+                self._entries.clear()
+                self._current_bytes = 0
+                return
+
+            real_path = os.path.realpath(path)
+            for kind in (self.KIND_PARSE, self.KIND_INDEX):
+                self._drop((kind, real_path))
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                invalidations=self._invalidations,
+                entries=len(self._entries),
+                current_bytes=self._current_bytes,
+                max_bytes=self.max_bytes
+            )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get(self, kind: str, path) -> ParseResult:
+        real_path = os.path.realpath(path)
+        key = (kind, real_path)
+        signature = self._signature(os.stat(real_path))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.signature != signature:
+                self._drop(key)
+                entry = None
+
+        data = None
+        if entry is not None and self.verify_digest:
+            data = self._read(real_path)
+            if self._digest(data) != entry.digest:
+                with self._lock:
+                    self._drop(key)
+                entry = None
+
+        if entry is not None:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                self._hits += 1
+            return entry.result
+
+        if data is None:
+            data = self._read(real_path)
+
+        if kind == self.KIND_INDEX:
+            result = self.gbl.index_byte_array(data)
+        else:
+            result = self.gbl.parse_byte_array(data)
+
+        with self._lock:
+            self._misses += 1
+
+        if isinstance(result, ParseResultFatal):
+            return result
+
+        # The file may have changed while it was being read.
+        if self._signature(os.stat(real_path)) != signature or len(data) > self.max_bytes:
+            return result
+
+        digest = self._digest(data) if self.verify_digest else None
+        with self._lock:
+            self._drop(key, count=False)
+            self._entries[key] = _CacheEntry(signature, digest, result, len(data))
+            self._current_bytes += len(data)
+            self._evict()
+
+        return result
+
+    def _evict(self) -> None:
+        while self._current_bytes > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self._current_bytes -= entry.nbytes
+            self._evictions += 1
+
+    def _drop(self, key, count: bool = True) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._current_bytes -= entry.nbytes
+            if count:
+                self._invalidations += 1
+
+    def _digest(self, data: bytes) -> bytes:
+        return hashlib.new(self.digest_algorithm, data).digest()
+
+    @staticmethod
+    def _signature(st: os.stat_result) -> Tuple[int, int, int, int]:
+        return st.st_size, st.st_mtime_ns, st.st_ctime_ns, st.st_ino
+
+    @staticmethod
+    def _read(path: str) -> bytes:
+        with open(path, 'rb') as f:
+            return f.read()
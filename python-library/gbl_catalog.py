@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+GBL catalog - SQLite index over a firmware archive for querying header,
+application, certificate and tag contents without re-parsing the files.
+"""
+
+import os
+import sqlite3
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Iterable, List, Optional, Sequence, Tuple, Union
+
+from gbl import FLASH_ADDRESS_OFFSETS, Gbl, GblIndex, GblType
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    header_version INTEGER,
+    gbl_type INTEGER,
+    gbl_crc INTEGER,
+    crc_valid INTEGER,
+    tag_count INTEGER NOT NULL,
+    indexed_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS applications (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    type INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    capabilities INTEGER NOT NULL,
+    product_id INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS certificates (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    struct_version INTEGER NOT NULL,
+    flags INTEGER NOT NULL,
+    key INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    signature INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS tags (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    tag_id INTEGER NOT NULL,
+    tag_type TEXT,
+    length INTEGER NOT NULL,
+    flash_address INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS failures (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    error TEXT NOT NULL,
+    failed_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_applications_product ON applications(product_id, version);
+CREATE INDEX IF NOT EXISTS idx_applications_file ON applications(file_id);
+CREATE INDEX IF NOT EXISTS idx_certificates_file ON certificates(file_id);
+CREATE INDEX IF NOT EXISTS idx_tags_type ON tags(tag_type, file_id);
+CREATE INDEX IF NOT EXISTS idx_tags_file ON tags(file_id, position);
+"""
+
+
+@dataclass
+class IngestStats:
+    scanned: int = 0
+    added: int = 0
+    updated: int = 0
+    skipped: int = 0
+    failed: int = 0
+    removed: int = 0
+
+
+@dataclass
+class _FileRecord:
+    path: str
+    size: int
+    mtime_ns: int
+    header_version: Optional[int]
+    gbl_type: Optional[int]
+    gbl_crc: Optional[int]
+    crc_valid: Optional[bool]
+    tags: List[Tuple[int, int, int, Optional[str], int, Optional[int]]]
+    applications: List[Tuple[int, int, int, int, int]]
+    certificates: List[Tuple[int, int, int, int, int, int]]
+
+
+@dataclass
+class _FailedFile:
+    path: str
+    size: Optional[int]
+    mtime_ns: Optional[int]
+    error: str
+
+
+def _extract(path: str) -> Union[_FileRecord, _FailedFile]:
+    """
+    Parses one file into a picklable record. Runs in worker processes.
+    Returns a _FailedFile instead of raising.
+    """
+    try:
+        st = os.stat(path)
+        with open(path, 'rb') as f:
+            byte_array = f.read()
+    except OSError as e:
+        return _FailedFile(path, None, None, f"{path}: {e}")
+
+    index = Gbl().index_byte_array(byte_array)
+    if not isinstance(index, GblIndex):
+        return _FailedFile(path, st.st_size, st.st_mtime_ns, f"{path}: {index.error}")
+    index.verify_crc()
+
+    tags = []
+    applications = []
+    certificates = []
+
+    for position, entry in enumerate(index.entries):
+        tag_type = entry.tag_type
+        flash_address = None
+        address_offset = FLASH_ADDRESS_OFFSETS.get(entry.id)
+        if address_offset is not None and entry.length >= address_offset + 4:
+            flash_address = struct.unpack_from('<I', byte_array, entry.data_offset + address_offset)[0]
+
+        tags.append((position, entry.offset, entry.id, tag_type.name if tag_type else None,
+                     entry.length, flash_address))
+
+        if tag_type == GblType.APPLICATION and entry.length >= 13:
+            app = index.tag(position).application_data
+            applications.append((position, app.type, app.version, app.capabilities, app.product_id))
+        elif tag_type == GblType.CERTIFICATE_ECDSA_P256 and entry.length >= 8:
+            cert = index.tag(position).certificate
+            certificates.append((position, cert.struct_version, cert.flags, cert.key,
+                                 cert.version, cert.signature))
+
+    return _FileRecord(
+        path=path,
+        size=st.st_size,
+        mtime_ns=st.st_mtime_ns,
+        header_version=index.header_version,
+        gbl_type=index.gbl_type,
+        gbl_crc=index.gbl_crc,
+        crc_valid=index.crc_valid,
+        tags=tags,
+        applications=applications,
+        certificates=certificates
+    )
+
+
+class GblCatalog:
+    """
+    SQLite-backed catalog of GBL files. ingest() parses only new or changed
+    files (by size and mtime_ns), in parallel worker processes. Files that
+    fail to parse have no rows; they are listed by failures() and retried
+    once they change.
+    """
+
+    def __init__(self, database: str = ":memory:"):
+        self.connection = sqlite3.connect(database)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        if database != ":memory:":
+            self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> 'GblCatalog':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def ingest(self, paths: Iterable[str], workers: Optional[int] = None,
+               prune: bool = False, suffix: str = ".gbl") -> IngestStats:
+        """
+        Adds or refreshes the given files; directories are walked for files
+        ending in suffix. workers=1 parses in-process. With prune=True, rows
+        of files that no longer exist are removed.
+        """
+        stats = IngestStats()
+        known = {path: (size, mtime_ns) for path, size, mtime_ns in
+                 self.connection.execute("SELECT path, size, mtime_ns FROM files")}
+        failed = {path: (size, mtime_ns) for path, size, mtime_ns in
+                  self.connection.execute("SELECT path, size, mtime_ns FROM failures")}
+
+        pending = []
+        for path in self._expand(paths, suffix):
+            stats.scanned += 1
+            try:
+                st = os.stat(path)
+            except OSError:
+                stats.failed += 1
+                continue
+            if (st.st_size, st.st_mtime_ns) in (known.get(path), failed.get(path)):
+                stats.skipped += 1
+                continue
+            pending.append(path)
+
+        if workers == 1 or len(pending) < 2:
+            records = map(_extract, pending)
+            self._store(records, known, stats)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                records = executor.map(_extract, pending, chunksize=max(1, len(pending) // 64))
+                self._store(records, known, stats)
+
+        if prune:
+            stats.removed = self.prune()
+
+        return stats
+
+    def prune(self) -> int:
+        missing = [(path,) for (path,) in self.connection.execute("SELECT path FROM files")
+                   if not os.path.exists(path)]
+        with self.connection:
+            self.connection.executemany("DELETE FROM files WHERE path = ?", missing)
+            self.connection.executemany(
+                "DELETE FROM failures WHERE path = ?",
+                [(path,) for (path,) in self.connection.execute("SELECT path FROM failures")
+                 if not os.path.exists(path)])
+        return len(missing)
+
+    def failures(self) -> List[Tuple[str, str]]:
+        """
+        Returns (path, error) of the files whose last ingest failed.
+        """
+        return self.connection.execute("SELECT path, error FROM failures ORDER BY path").fetchall()
+
+    def find(self, product_id: Optional[int] = None, min_version: Optional[int] = None,
+             max_version: Optional[int] = None,
+             has_tags: Union[GblType, Sequence[GblType], None] = None,
+             crc_valid: Optional[bool] = None) -> List[str]:
+        """
+        Returns paths of files matching all given conditions. Version and
+        product conditions apply to the same APPLICATION tag.
+        """
+        conditions = []
+        params: List[Any] = []
+
+        app_conditions = []
+        if product_id is not None:
+            app_conditions.append("a.product_id = ?")
+            params.append(product_id)
+        if min_version is not None:
+            app_conditions.append("a.version >= ?")
+            params.append(min_version)
+        if max_version is not None:
+            app_conditions.append("a.version <= ?")
+            params.append(max_version)
+        if app_conditions:
+            conditions.append("EXISTS (SELECT 1 FROM applications a WHERE a.file_id = f.id AND "
+                              + " AND ".join(app_conditions) + ")")
+
+        if isinstance(has_tags, GblType):
+            has_tags = [has_tags]
+        for tag_type in has_tags or []:
+            conditions.append("EXISTS (SELECT 1 FROM tags t WHERE t.tag_type = ? AND t.file_id = f.id)")
+            params.append(tag_type.name)
+
+        if crc_valid is not None:
+            conditions.append("f.crc_valid = ?")
+            params.append(int(crc_valid))
+
+        sql = "SELECT f.path FROM files f"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY f.path"
+        return [path for (path,) in self.connection.execute(sql, params)]
+
+    def tags(self, path: str) -> List[sqlite3.Row]:
+        cursor = self.connection.execute(
+            "SELECT t.position, t.offset, t.tag_id, t.tag_type, t.length, t.flash_address "
+            "FROM tags t JOIN files f ON f.id = t.file_id WHERE f.path = ? ORDER BY t.position",
+            (os.path.abspath(path),)
+        )
+        cursor.row_factory = sqlite3.Row
+        return cursor.fetchall()
+
+    def query(self, sql: str, params: Sequence[Any] = ()) -> List[sqlite3.Row]:
+        cursor = self.connection.execute(sql, params)
+        cursor.row_factory = sqlite3.Row
+        return cursor.fetchall()
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def _store(self, records, known, stats: IngestStats) -> None:
+        with self.connection:
+            for record in records:
+                # Rows of the previous contents go either way, so a file that
+                # no longer parses does not keep matching find().
+                if record.path in known:
+                    self.connection.execute("DELETE FROM files WHERE path = ?", (record.path,))
+
+                if isinstance(record, _FailedFile):
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO failures (path, size, mtime_ns, error, failed_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (record.path, record.size, record.mtime_ns, record.error, time.time())
+                    )
+                    stats.failed += 1
+                    continue
+
+                self.connection.execute("DELETE FROM failures WHERE path = ?", (record.path,))
+                if record.path in known:
+                    stats.updated += 1
+                else:
+                    stats.added += 1
+
+                cursor = self.connection.execute(
+                    "INSERT INTO files (path, size, mtime_ns, header_version, gbl_type, gbl_crc, "
+                    "crc_valid, tag_count, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (record.path, record.size, record.mtime_ns, record.header_version, record.gbl_type,
+                     record.gbl_crc, None if record.crc_valid is None else int(record.crc_valid),
+                     len(record.tags), time.time())
+                )
+                file_id = cursor.lastrowid
+
+                self.connection.executemany(
+                    "INSERT INTO tags (file_id, position, offset, tag_id, tag_type, length, flash_address) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(file_id,) + row for row in record.tags]
+                )
+                self.connection.executemany(
+                    "INSERT INTO applications (file_id, position, type, version, capabilities, product_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(file_id,) + row for row in record.applications]
+                )
+                self.connection.executemany(
+                    "INSERT INTO certificates (file_id, position, struct_version, flags, key, version, signature) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(file_id,) + row for row in record.certificates]
+                )
+
+    @staticmethod
+    def _expand(paths: Iterable[str], suffix: str) -> List[str]:
+        result = []
+        for path in paths:
+            path = os.path.abspath(os.fspath(path))
+            if os.path.isdir(path):
+                for root, _, files in os.walk(path):
+                    result.extend(os.path.join(root, name) for name in sorted(files)
+                                  if name.endswith(suffix))
+            else:
+                result.append(path)
+        return result
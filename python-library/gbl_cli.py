@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+GBL command-line tool - inspect, verify, diff and edit GBL files.
+
+Usage:
+    python -m gbl info FILE... [--tags] [--verify] [--json] [--jobs N]
+    python -m gbl verify FILE... [--json] [--jobs N]
+    python -m gbl diff OLD NEW [--json]
+    python -m gbl create FILE
+    python -m gbl pack FILE
+    python -m gbl add FILE --index N --type TYPE [tag options] [-o OUT]
+    python -m gbl set FILE --index N --type TYPE [tag options] [-o OUT]
+    python -m gbl remove FILE --index N [-o OUT]
+
+Read-only commands take any number of files (or --files-from LIST, "-" for
+stdin), map them instead of reading them and, unless --verify is given, only
+look at tag headers. --json prints one JSON object per file (NDJSON).
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from typing import Any, Dict, Iterable, List, Optional
+
+from gbl import (ApplicationData, Gbl, GblBuilder, GblEncryptionInitAesCcm, GblIndex, GblType,
+                 ParseResultSuccess, Tag, TagContainer, encode_tags)
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_ERROR = 2
+
+DEFAULT_ADDRESS = 0x08000000
+
+TAG_TYPES = ("application", "bootloader", "eraseprog", "encryption_data", "encryption_init",
+             "metadata", "prog", "prog_lz4", "prog_lzma", "se_upgrade", "signature",
+             "version_dependency")
+TAG_ALIASES = {"app": "application", "boot": "bootloader", "erase": "eraseprog", "meta": "metadata",
+               "program": "prog", "lz4": "prog_lz4", "lzma": "prog_lzma", "se": "se_upgrade"}
+
+
+def inspect_file(path: str, list_tags: bool = False, verify: bool = False) -> Dict[str, Any]:
+    """
+    Returns a JSON-ready summary of one file. Only tag headers and the small
+    fixed fields are read unless verify is set.
+    """
+    result: Dict[str, Any] = {"path": path}
+    try:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+    except (OSError, ValueError) as e:
+        result["error"] = str(e)
+        return result
+
+    try:
+        index = GblIndex.from_byte_array(buffer)
+        end = index.entries[-1].end if index.entries else 0
+        result.update(
+            size=size,
+            tags=len(index.entries),
+            header_version=index.header_version,
+            gbl_type=index.gbl_type,
+            application=_application(index.application),
+            gbl_crc=index.gbl_crc,
+            stopped_at=end if end < size else None,
+        )
+        if list_tags:
+            result["tag_list"] = [
+                {"position": position, "offset": entry.offset, "tag_id": entry.id,
+                 "tag_type": _type_name(entry.id), "length": entry.length}
+                for position, entry in enumerate(index.entries)
+            ]
+        if verify:
+            result["crc_valid"] = index.verify_crc()
+            result["computed_crc"] = index.computed_crc
+        index.source = None
+    finally:
+        if isinstance(buffer, mmap.mmap):
+            buffer.close()
+    return result
+
+
+def _application(app: Optional[ApplicationData]) -> Optional[Dict[str, int]]:
+    if app is None:
+        return None
+    return {"type": app.type, "version": app.version, "capabilities": app.capabilities,
+            "product_id": app.product_id}
+
+
+def _inspect_args(args) -> Dict[str, Any]:
+    return inspect_file(*args)
+
+
+def _type_name(tag_id: int) -> str:
+    tag_type = GblType.from_value(tag_id)
+    return tag_type.name if tag_type is not None else f"0x{tag_id:08X}"
+
+
+def _format_info(info: Dict[str, Any]) -> str:
+    if "error" in info:
+        return f"{info['path']}: error: {info['error']}"
+
+    parts = [f"{info['size']} bytes", f"{info['tags']} tags"]
+    if info["header_version"] is not None:
+        parts.append(f"header 0x{info['header_version']:08X} type {info['gbl_type']}")
+    app = info["application"]
+    if app is not None:
+        parts.append(f"application type {app['type']} version 0x{app['version']:X} product {app['product_id']}")
+    if "crc_valid" in info:
+        if info["gbl_crc"] is None:
+            parts.append("no END tag")
+        else:
+            parts.append("CRC ok" if info["crc_valid"] else "CRC mismatch")
+    if info["stopped_at"] is not None:
+        parts.append(f"unparsed data from offset {info['stopped_at']}")
+    lines = [f"{info['path']}: " + ", ".join(parts)]
+
+    for tag in info.get("tag_list", ()):
+        lines.append(f"  {tag['position']:>4}  {tag['tag_type']:<24} offset 0x{tag['offset']:X}  length {tag['length']}")
+    return "\n".join(lines)
+
+
+def _format_verify(info: Dict[str, Any]) -> str:
+    if "error" in info:
+        return f"{info['path']}: error: {info['error']}"
+    if info["gbl_crc"] is None:
+        return f"{info['path']}: FAILED (no END tag)"
+    if info["crc_valid"]:
+        return f"{info['path']}: OK"
+    return f"{info['path']}: FAILED (stored 0x{info['gbl_crc']:08X}, computed 0x{info['computed_crc']:08X})"
+
+
+def _run_batch(paths: List[str], list_tags: bool, verify: bool, jobs: int) -> Iterable[Dict[str, Any]]:
+    if jobs <= 1 or len(paths) < 2:
+        return (inspect_file(path, list_tags, verify) for path in paths)
+
+    from concurrent.futures import ProcessPoolExecutor
+    executor = ProcessPoolExecutor(max_workers=jobs)
+    chunksize = max(1, len(paths) // (jobs * 8))
+
+    def results():
+        with executor:
+            yield from executor.map(_inspect_args, [(path, list_tags, verify) for path in paths],
+                                    chunksize=chunksize)
+    return results()
+
+
+def _paths(args) -> List[str]:
+    paths = list(args.files)
+    if args.files_from:
+        if args.files_from == '-':
+            paths.extend(line.rstrip('\n') for line in sys.stdin if line.strip())
+        else:
+            with open(args.files_from) as f:
+                paths.extend(line.rstrip('\n') for line in f if line.strip())
+    return paths
+
+
+def cmd_info(args) -> int:
+    return _batch(args, args.tags, args.verify, _format_info)
+
+
+def cmd_verify(args) -> int:
+    return _batch(args, False, True, _format_verify)
+
+
+def _batch(args, list_tags: bool, verify: bool, formatter) -> int:
+    paths = _paths(args)
+    if not paths:
+        print("Error: no files given", file=sys.stderr)
+        return EXIT_ERROR
+
+    status = EXIT_OK
+    write = sys.stdout.write
+    for info in _run_batch(paths, list_tags, verify, args.jobs):
+        if "error" in info:
+            status = EXIT_ERROR
+        elif verify and not info["crc_valid"] and status == EXIT_OK:
+            status = EXIT_FAILED
+        write((json.dumps(info) if args.json else formatter(info)) + "\n")
+    return status
+
+
+def cmd_diff(args) -> int:
+    import gbl_diff
+    argv = [args.old, args.new, "--block-size", str(args.block_size)]
+    if args.json:
+        argv.append("--json")
+    if args.all:
+        argv.append("--all")
+    return gbl_diff.main(argv)
+
+
+def cmd_create(args) -> int:
+    return _write_new(args, GblBuilder.create().build_to_byte_array(), "created")
+
+
+def cmd_pack(args) -> int:
+    header = [tag for tag in GblBuilder.create().get() if tag.tag_type == GblType.HEADER_V3]
+    return _write_new(args, encode_tags(header), "packed (HEADER only)")
+
+
+def _write_new(args, data: bytes, action: str) -> int:
+    for path in args.files:
+        try:
+            _write_file(path, data)
+        except OSError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return EXIT_ERROR
+        _report(args, {"path": path, "action": action, "size": len(data)},
+                f"{path}: {action}, {len(data)} bytes")
+    return EXIT_OK
+
+
+def cmd_add(args) -> int:
+    return _edit(args, "add")
+
+
+def cmd_set(args) -> int:
+    return _edit(args, "set")
+
+
+def cmd_remove(args) -> int:
+    return _edit(args, "remove")
+
+
+def _edit(args, action: str) -> int:
+    """
+    Edits the tag list in place: the index counts tags from the HEADER at 0,
+    the other tags keep their order and a new END tag and CRC are written.
+    """
+    try:
+        with open(args.file, 'rb') as f:
+            result = Gbl().parse_byte_array(f.read())
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_ERROR
+
+    if not isinstance(result, ParseResultSuccess):
+        print(f"Error: {args.file}: {result.error}", file=sys.stderr)
+        return EXIT_ERROR
+    if result.stop_reason is not None:
+        print(f"Error: {args.file}: cannot edit, parsing stopped at offset {result.stopped_at}: "
+              f"{result.stop_reason}", file=sys.stderr)
+        return EXIT_ERROR
+
+    tags = [tag for tag in result.result_list if tag.tag_type != GblType.END]
+    index = args.index
+    last = len(tags) if action == "add" else len(tags) - 1
+    if not 1 <= index <= last:
+        print(f"Error: index {index} out of range, valid: 1-{last} "
+              f"(0 is the HEADER, END is managed automatically)", file=sys.stderr)
+        return EXIT_ERROR
+
+    if action == "remove":
+        old = tags.pop(index)
+        message = f"removed {old.tag_type.name} at index {index}"
+    else:
+        try:
+            tag = make_tag(args)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return EXIT_ERROR
+        if action == "add":
+            tags.insert(index, tag)
+            message = f"added {tag.tag_type.name} at index {index}"
+        else:
+            old = tags[index]
+            tags[index] = tag
+            message = f"replaced {old.tag_type.name} at index {index} with {tag.tag_type.name}"
+
+    data = Gbl().encode(tags)
+    output = args.output or args.file
+    try:
+        _write_file(output, data)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    _report(args, {"path": output, "action": action, "index": index, "size": len(data)},
+            f"{output}: {message}, {len(data)} bytes")
+    return EXIT_OK
+
+
+def make_tag(args) -> Tag:
+    """
+    Builds one tag from the --type and tag options, with the same defaults
+    as gbl-tool-cli.
+    """
+    kind = args.type.lower().replace('-', '_')
+    kind = TAG_ALIASES.get(kind, kind)
+    data = _data(args.data)
+    address = args.address if args.address is not None else DEFAULT_ADDRESS
+    builder = GblBuilder.create()
+
+    if kind == "prog":
+        builder.prog(address, data)
+    elif kind in ("prog_lz4", "prog_lzma"):
+        size = args.decompressed_size if args.decompressed_size is not None else len(data)
+        getattr(builder, kind)(address, data, size)
+    elif kind == "bootloader":
+        builder.bootloader(args.version if args.version is not None else 1, address, data)
+    elif kind == "metadata":
+        builder.metadata(_metadata(args.metadata) if args.metadata is not None else data)
+    elif kind == "se_upgrade":
+        builder.se_upgrade(args.version if args.version is not None else 1, data)
+    elif kind == "application":
+        builder.application(
+            args.app_type if args.app_type is not None else ApplicationData.APP_TYPE,
+            args.app_version if args.app_version is not None else ApplicationData.APP_VERSION,
+            args.capabilities if args.capabilities is not None else ApplicationData.APP_CAPABILITIES,
+            args.product_id if args.product_id is not None else ApplicationData.APP_PRODUCT_ID,
+            data
+        )
+    elif kind == "eraseprog":
+        builder.erase_prog()
+    elif kind == "encryption_data":
+        builder.encryption_data(data)
+    elif kind == "encryption_init":
+        builder.encryption_init(args.msg_len or 0, args.nonce or 0)
+    elif kind == "signature":
+        builder.signature_ecdsa_p256(args.r_value or 0, args.s_value or 0)
+    elif kind == "version_dependency":
+        builder.version_dependency(data)
+    else:
+        raise ValueError(f"Unknown tag type '{args.type}', expected one of: {', '.join(TAG_TYPES)}")
+
+    return next(tag for tag in builder.get() if tag.tag_type not in TagContainer.PROTECTED_TAG_TYPES)
+
+
+def _data(value: Optional[str]) -> bytes:
+    """--data: a 0x-prefixed hex string, a file name, or text."""
+    if value is None:
+        return b''
+    if value[:2].lower() == '0x':
+        return bytes.fromhex(value[2:])
+    if os.path.isfile(value):
+        with open(value, 'rb') as f:
+            return f.read()
+    return value.encode('utf-8')
+
+
+def _metadata(value: str) -> bytes:
+    """--metadata: a file name or text."""
+    if os.path.isfile(value):
+        with open(value, 'rb') as f:
+            return f.read()
+    return value.encode('utf-8')
+
+
+def _write_file(path: str, data: bytes) -> None:
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def _report(args, record: Dict[str, Any], text: str) -> None:
+    print(json.dumps(record) if args.json else text)
+
+
+def _int(value: str) -> int:
+    return int(value, 0)
+
+
+def _nonce(value: str):
+    digits = value[2:] if value[:2].lower() == '0x' else value
+    if len(digits) <= 2:
+        return int(digits, 16)
+    if len(digits) > 2 * GblEncryptionInitAesCcm.NONCE_SIZE:
+        raise argparse.ArgumentTypeError(f"nonce is longer than {GblEncryptionInitAesCcm.NONCE_SIZE} bytes")
+    return bytes.fromhex(digits.zfill(2 * GblEncryptionInitAesCcm.NONCE_SIZE))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="gbl", description="Inspect, verify, diff and edit GBL files.")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+    commands.required = True
+
+    def batch(name: str, help_text: str) -> argparse.ArgumentParser:
+        sub = commands.add_parser(name, help=help_text)
+        sub.add_argument("files", nargs="*", metavar="FILE")
+        sub.add_argument("--files-from", metavar="LIST", help="read more file names from LIST, - for stdin")
+        sub.add_argument("-j", "--jobs", type=int, default=1, help="parallel worker processes")
+        sub.add_argument("--json", action="store_true", help="one JSON object per file (NDJSON)")
+        return sub
+
+    sub = batch("info", "summarize files from their tag headers")
+    sub.add_argument("--tags", action="store_true", help="list every tag")
+    sub.add_argument("--verify", action="store_true", help="also check the END tag CRC")
+    sub.set_defaults(func=cmd_info)
+
+    sub = batch("verify", "check the END tag CRC")
+    sub.set_defaults(func=cmd_verify)
+
+    sub = commands.add_parser("diff", help="structural diff of two files")
+    sub.add_argument("old")
+    sub.add_argument("new")
+    sub.add_argument("--block-size", type=int, default=4096)
+    sub.add_argument("--json", action="store_true")
+    sub.add_argument("--all", action="store_true", help="also list unchanged tags")
+    sub.set_defaults(func=cmd_diff)
+
+    for name, func, help_text in (("create", cmd_create, "write a new file with HEADER and END tags"),
+                                  ("pack", cmd_pack, "write a new file with only a HEADER tag")):
+        sub = commands.add_parser(name, help=help_text)
+        sub.add_argument("files", nargs="+", metavar="FILE")
+        sub.add_argument("--json", action="store_true")
+        sub.set_defaults(func=func)
+
+    for name, func, help_text in (("add", cmd_add, "insert a tag at an index"),
+                                  ("set", cmd_set, "replace the tag at an index"),
+                                  ("remove", cmd_remove, "remove the tag at an index")):
+        sub = commands.add_parser(name, help=help_text)
+        sub.add_argument("file")
+        sub.add_argument("--index", type=int, required=True)
+        sub.add_argument("-o", "--output", help="output file (default: overwrite FILE)")
+        sub.add_argument("--json", action="store_true")
+        if name != "remove":
+            sub.add_argument("-t", "--type", required=True, help=", ".join(TAG_TYPES))
+            sub.add_argument("-a", "--address", type=_int)
+            sub.add_argument("-d", "--data", help="0x-prefixed hex, a file, or text")
+            sub.add_argument("-m", "--metadata", help="metadata text or file")
+            sub.add_argument("-v", "--version", type=_int)
+            sub.add_argument("--decompressed-size", type=_int)
+            sub.add_argument("--msg-len", type=_int)
+            sub.add_argument("-n", "--nonce", type=_nonce, help="hex; more than 2 digits gives a 12-byte nonce")
+            sub.add_argument("-r", "--r-value", type=_int)
+            sub.add_argument("--s-value", type=_int)
+            sub.add_argument("--app-type", type=_int)
+            sub.add_argument("--app-version", type=_int)
+            sub.add_argument("--capabilities", type=_int)
+            sub.add_argument("--product-id", type=_int)
+        sub.set_defaults(func=func)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except BrokenPipeError:
+        # Output piped into head and the like.
+        sys.stderr.close()
+        return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+GBL decryption - turns the ENCRYPTION_INIT / ENCRYPTION_DATA tags of an
+encrypted GBL file back into the plaintext tags they carry. Also provides
+ECDSA P-256 sign and verify callbacks for the signed-range digest.
+
+The payload of the ENCRYPTION_DATA tags is one AES-CTR stream (the
+encryption part of AES-CCM). Its first counter block is the flags byte
+0x02, the 12-byte nonce from ENCRYPTION_INIT and a 3-byte big-endian block
+counter starting at 1. Ciphertext is decrypted chunk by chunk and fed to a
+TagStreamParser, so only the tag being assembled is held as plaintext.
+
+AES comes from a pluggable backend: the cryptography package or
+pycryptodome when installed, otherwise a pure-Python implementation. The
+default backend gets a one-vector known-answer check before first use.
+"""
+
+import mmap
+import struct
+import time
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from gbl import (GblBuilder, GblEncryptionInitAesCcm, GblType, ParseLimitError, ParseResult,
+                 ParseResultFatal, ParseResultSuccess, Tag, TagContainer, TagStreamParser,
+                 TagWithHeader, encode_tags, parse_tag_type, scan_tags)
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# CCM flags byte for a 3-byte length field (L - 1 = 2).
+CTR_FLAGS = 0x02
+FIRST_COUNTER = 1
+
+
+class AesBackend:
+    """
+    Source of AES-CTR. ctr() returns an update function that encrypts (or,
+    identically, decrypts) data of any length and keeps the keystream
+    position between calls.
+    """
+
+    name = 'abstract'
+
+    def ctr(self, key: bytes, counter_block: bytes) -> Callable[[bytes], bytes]:
+        raise NotImplementedError
+
+
+class CryptographyBackend(AesBackend):
+    name = 'cryptography'
+
+    def __init__(self):
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+        self._cipher = Cipher
+        self._aes = algorithms.AES
+        self._ctr = modes.CTR
+
+    def ctr(self, key: bytes, counter_block: bytes) -> Callable[[bytes], bytes]:
+        return self._cipher(self._aes(bytes(key)), self._ctr(bytes(counter_block))).encryptor().update
+
+
+class PyCryptodomeBackend(AesBackend):
+    name = 'pycryptodome'
+
+    def __init__(self):
+        from Crypto.Cipher import AES
+        self._aes = AES
+
+    def ctr(self, key: bytes, counter_block: bytes) -> Callable[[bytes], bytes]:
+        return self._aes.new(bytes(key), self._aes.MODE_CTR, nonce=b'',
+                             initial_value=bytes(counter_block)).encrypt
+
+
+class PythonBackend(AesBackend):
+    """
+    Table-driven AES in pure Python. Slow (about 1 MB/s) but always there.
+    """
+
+    name = 'python'
+
+    def ctr(self, key: bytes, counter_block: bytes) -> Callable[[bytes], bytes]:
+        return _PythonCtr(_expand_key(bytes(key)), int.from_bytes(counter_block, 'big')).update
+
+
+BACKENDS = (CryptographyBackend, PyCryptodomeBackend, PythonBackend)
+
+_default_backend: Optional[AesBackend] = None
+
+
+def default_backend() -> AesBackend:
+    """
+    Returns the first backend that can be imported and passes self_test().
+    """
+    global _default_backend
+    if _default_backend is None:
+        for backend_class in BACKENDS:
+            try:
+                backend = backend_class()
+            except ImportError:
+                continue
+            self_test(backend)
+            _default_backend = backend
+            break
+    return _default_backend
+
+
+def counter_block(nonce: bytes, counter: int = FIRST_COUNTER) -> bytes:
+    if len(nonce) != GblEncryptionInitAesCcm.NONCE_SIZE:
+        raise ValueError(f"AES-CCM needs a {GblEncryptionInitAesCcm.NONCE_SIZE}-byte nonce, got {len(nonce)} bytes")
+    return bytes((CTR_FLAGS,)) + bytes(nonce) + counter.to_bytes(3, 'big')
+
+
+def iter_decrypted(tags: Iterable[Tag], key: bytes, parser: Optional[TagStreamParser] = None,
+                   backend: Optional[AesBackend] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tag]:
+    """
+    Yields the plaintext tags carried by the encryption tags in tags. Other
+    outer tags are skipped. Pass a parser to set limits or an observer and
+    to read its stop_reason afterwards.
+    """
+    return _iter_plaintext_tags(
+        ((tag.tag_header.id, tag.tag_data) for tag in tags if isinstance(tag, TagWithHeader)),
+        key, parser, backend, chunk_size)
+
+
+def iter_decrypted_file(path: str, key: bytes, parser: Optional[TagStreamParser] = None,
+                        backend: Optional[AesBackend] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tag]:
+    """
+    Like iter_decrypted, reading a memory-mapped file: the ciphertext is
+    never loaded as a whole.
+    """
+    with open(path, 'rb') as f:
+        if not f.seek(0, 2):
+            return
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        entries, _ = scan_tags(buffer)
+        with memoryview(buffer) as view:
+            payloads = ((entry.id, view[entry.data_offset:entry.end]) for entry in entries)
+            yield from _iter_plaintext_tags(payloads, key, parser, backend, chunk_size)
+    finally:
+        try:
+            buffer.close()
+        except BufferError:
+            # A caller still holds a tag slice; the map is freed with it.
+            pass
+
+
+def decrypt_tags(tags: Iterable[Tag], key: bytes, parser: Optional[TagStreamParser] = None,
+                 backend: Optional[AesBackend] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> ParseResult:
+    """
+    Decrypts into a ParseResult of the plaintext tags, like parse_byte_array.
+    """
+    if parser is None:
+        parser = TagStreamParser()
+    return _collect(iter_decrypted(tags, key, parser, backend, chunk_size), parser)
+
+
+def decrypt_file(path: str, key: bytes, parser: Optional[TagStreamParser] = None,
+                 backend: Optional[AesBackend] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> ParseResult:
+    if parser is None:
+        parser = TagStreamParser()
+    return _collect(iter_decrypted_file(path, key, parser, backend, chunk_size), parser)
+
+
+def encrypt_tags(tags: List[Tag], key: bytes, nonce: bytes, backend: Optional[AesBackend] = None) -> List[Tag]:
+    """
+    Returns the ENCRYPTION_INIT and ENCRYPTION_DATA tags carrying tags, for
+    building an encrypted file or checking a decryption round trip.
+    """
+    plaintext = encode_tags([tag for tag in tags if tag.tag_type not in TagContainer.PROTECTED_TAG_TYPES])
+    update = (backend or default_backend()).ctr(key, counter_block(nonce))
+    # Separate builders: a builder sorts tags by id, which would put the
+    # data before the init tag.
+    init = GblBuilder.create().encryption_init(len(plaintext), nonce)
+    data = GblBuilder.create().encryption_data(update(plaintext))
+    return [tag for builder in (init, data) for tag in builder.get()
+            if tag.tag_type not in TagContainer.PROTECTED_TAG_TYPES]
+
+
+def ecdsa_signer(private_key) -> Callable[[bytes], Tuple[int, int]]:
+    """
+    Returns a signer for gbl_async.write_tags from a P-256 private key of
+    the cryptography package. The digest is signed as is, not hashed again.
+    """
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec, utils
+
+    algorithm = ec.ECDSA(utils.Prehashed(hashes.SHA256()))
+
+    def sign(digest: bytes) -> Tuple[int, int]:
+        return utils.decode_dss_signature(private_key.sign(digest, algorithm))
+    return sign
+
+
+def ecdsa_verifier(public_key) -> Callable[[bytes, int, int], bool]:
+    """
+    Returns a verify callback for ParseResultSuccess.verify_signature from a
+    P-256 public key of the cryptography package.
+    """
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec, utils
+
+    algorithm = ec.ECDSA(utils.Prehashed(hashes.SHA256()))
+
+    def verify(digest: bytes, r: int, s: int) -> bool:
+        try:
+            public_key.verify(utils.encode_dss_signature(r, s), digest, algorithm)
+        except InvalidSignature:
+            return False
+        return True
+    return verify
+
+
+def _collect(tags: Iterator[Tag], parser: TagStreamParser) -> ParseResult:
+    try:
+        result = list(tags)
+    except (ParseLimitError, ValueError) as e:
+        return ParseResultFatal(e)
+    if parser.stop_reason is None:
+        return ParseResultSuccess(result)
+    return ParseResultSuccess(result, stopped_at=parser.stopped_at, stop_reason=parser.stop_reason)
+
+
+def _iter_plaintext_tags(payloads: Iterable[Tuple[int, bytes]], key: bytes, parser: Optional[TagStreamParser],
+                         backend: Optional[AesBackend], chunk_size: int) -> Iterator[Tag]:
+    if parser is None:
+        parser = TagStreamParser()
+    if backend is None:
+        backend = default_backend()
+    observer = parser.observer
+
+    # Files made by GblBuilder, which sorts tags by id, have the data tags
+    # before the init tag, so the init tag is looked up first.
+    payloads = list(payloads)
+    init_payload = next((payload for tag_id, payload in payloads if tag_id == GblType.ENCRYPTION_INIT.value), None)
+    if init_payload is None:
+        raise ValueError("No ENCRYPTION_INIT tag")
+    init = parse_tag_type(GblType.ENCRYPTION_INIT.value, len(init_payload), bytes(init_payload))
+    update = backend.ctr(key, counter_block(init.nonce_bytes))
+
+    for tag_id, payload in payloads:
+        if tag_id == GblType.ENCRYPTION_DATA.value:
+            if observer is not None:
+                start = time.perf_counter_ns()
+            with memoryview(payload) as view:
+                for offset in range(0, len(view), chunk_size):
+                    yield from parser.feed(update(view[offset:offset + chunk_size]))
+                    if parser.stop_reason is not None:
+                        break
+            if observer is not None:
+                observer.on_stage('decrypt', len(payload), time.perf_counter_ns() - start)
+        if parser.stop_reason is not None:
+            break
+    parser.close()
+
+
+# Pure-Python AES (FIPS-197), encryption direction only, as CTR needs.
+
+def _build_tables() -> Tuple[List[int], List[int], List[int], List[int], List[int]]:
+    def xtime(a: int) -> int:
+        a <<= 1
+        return a ^ 0x11B if a & 0x100 else a
+
+    sbox = [0] * 256
+    p = q = 1
+    # Walks the multiplicative group with generator 3 to get inverses.
+    while True:
+        p ^= xtime(p)
+        q ^= q << 1
+        q ^= q << 2
+        q ^= q << 4
+        q &= 0xFF
+        if q & 0x80:
+            q ^= 0x09
+        x = q ^ ((q << 1 | q >> 7) & 0xFF) ^ ((q << 2 | q >> 6) & 0xFF) ^ \
+            ((q << 3 | q >> 5) & 0xFF) ^ ((q << 4 | q >> 4) & 0xFF)
+        sbox[p] = x ^ 0x63
+        if p == 1:
+            break
+    sbox[0] = 0x63
+
+    t0 = [(xtime(s) << 24) | (s << 16) | (s << 8) | (xtime(s) ^ s) for s in sbox]
+    t1 = [(t >> 8) | ((t & 0xFF) << 24) for t in t0]
+    t2 = [(t >> 8) | ((t & 0xFF) << 24) for t in t1]
+    t3 = [(t >> 8) | ((t & 0xFF) << 24) for t in t2]
+    return sbox, t0, t1, t2, t3
+
+
+_SBOX, _T0, _T1, _T2, _T3 = _build_tables()
+
+
+def _expand_key(key: bytes) -> List[int]:
+    if len(key) not in (16, 24, 32):
+        raise ValueError(f"AES key must be 16, 24 or 32 bytes, got {len(key)}")
+    nk = len(key) // 4
+    words = list(struct.unpack(f'>{nk}I', key))
+    rcon = 1
+    sbox = _SBOX
+    for i in range(nk, 4 * (nk + 7)):
+        t = words[-1]
+        if i % nk == 0:
+            t = ((sbox[(t >> 16) & 0xFF] << 24) | (sbox[(t >> 8) & 0xFF] << 16) |
+                 (sbox[t & 0xFF] << 8) | sbox[t >> 24]) ^ (rcon << 24)
+            rcon = (rcon << 1) ^ (0x11B if rcon & 0x80 else 0)
+        elif nk > 6 and i % nk == 4:
+            t = (sbox[t >> 24] << 24) | (sbox[(t >> 16) & 0xFF] << 16) | \
+                (sbox[(t >> 8) & 0xFF] << 8) | sbox[t & 0xFF]
+        words.append(words[i - nk] ^ t)
+    return words
+
+
+def _encrypt_block(rk: List[int], block: int) -> int:
+    t0, t1, t2, t3, sbox = _T0, _T1, _T2, _T3, _SBOX
+    s0 = (block >> 96) ^ rk[0]
+    s1 = ((block >> 64) & 0xFFFFFFFF) ^ rk[1]
+    s2 = ((block >> 32) & 0xFFFFFFFF) ^ rk[2]
+    s3 = (block & 0xFFFFFFFF) ^ rk[3]
+    k = 4
+    for _ in range(len(rk) // 4 - 2):
+        s0, s1, s2, s3 = (
+            t0[s0 >> 24] ^ t1[(s1 >> 16) & 0xFF] ^ t2[(s2 >> 8) & 0xFF] ^ t3[s3 & 0xFF] ^ rk[k],
+            t0[s1 >> 24] ^ t1[(s2 >> 16) & 0xFF] ^ t2[(s3 >> 8) & 0xFF] ^ t3[s0 & 0xFF] ^ rk[k + 1],
+            t0[s2 >> 24] ^ t1[(s3 >> 16) & 0xFF] ^ t2[(s0 >> 8) & 0xFF] ^ t3[s1 & 0xFF] ^ rk[k + 2],
+            t0[s3 >> 24] ^ t1[(s0 >> 16) & 0xFF] ^ t2[(s1 >> 8) & 0xFF] ^ t3[s2 & 0xFF] ^ rk[k + 3],
+        )
+        k += 4
+    result = 0
+    for a, b, c, d in ((s0, s1, s2, s3), (s1, s2, s3, s0), (s2, s3, s0, s1), (s3, s0, s1, s2)):
+        word = (sbox[a >> 24] << 24) | (sbox[(b >> 16) & 0xFF] << 16) | \
+               (sbox[(c >> 8) & 0xFF] << 8) | sbox[d & 0xFF]
+        result = (result << 32) | (word ^ rk[k])
+        k += 1
+    return result
+
+
+class _PythonCtr:
+    __slots__ = ('_rk', '_counter', '_leftover')
+
+    def __init__(self, rk: List[int], counter: int):
+        self._rk = rk
+        self._counter = counter
+        self._leftover = b''
+
+    def update(self, data) -> bytes:
+        size = len(data)
+        if not size:
+            return b''
+        keystream = self._leftover
+        needed = size - len(keystream)
+        if needed > 0:
+            rk, counter = self._rk, self._counter
+            blocks = (needed + 15) // 16
+            keystream += b''.join(_encrypt_block(rk, (counter + i) & (2 ** 128 - 1)).to_bytes(16, 'big')
+                                  for i in range(blocks))
+            self._counter = (counter + blocks) & (2 ** 128 - 1)
+        self._leftover = keystream[size:]
+        return (int.from_bytes(data, 'little') ^ int.from_bytes(keystream[:size], 'little')).to_bytes(size, 'little')
+
+
+# First two blocks of NIST SP 800-38A F.5.1 CTR-AES128: key, initial counter
+# block, plaintext, ciphertext. The full vector sets are in tests/test_crypto.py.
+_KNOWN_ANSWER = (
+    '2b7e151628aed2a6abf7158809cf4f3c', 'f0f1f2f3f4f5f6f7f8f9fafbfcfdfeff',
+    '6bc1bee22e409f96e93d7e117393172aae2d8a571e03ac9c9eb76fac45af8e51',
+    '874d6191b620e3261bef6864990db6ce9806f66b7970fdff8617187bb9fffdff',
+)
+
+
+def self_test(backend: AesBackend) -> None:
+    """
+    Known-answer check of backend over two blocks, decrypted whole and in
+    an uneven split. Raises RuntimeError on mismatch.
+    """
+    key, counter, plaintext, ciphertext = (bytes.fromhex(value) for value in _KNOWN_ANSWER)
+    update = backend.ctr(key, counter)
+    if backend.ctr(key, counter)(plaintext) != ciphertext or \
+            update(plaintext[:5]) + update(plaintext[5:]) != ciphertext:
+        raise RuntimeError(f"AES backend '{backend.name}' failed its self-test")
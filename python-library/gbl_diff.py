@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+GBL structural diff - pairs the tags of two GBL files by type and position,
+compares their fixed fields and locates changed payload ranges by comparing
+aligned blocks.
+
+Usage: python gbl_diff.py OLD.gbl NEW.gbl [--block-size N] [--json]
+"""
+
+import argparse
+import json
+import mmap
+import struct
+import sys
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from gbl import FIXED_FIELDS, FLASH_LAYOUTS, TagIndexEntry, scan_tags
+
+
+# Tag id -> address field of the tags whose payload after the fixed fields
+# is written to flash as is, so payload ranges map to flash addresses.
+ADDRESSED_TAGS: Dict[int, str] = {
+    tag_id: address for tag_id, (address, size) in FLASH_LAYOUTS.items() if size is None
+}
+
+
+@dataclass
+class FieldChange:
+    name: str
+    old: Any
+    new: Any
+
+
+@dataclass
+class TagDiff:
+    tag_id: int
+    tag_type: str
+    occurrence: int
+    status: str
+    old_length: Optional[int] = None
+    new_length: Optional[int] = None
+    fields: List[FieldChange] = field(default_factory=list)
+    ranges: List[Tuple[int, int]] = field(default_factory=list)
+    flash_addresses: bool = False
+
+
+@dataclass
+class GblDiff:
+    tags: List[TagDiff]
+    old_size: int
+    new_size: int
+    trailing_changed: bool = False
+
+    @property
+    def identical(self) -> bool:
+        return not self.trailing_changed and all(tag.status == 'equal' for tag in self.tags)
+
+    def changed(self) -> List[TagDiff]:
+        return [tag for tag in self.tags if tag.status != 'equal']
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = asdict(self)
+        result['identical'] = self.identical
+        return result
+
+    def format(self, show_equal: bool = False) -> str:
+        lines = [f"old: {self.old_size} bytes, new: {self.new_size} bytes"]
+        for tag in self.tags:
+            if tag.status == 'equal' and not show_equal:
+                continue
+
+            name = f"{tag.tag_type}[{tag.occurrence}]"
+            if tag.status in ('added', 'removed'):
+                length = tag.new_length if tag.status == 'added' else tag.old_length
+                lines.append(f"{'+' if tag.status == 'added' else '-'} {name} ({length} bytes)")
+                continue
+            if tag.status == 'equal':
+                lines.append(f"  {name}")
+                continue
+
+            lines.append(f"~ {name}")
+            if tag.old_length != tag.new_length:
+                lines.append(f"    length: {tag.old_length} -> {tag.new_length}")
+            for change in tag.fields:
+                lines.append(f"    {change.name}: 0x{change.old:X} -> 0x{change.new:X}")
+            if tag.ranges:
+                label = "flash" if tag.flash_addresses else "payload"
+                spans = ", ".join(f"0x{start:X}-0x{end:X}" for start, end in tag.ranges)
+                total = sum(end - start for start, end in tag.ranges)
+                lines.append(f"    {label} changed: {spans} ({total} bytes)")
+
+        if self.trailing_changed:
+            lines.append("~ trailing data after the last tag differs")
+        if self.identical:
+            lines.append("identical")
+        return "\n".join(lines)
+
+
+def changed_blocks(old, new, block_size: int = 4096) -> List[Tuple[int, int]]:
+    """
+    Returns the changed [start, end) ranges between two buffers. Aligned
+    blocks are compared byte for byte through memoryviews; adjacent changed
+    blocks are merged and a length difference is reported as a changed tail.
+    """
+    old, new = memoryview(old), memoryview(new)
+    common = min(len(old), len(new))
+    ranges: List[Tuple[int, int]] = []
+
+    if old[:common] != new[:common]:
+        for start in range(0, common, block_size):
+            end = min(start + block_size, common)
+            if old[start:end] == new[start:end]:
+                continue
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+
+    if len(old) != len(new):
+        tail = (common, max(len(old), len(new)))
+        if ranges and ranges[-1][1] == common:
+            ranges[-1] = (ranges[-1][0], tail[1])
+        else:
+            ranges.append(tail)
+    return ranges
+
+
+def _fixed_fields(buffer, entry: TagIndexEntry) -> Tuple[Tuple[str, ...], Tuple[int, ...], int]:
+    layout = FIXED_FIELDS.get(entry.id)
+    if layout is None:
+        return (), (), 0
+    fmt, names = layout
+    size = struct.calcsize(fmt)
+    if entry.length < size:
+        return (), (), 0
+    return names, struct.unpack_from(fmt, buffer, entry.data_offset), size
+
+
+def _diff_tag(old_buffer, new_buffer, old: TagIndexEntry, new: TagIndexEntry,
+              occurrence: int, block_size: int) -> TagDiff:
+    tag_type = old.tag_type
+    result = TagDiff(
+        tag_id=old.id,
+        tag_type=tag_type.name if tag_type else f"0x{old.id:08X}",
+        occurrence=occurrence,
+        status='equal',
+        old_length=old.length,
+        new_length=new.length
+    )
+
+    old_names, old_values, old_fixed = _fixed_fields(old_buffer, old)
+    new_names, new_values, new_fixed = _fixed_fields(new_buffer, new)
+    if old_names and old_names == new_names:
+        result.fields = [FieldChange(name, a, b) for name, a, b in zip(old_names, old_values, new_values) if a != b]
+    fixed = old_fixed if old_fixed == new_fixed else 0
+
+    result.ranges = changed_blocks(old_buffer[old.data_offset + fixed:old.end],
+                                   new_buffer[new.data_offset + fixed:new.end], block_size)
+
+    address = ADDRESSED_TAGS.get(old.id)
+    if address is not None and fixed:
+        index = old_names.index(address)
+        if old_values[index] == new_values[index]:
+            base = old_values[index]
+            result.ranges = [(base + start, base + end) for start, end in result.ranges]
+            result.flash_addresses = True
+
+    if result.fields or result.ranges or old.length != new.length:
+        result.status = 'changed'
+    return result
+
+
+def diff_bytes(old, new, block_size: int = 4096) -> GblDiff:
+    """
+    Diffs two GBL images given as bytes-like buffers (bytes, memoryview, mmap).
+    Tags are paired by id and by occurrence of that id in each file. Payloads
+    are compared through memoryviews and never copied.
+    """
+    with memoryview(old) as old_view, memoryview(new) as new_view:
+        return _diff_views(old_view, new_view, block_size)
+
+
+def _diff_views(old: memoryview, new: memoryview, block_size: int) -> GblDiff:
+    old_entries, old_end = scan_tags(old)
+    new_entries, new_end = scan_tags(new)
+
+    new_by_id: Dict[int, List[TagIndexEntry]] = defaultdict(list)
+    for entry in new_entries:
+        new_by_id[entry.id].append(entry)
+
+    tags = []
+    seen: Dict[int, int] = defaultdict(int)
+    for entry in old_entries:
+        occurrence = seen[entry.id]
+        seen[entry.id] += 1
+        candidates = new_by_id.get(entry.id, [])
+        if occurrence < len(candidates):
+            tags.append(_diff_tag(old, new, entry, candidates[occurrence], occurrence, block_size))
+        else:
+            tag_type = entry.tag_type
+            tags.append(TagDiff(entry.id, tag_type.name if tag_type else f"0x{entry.id:08X}",
+                                occurrence, 'removed', old_length=entry.length))
+
+    for tag_id, candidates in new_by_id.items():
+        for occurrence in range(seen.get(tag_id, 0), len(candidates)):
+            entry = candidates[occurrence]
+            tag_type = entry.tag_type
+            tags.append(TagDiff(entry.id, tag_type.name if tag_type else f"0x{entry.id:08X}",
+                                occurrence, 'added', new_length=entry.length))
+
+    trailing_changed = old[old_end:] != new[new_end:]
+    return GblDiff(tags=tags, old_size=len(old), new_size=len(new), trailing_changed=trailing_changed)
+
+
+def diff_files(old_path: str, new_path: str, block_size: int = 4096) -> GblDiff:
+    with open(old_path, 'rb') as old_file, open(new_path, 'rb') as new_file:
+        old = _map(old_file)
+        new = _map(new_file)
+        try:
+            return diff_bytes(old, new, block_size)
+        finally:
+            for buffer in (old, new):
+                if isinstance(buffer, mmap.mmap):
+                    buffer.close()
+
+
+def _map(f):
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        # Empty files cannot be mapped.
+        return b''
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Structural diff of two GBL files.")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--block-size", type=int, default=4096)
+    parser.add_argument("--json", action="store_true", help="print the diff as JSON")
+    parser.add_argument("--all", action="store_true", help="also list unchanged tags")
+    args = parser.parse_args(argv)
+
+    try:
+        result = diff_files(args.old, args.new, args.block_size)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    if args.json:
+        print(json.dumps(result.to_dict()))
+    else:
+        print(result.format(show_equal=args.all))
+    return 0 if result.identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Frozen GBL views - an immutable parsed representation that can be shared
+between threads without locks or defensive copies.
+"""
+
+import struct
+import zlib
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
+
+from gbl import FIXED_FIELDS, FLASH_LAYOUTS, Gbl, GblType, ParseLimits, Tag, parse_tag_type, scan_tags
+
+_EMPTY_FIELDS: Mapping[str, int] = MappingProxyType({})
+
+
+@dataclass(frozen=True, eq=False)
+class FrozenTag:
+    """
+    One tag of a FrozenGbl. data is a read-only view into the shared image
+    and fields holds the decoded fixed fields; neither can be modified.
+    """
+    __slots__ = ('position', 'offset', 'tag_id', 'length', 'data', 'fields')
+
+    position: int
+    offset: int
+    tag_id: int
+    length: int
+    data: memoryview
+    fields: Mapping[str, int]
+
+    @property
+    def tag_type(self) -> Optional[GblType]:
+        return GblType.from_value(self.tag_id)
+
+    def to_tag(self) -> Tag:
+        """
+        Returns a new mutable Tag decoded from this tag's bytes.
+        """
+        return parse_tag_type(self.tag_id, self.length, bytes(self.data))
+
+
+@dataclass(frozen=True)
+class FlashRegion:
+    start: int
+    end: int
+    position: int
+    tag_type: GblType
+    compressed: bool
+
+
+class FrozenGbl:
+    """
+    Immutable parse of a GBL image. The image bytes are held once and every
+    tag is a read-only view into them. Derived views (tags by type, flash
+    map, CRC check) are computed on first use and cached; since the inputs
+    never change, two threads computing a view at the same time get equal
+    results, so no locking is needed.
+    """
+
+    __slots__ = ('data', 'tags', 'stopped_at', '_by_type', '_flash_map', '_crc_valid', '__weakref__')
+
+    def __init__(self, data, limits: Optional[ParseLimits] = None):
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        view = memoryview(data)
+        entries, stopped_at = scan_tags(data, limits=limits)
+
+        tags = []
+        for position, entry in enumerate(entries):
+            fields = _EMPTY_FIELDS
+            layout = FIXED_FIELDS.get(entry.id)
+            if layout is not None and entry.length >= struct.calcsize(layout[0]):
+                fields = MappingProxyType(dict(zip(layout[1], struct.unpack_from(layout[0], data, entry.data_offset))))
+            tags.append(FrozenTag(position, entry.offset, entry.id, entry.length,
+                                  view[entry.data_offset:entry.end], fields))
+
+        object.__setattr__(self, 'data', data)
+        object.__setattr__(self, 'tags', tuple(tags))
+        object.__setattr__(self, 'stopped_at', stopped_at if stopped_at < len(data) else None)
+        object.__setattr__(self, '_by_type', None)
+        object.__setattr__(self, '_flash_map', None)
+        object.__setattr__(self, '_crc_valid', None)
+
+    @classmethod
+    def from_file(cls, path: str, limits: Optional[ParseLimits] = None) -> 'FrozenGbl':
+        with open(path, 'rb') as f:
+            return cls(f.read(), limits)
+
+    @classmethod
+    def from_tags(cls, tags: List[Tag]) -> 'FrozenGbl':
+        """
+        Freezes parsed or built tags, encoding them with a fresh END tag.
+        """
+        return cls(Gbl().encode(tags))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __len__(self) -> int:
+        return len(self.tags)
+
+    def __iter__(self) -> Iterator[FrozenTag]:
+        return iter(self.tags)
+
+    def __getitem__(self, position: int) -> FrozenTag:
+        return self.tags[position]
+
+    def tags_of(self, tag_type: GblType) -> Tuple[FrozenTag, ...]:
+        by_type = self._by_type
+        if by_type is None:
+            grouped: Dict[int, List[FrozenTag]] = {}
+            for tag in self.tags:
+                grouped.setdefault(tag.tag_id, []).append(tag)
+            by_type = {tag_id: tuple(group) for tag_id, group in grouped.items()}
+            object.__setattr__(self, '_by_type', by_type)
+        return by_type.get(tag_type.value, ())
+
+    def first(self, tag_type: GblType) -> Optional[FrozenTag]:
+        tags = self.tags_of(tag_type)
+        return tags[0] if tags else None
+
+    @property
+    def header(self) -> Mapping[str, int]:
+        tag = self.first(GblType.HEADER_V3)
+        return tag.fields if tag is not None else _EMPTY_FIELDS
+
+    @property
+    def application(self) -> Mapping[str, int]:
+        tag = self.first(GblType.APPLICATION)
+        return tag.fields if tag is not None else _EMPTY_FIELDS
+
+    @property
+    def flash_map(self) -> Tuple[FlashRegion, ...]:
+        """
+        Flash ranges written by PROG, compressed PROG and BOOTLOADER tags,
+        sorted by start address. Compressed tags cover their decompressed size.
+        """
+        flash_map = self._flash_map
+        if flash_map is None:
+            regions = []
+            for tag in self.tags:
+                layout = FLASH_LAYOUTS.get(tag.tag_id)
+                if layout is None or not tag.fields:
+                    continue
+                address_field, size_field = layout
+                start = tag.fields[address_field]
+                if size_field is not None:
+                    size = tag.fields[size_field]
+                else:
+                    size = tag.length - struct.calcsize(FIXED_FIELDS[tag.tag_id][0])
+                regions.append(FlashRegion(start, start + size, tag.position, tag.tag_type, size_field is not None))
+            regions.sort(key=lambda region: (region.start, region.position))
+            flash_map = tuple(regions)
+            object.__setattr__(self, '_flash_map', flash_map)
+        return flash_map
+
+    @property
+    def crc_valid(self) -> bool:
+        crc_valid = self._crc_valid
+        if crc_valid is None:
+            ends = self.tags_of(GblType.END)
+            end = ends[-1] if ends else None
+            crc_valid = end is not None and bool(end.fields) and \
+                zlib.crc32(memoryview(self.data)[:end.offset + 8]) & 0xFFFFFFFF == end.fields['gbl_crc']
+            object.__setattr__(self, '_crc_valid', crc_valid)
+        return crc_valid
+
+    def to_tags(self) -> List[Tag]:
+        """
+        Returns new mutable tags for editing; the frozen view is not affected.
+        """
+        result = Gbl().parse_byte_array(self.data)
+        return getattr(result, 'result_list', [])
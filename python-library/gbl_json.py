@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+GBL JSON export - writes GBL tags as a JSON document or as NDJSON (one tag
+per line) with payloads streamed in fixed-size base64 or hex chunks, or
+replaced by their hash, and reads such output back into tags or a
+GblBuilder.
+
+Usage: python gbl_json.py FILE.gbl [--ndjson] [--payload base64|hex|hash]
+"""
+
+import argparse
+import base64
+import binascii
+import hashlib
+import json
+import mmap
+import struct
+import sys
+from typing import Iterable, Iterator, Optional, TextIO, Tuple
+
+from gbl import (FIXED_FIELDS, GblBuilder, GblType, Tag, TagWithHeader, generate_tag_data, mark_parsed,
+                 parse_tag_type, scan_tags)
+
+FORMAT_NAME = "gbl-json"
+FORMAT_VERSION = 1
+
+PAYLOAD_ENCODINGS = ("base64", "hex", "hash")
+DEFAULT_CHUNK_SIZE = 48 * 1024
+
+# (offset, tag id, tag length, payload buffer)
+_Record = Tuple[Optional[int], int, int, object]
+
+
+def export_tags(tags: Iterable[Tag], fp: TextIO, ndjson: bool = False, payload: str = "base64",
+                chunk_size: int = DEFAULT_CHUNK_SIZE, hash_algorithm: str = "sha256") -> int:
+    """
+    Writes parsed or built tags to the text file object fp. Returns the
+    number of tags written.
+    """
+    records = ((tag.source_offset, tag.tag_header.id, tag.tag_header.length, generate_tag_data(tag))
+               for tag in tags if isinstance(tag, TagWithHeader))
+    return _export(records, fp, ndjson, payload, chunk_size, hash_algorithm)
+
+
+def export_bytes(byte_array, fp: TextIO, ndjson: bool = False, payload: str = "base64",
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, hash_algorithm: str = "sha256") -> int:
+    """
+    Writes the tags of a GBL image given as a bytes-like buffer (bytes,
+    memoryview, mmap). Payloads are read from the buffer in chunks and
+    never copied whole, so memory use does not depend on the image size.
+    """
+    view = memoryview(byte_array)
+    entries, _ = scan_tags(view)
+    records = ((entry.offset, entry.id, entry.length, view[entry.data_offset:entry.end])
+               for entry in entries)
+    try:
+        return _export(records, fp, ndjson, payload, chunk_size, hash_algorithm)
+    finally:
+        view.release()
+
+
+def export_file(path: str, fp: TextIO, ndjson: bool = False, payload: str = "base64",
+                chunk_size: int = DEFAULT_CHUNK_SIZE, hash_algorithm: str = "sha256") -> int:
+    with open(path, 'rb') as f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped.
+            return export_bytes(b'', fp, ndjson, payload, chunk_size, hash_algorithm)
+        try:
+            return export_bytes(buffer, fp, ndjson, payload, chunk_size, hash_algorithm)
+        finally:
+            try:
+                buffer.close()
+            except BufferError:
+                # A write failed and the traceback still holds payload views;
+                # the mapping is released with them.
+                pass
+
+
+def _export(records: Iterable[_Record], fp: TextIO, ndjson: bool, payload: str,
+            chunk_size: int, hash_algorithm: str) -> int:
+    if payload not in PAYLOAD_ENCODINGS:
+        raise ValueError(f"Unknown payload encoding: {payload}")
+    if payload == "base64":
+        # Whole base64 groups, so the chunks concatenate without padding.
+        chunk_size = max(3, chunk_size - chunk_size % 3)
+
+    if not ndjson:
+        fp.write(f'{{"format": "{FORMAT_NAME}", "version": {FORMAT_VERSION}, "tags": [')
+
+    count = 0
+    for position, (offset, tag_id, length, data) in enumerate(records):
+        if not ndjson:
+            fp.write(",\n" if count else "\n")
+        _write_record(fp, position, offset, tag_id, length, data, payload, chunk_size, hash_algorithm)
+        if ndjson:
+            fp.write("\n")
+        count += 1
+
+    if not ndjson:
+        fp.write("\n]}\n")
+    return count
+
+
+def _write_record(fp: TextIO, position: int, offset: Optional[int], tag_id: int, length: int, data,
+                  payload: str, chunk_size: int, hash_algorithm: str) -> None:
+    tag_type = GblType.from_value(tag_id)
+    head = {
+        "position": position,
+        "offset": offset,
+        "tag_id": tag_id,
+        "tag_type": tag_type.name if tag_type else None,
+        "length": length,
+    }
+    layout = FIXED_FIELDS.get(tag_id)
+    if layout is not None and length >= struct.calcsize(layout[0]):
+        head["fields"] = dict(zip(layout[1], struct.unpack_from(layout[0], data, 0)))
+
+    view = memoryview(data)
+    digest = hashlib.new(hash_algorithm)
+    fp.write(json.dumps(head)[:-1])
+
+    if payload == "hash":
+        for start in range(0, len(view), chunk_size):
+            digest.update(view[start:start + chunk_size])
+    else:
+        encode = _encode_base64 if payload == "base64" else _encode_hex
+        fp.write(f', "encoding": "{payload}", "payload": "')
+        for start in range(0, len(view), chunk_size):
+            chunk = view[start:start + chunk_size]
+            digest.update(chunk)
+            fp.write(encode(chunk))
+        fp.write('"')
+
+    fp.write(f', "{hash_algorithm}": "{digest.hexdigest()}"}}')
+
+
+def _encode_base64(chunk) -> str:
+    return base64.b64encode(chunk).decode('ascii')
+
+
+def _encode_hex(chunk) -> str:
+    return binascii.hexlify(chunk).decode('ascii')
+
+
+def load_tags(fp: TextIO, ndjson: bool = False, passthrough: bool = False) -> Iterator[Tag]:
+    """
+    Reads tags written by export_tags/export_bytes/export_file. Payloads are
+    checked against their length and hash. Raises ValueError for malformed
+    records and for records exported with payload="hash", which cannot be
+    restored.
+
+    Loaded tags are new tags, so encoding them recomputes the END CRC. With
+    passthrough=True, tags whose record has a source offset and a matching
+    payload hash are marked as an unmodified parse from that offset, so an
+    unmodified load of a trusted export encodes back to the original bytes,
+    END CRC included.
+    """
+    if ndjson:
+        records = (json.loads(line) for line in fp if line.strip())
+    else:
+        document = json.load(fp)
+        if document.get("format") != FORMAT_NAME:
+            raise ValueError("Not a gbl-json document")
+        if document.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported gbl-json version: {document.get('version')}")
+        records = iter(document["tags"])
+
+    decoded = ((_decode_record(record), record.get("offset")) for record in records)
+    if not passthrough:
+        for (tag, _), _ in decoded:
+            yield tag
+        return
+    # A record without a hash cannot show that its payload is the one read
+    # from offset, so its tag stays dirty and the END CRC is recomputed.
+    yield from mark_parsed((tag, offset if hashed else None) for (tag, hashed), offset in decoded)
+
+
+def _decode_record(record: dict) -> Tuple[Tag, bool]:
+    """
+    Returns the tag and whether its payload was checked against a hash.
+    """
+    tag_id = record["tag_id"]
+    length = record["length"]
+    encoding = record.get("encoding")
+
+    if encoding == "base64":
+        data = base64.b64decode(record["payload"], validate=True)
+    elif encoding == "hex":
+        data = bytes.fromhex(record["payload"])
+    elif encoding is None:
+        raise ValueError(f"Tag {record.get('position')} was exported without its payload")
+    else:
+        raise ValueError(f"Unknown payload encoding: {encoding}")
+
+    if len(data) != length:
+        raise ValueError(f"Tag {record.get('position')}: payload is {len(data)} bytes, expected {length}")
+    hashed = False
+    for algorithm in hashlib.algorithms_guaranteed:
+        if algorithm in record:
+            if hashlib.new(algorithm, data).hexdigest() != record[algorithm]:
+                raise ValueError(f"Tag {record.get('position')}: {algorithm} mismatch")
+            hashed = True
+
+    return parse_tag_type(tag_id, length, data), hashed
+
+
+def load_builder(fp: TextIO, ndjson: bool = False) -> GblBuilder:
+    """
+    Reads exported tags into a new GblBuilder. HEADER and END tags are
+    skipped because the builder creates its own.
+    """
+    builder = GblBuilder.create()
+    for tag in load_tags(fp, ndjson):
+        if tag.tag_type in builder.container.PROTECTED_TAG_TYPES:
+            continue
+        builder.container.add(tag)
+    return builder
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Export a GBL file as JSON or NDJSON.")
+    parser.add_argument("file")
+    parser.add_argument("--ndjson", action="store_true", help="one tag per line")
+    parser.add_argument("--payload", choices=PAYLOAD_ENCODINGS, default="base64",
+                        help="payload encoding, or hash to write only a digest")
+    parser.add_argument("--hash", default="sha256", help="hash algorithm (default sha256)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    try:
+        export_file(args.file, sys.stdout, args.ndjson, args.payload, args.chunk_size, args.hash)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+GBL metrics - a GblObserver that aggregates per-stage and per-tag-type
+counts, bytes and cumulative time, with a Prometheus text exporter.
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from gbl import GblObserver, GblType, KNOWN_TAG_IDS
+
+# Tag ids outside the known set are counted together so that garbage ids in
+# damaged files cannot grow the label set without bound.
+UNKNOWN_TAG_ID = 0
+
+
+@dataclass
+class StageStats:
+    __slots__ = ('count', 'bytes', 'ns')
+
+    count: int
+    bytes: int
+    ns: int
+
+
+class GblMetrics(GblObserver):
+    """
+    Thread-safe metrics collector. Share one instance between Gbl and
+    GblBuilder objects and call to_prometheus() from the metrics endpoint.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tags: Dict[Tuple[str, int], StageStats] = {}
+        self._stages: Dict[str, StageStats] = {}
+
+    def on_tag(self, stage: str, tag_id: int, length: int, elapsed_ns: int) -> None:
+        key = (stage, tag_id if tag_id in KNOWN_TAG_IDS else UNKNOWN_TAG_ID)
+        with self._lock:
+            stats = self._tags.get(key)
+            if stats is None:
+                self._tags[key] = StageStats(1, length, elapsed_ns)
+            else:
+                stats.count += 1
+                stats.bytes += length
+                stats.ns += elapsed_ns
+
+    def on_stage(self, stage: str, size: int, elapsed_ns: int) -> None:
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                self._stages[stage] = StageStats(1, size, elapsed_ns)
+            else:
+                stats.count += 1
+                stats.bytes += size
+                stats.ns += elapsed_ns
+
+    def tag_stats(self) -> Dict[Tuple[str, str], StageStats]:
+        """
+        Returns a copy of the per-tag counters keyed by (stage, tag type name).
+        """
+        with self._lock:
+            items = [(key, StageStats(s.count, s.bytes, s.ns)) for key, s in self._tags.items()]
+        return {(stage, _tag_name(tag_id)): stats for (stage, tag_id), stats in items}
+
+    def stage_stats(self) -> Dict[str, StageStats]:
+        with self._lock:
+            return {stage: StageStats(s.count, s.bytes, s.ns) for stage, s in self._stages.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._tags.clear()
+            self._stages.clear()
+
+    def to_prometheus(self, prefix: str = "gbl") -> str:
+        """
+        Returns a snapshot in the Prometheus text exposition format.
+        """
+        tags = sorted(self.tag_stats().items())
+        stages = sorted(self.stage_stats().items())
+
+        lines: List[str] = []
+        families = [
+            ("tag_total", "Tags processed, by stage and tag type.", 'count'),
+            ("tag_bytes_total", "Tag payload bytes processed, by stage and tag type.", 'bytes'),
+            ("tag_seconds_total", "Time spent per tag, by stage and tag type.", 'ns'),
+        ]
+        for name, help_text, attr in families:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            for (stage, tag_type), stats in tags:
+                lines.append(f'{prefix}_{name}{{stage="{stage}",tag_type="{tag_type}"}} '
+                             f'{_format_value(stats, attr)}')
+
+        families = [
+            ("stage_total", "Completed operations, by stage.", 'count'),
+            ("stage_bytes_total", "Bytes processed, by stage.", 'bytes'),
+            ("stage_seconds_total", "Time spent, by stage.", 'ns'),
+        ]
+        for name, help_text, attr in families:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            for stage, stats in stages:
+                lines.append(f'{prefix}_{name}{{stage="{stage}"}} {_format_value(stats, attr)}')
+
+        return "\n".join(lines) + "\n"
+
+
+def _tag_name(tag_id: int) -> str:
+    tag_type = GblType.from_value(tag_id)
+    return tag_type.name if tag_type is not None else GblType.TAG.name
+
+
+def _format_value(stats: StageStats, attr: str) -> str:
+    if attr == 'ns':
+        return repr(stats.ns / 1e9)
+    return str(getattr(stats, attr))
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+GBL deduplicating store - splits GBL files into tag records, keeps payload
+chunks once by SHA-256 in append-only pack files, and rebuilds the original
+bytes on demand as a stream with CRC verification.
+"""
+
+import hashlib
+import io
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, List, Union
+
+from gbl import FIXED_FIELDS, GblType, scan_tags
+
+
+class StoreError(Exception):
+    pass
+
+
+@dataclass
+class PutStats:
+    name: str
+    size: int
+    chunks: int
+    new_chunks: int
+    new_bytes: int
+
+
+@dataclass
+class StoreStats:
+    files: int
+    logical_bytes: int
+    chunks: int
+    stored_bytes: int
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    hash BLOB PRIMARY KEY,
+    pack INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS manifests (
+    name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    crc32 INTEGER NOT NULL,
+    manifest TEXT NOT NULL
+);
+"""
+
+# Fixed fields kept inline with the tag header so that chunks hold only the
+# payload and line up between releases that move the same image around.
+_PAYLOAD_PREFIX = {
+    tag_type.value: struct.calcsize(FIXED_FIELDS[tag_type.value][0])
+    for tag_type in (GblType.PROG, GblType.PROG_LZ4, GblType.PROG_LZMA, GblType.BOOTLOADER, GblType.SE_UPGRADE)
+}
+
+_GEAR = [int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], 'little') for i in range(256)]
+_MASK_64 = 0xFFFFFFFFFFFFFFFF
+
+
+def fixed_chunks(payload: memoryview, chunk_size: int) -> List[memoryview]:
+    return [payload[i:i + chunk_size] for i in range(0, len(payload), chunk_size)]
+
+
+def content_defined_chunks(payload: memoryview, chunk_size: int) -> List[memoryview]:
+    """
+    Gear-hash content-defined chunking with an average chunk size of about
+    chunk_size bytes, bounded to [chunk_size / 4, chunk_size * 4]. Survives
+    insertions that shift the payload, at a much lower throughput than
+    fixed_chunks since the rolling hash runs in Python.
+    """
+    min_size = max(64, chunk_size // 4)
+    max_size = chunk_size * 4
+    mask = (1 << max(1, chunk_size.bit_length() - 1)) - 1
+    gear = _GEAR
+
+    chunks = []
+    start = 0
+    size = len(payload)
+    while start < size:
+        end = min(start + max_size, size)
+        position = start + min_size
+        fingerprint = 0
+        cut = end
+        for position in range(position, end):
+            fingerprint = ((fingerprint << 1) + gear[payload[position]]) & _MASK_64
+            if fingerprint & mask == 0:
+                cut = position + 1
+                break
+        chunks.append(payload[start:cut])
+        start = cut
+    return chunks
+
+
+class GblStore:
+    """
+    Content-addressed store for GBL files.
+
+    Each stored file becomes a manifest of records: the raw tag header with
+    the tag's fixed fields, followed by the hashes of its payload chunks.
+    Payloads up to inline_limit bytes stay in the manifest. Chunks are split
+    at page boundaries (chunking="fixed") or by content ("cdc").
+    """
+
+    PACK_LIMIT = 256 * 1024 * 1024
+    READ_COALESCE = 1024 * 1024
+
+    def __init__(self, root: str, chunk_size: int = 8192, chunking: str = "fixed",
+                 inline_limit: int = 512):
+        if chunking not in ("fixed", "cdc"):
+            raise ValueError(f"Unknown chunking: {chunking}")
+
+        self.root = root
+        self.chunk_size = chunk_size
+        self.chunking = chunking
+        self.inline_limit = inline_limit
+
+        os.makedirs(os.path.join(root, "packs"), exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(root, "store.db"))
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> 'GblStore':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def put(self, name: str, source: Union[str, bytes]) -> PutStats:
+        """
+        Stores a GBL given as a path (read through mmap) or as bytes.
+        """
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return self._put_buffer(name, memoryview(source))
+
+        with open(source, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return self._put_buffer(name, memoryview(b''))
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    return self._put_buffer(name, view)
+                finally:
+                    view.release()
+
+    def get(self, name: str, fp: BinaryIO, verify_chunks: bool = False) -> int:
+        """
+        Streams the original bytes of name into fp and returns the number of
+        bytes written. Raises StoreError if the rebuilt data does not match
+        the stored size and CRC32 of the whole file; fp then holds the
+        damaged output. The END tag CRC is not checked: the original bytes
+        are returned even when it was wrong in the stored file.
+        """
+        size, crc32, records = self._manifest(name)
+        locations = self._locations(records)
+
+        crc = 0
+        written = 0
+        packs: Dict[int, BinaryIO] = {}
+        try:
+            for record in records:
+                head = bytes.fromhex(record["head"])
+                fp.write(head)
+                crc = zlib.crc32(head, crc)
+                written += len(head)
+
+                for data in self._read_chunks(record.get("chunks", []), locations, packs, verify_chunks):
+                    fp.write(data)
+                    crc = zlib.crc32(data, crc)
+                    written += len(data)
+        finally:
+            for pack in packs.values():
+                pack.close()
+
+        if written != size or crc & 0xFFFFFFFF != crc32:
+            raise StoreError(f"Rebuilt data for {name} does not match the stored CRC")
+        return written
+
+    def get_file(self, name: str, path: str, verify_chunks: bool = False) -> int:
+        """
+        Rebuilds name into path; the file only appears once verified.
+        """
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                written = self.get(name, f, verify_chunks)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return written
+
+    def get_bytes(self, name: str, verify_chunks: bool = False) -> bytes:
+        buffer = io.BytesIO()
+        self.get(name, buffer, verify_chunks)
+        return buffer.getvalue()
+
+    def delete(self, name: str) -> bool:
+        """
+        Removes the manifest of name. Chunks stay in the packs.
+        """
+        with self.connection:
+            cursor = self.connection.execute("DELETE FROM manifests WHERE name = ?", (name,))
+        return cursor.rowcount > 0
+
+    def names(self) -> List[str]:
+        return [name for (name,) in self.connection.execute("SELECT name FROM manifests ORDER BY name")]
+
+    def stats(self) -> StoreStats:
+        files, logical = self.connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM manifests").fetchone()
+        chunks, stored = self.connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks").fetchone()
+        return StoreStats(files=files, logical_bytes=logical, chunks=chunks, stored_bytes=stored)
+
+    def _put_buffer(self, name: str, view: memoryview) -> PutStats:
+        entries, end = scan_tags(view)
+        split = content_defined_chunks if self.chunking == "cdc" else fixed_chunks
+
+        records = []
+        chunk_count = 0
+        new_chunks = 0
+        new_bytes = 0
+        crc32 = zlib.crc32(view) & 0xFFFFFFFF
+
+        pack_id, pack = self._open_pack()
+        try:
+            with self.connection:
+                for entry in entries:
+                    prefix = min(_PAYLOAD_PREFIX.get(entry.id, 0), entry.length)
+                    payload_start = entry.data_offset + prefix
+                    if entry.end - payload_start <= self.inline_limit:
+                        records.append({"head": view[entry.offset:entry.end].hex()})
+                        continue
+
+                    hashes = []
+                    for chunk in split(view[payload_start:entry.end], self.chunk_size):
+                        digest = hashlib.sha256(chunk).digest()
+                        hashes.append(digest.hex())
+                        chunk_count += 1
+                        if self._has_chunk(digest):
+                            continue
+                        offset = pack.tell()
+                        pack.write(chunk)
+                        self.connection.execute(
+                            "INSERT INTO chunks (hash, pack, offset, length) VALUES (?, ?, ?, ?)",
+                            (digest, pack_id, offset, len(chunk))
+                        )
+                        new_chunks += 1
+                        new_bytes += len(chunk)
+
+                    records.append({"head": view[entry.offset:payload_start].hex(), "chunks": hashes})
+
+                if end < len(view):
+                    records.append({"head": view[end:].hex()})
+
+                pack.flush()
+                os.fsync(pack.fileno())
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO manifests (name, size, crc32, manifest) VALUES (?, ?, ?, ?)",
+                    (name, len(view), crc32, json.dumps({"version": 1, "records": records}))
+                )
+        finally:
+            pack.close()
+
+        return PutStats(name=name, size=len(view), chunks=chunk_count,
+                        new_chunks=new_chunks, new_bytes=new_bytes)
+
+    def _has_chunk(self, digest: bytes) -> bool:
+        return self.connection.execute("SELECT 1 FROM chunks WHERE hash = ?", (digest,)).fetchone() is not None
+
+    def _open_pack(self):
+        row = self.connection.execute("SELECT MAX(pack) FROM chunks").fetchone()
+        pack_id = row[0] or 1
+        path = self._pack_path(pack_id)
+        if os.path.exists(path) and os.path.getsize(path) >= self.PACK_LIMIT:
+            pack_id += 1
+            path = self._pack_path(pack_id)
+        pack = open(path, 'ab')
+        pack.seek(0, os.SEEK_END)
+        return pack_id, pack
+
+    def _pack_path(self, pack_id: int) -> str:
+        return os.path.join(self.root, "packs", f"{pack_id:08d}.pack")
+
+    def _manifest(self, name: str):
+        row = self.connection.execute(
+            "SELECT size, crc32, manifest FROM manifests WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        size, crc32, manifest = row
+        return size, crc32, json.loads(manifest)["records"]
+
+    def _locations(self, records) -> Dict[str, tuple]:
+        hashes = {digest for record in records for digest in record.get("chunks", [])}
+        locations = {}
+        cursor = self.connection.cursor()
+        for digest in hashes:
+            row = cursor.execute("SELECT pack, offset, length FROM chunks WHERE hash = ?",
+                                 (bytes.fromhex(digest),)).fetchone()
+            if row is None:
+                raise StoreError(f"Missing chunk {digest}")
+            locations[digest] = row
+        return locations
+
+    def _read_chunks(self, hashes: List[str], locations, packs, verify: bool):
+        """
+        Yields chunk contents in order, merging reads of chunks that sit next
+        to each other in the same pack.
+        """
+        position = 0
+        while position < len(hashes):
+            pack_id, offset, length = locations[hashes[position]]
+            run = [length]
+            run_length = length
+            while position + len(run) < len(hashes) and run_length < self.READ_COALESCE:
+                next_pack, next_offset, next_length = locations[hashes[position + len(run)]]
+                if next_pack != pack_id or next_offset != offset + run_length:
+                    break
+                run.append(next_length)
+                run_length += next_length
+
+            pack = packs.get(pack_id)
+            if pack is None:
+                pack = packs[pack_id] = open(self._pack_path(pack_id), 'rb')
+            pack.seek(offset)
+            data = pack.read(run_length)
+            if len(data) != run_length:
+                raise StoreError(f"Pack {pack_id} is truncated")
+
+            if verify:
+                view = memoryview(data)
+                start = 0
+                for index, length in enumerate(run):
+                    if hashlib.sha256(view[start:start + length]).hexdigest() != hashes[position + index]:
+                        raise StoreError(f"Chunk {hashes[position + index]} is corrupted")
+                    start += length
+
+            yield data
+            position += len(run)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+GBL tag table - one row per tag across many files, stored column by column
+so fleet-wide aggregates are array operations instead of attribute access
+on millions of Tag objects. Columns are array-module arrays; with NumPy
+installed, to_numpy() returns them as one structured array.
+"""
+
+import mmap
+import os
+import struct
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from gbl import (FIXED_FIELDS, FLASH_ADDRESS_OFFSETS, GblIndex, GblType, ParseLimitError, ParseLimits, Tag,
+                 TagIndexEntry, TagWithHeader, generate_tag_data, scan_tags)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Value of flash_address and the app_* columns in rows that have none.
+MISSING = -1
+
+# (name, array typecode); the typecodes are valid NumPy dtypes too.
+COLUMNS = (
+    ('file_id', 'I'),
+    ('position', 'I'),
+    ('offset', 'Q'),
+    ('tag_id', 'I'),
+    ('length', 'I'),
+    ('flash_address', 'q'),
+    ('app_type', 'q'),
+    ('app_version', 'q'),
+    ('app_capabilities', 'q'),
+    ('app_product_id', 'q'),
+)
+
+_APPLICATION = struct.Struct(FIXED_FIELDS[GblType.APPLICATION.value][0])
+
+
+class GblTagTable:
+    """
+    Columnar tag table. paths[file_id] is the file a row belongs to;
+    errors lists (path, message) for files that could not be read, which
+    keep their file id but have no rows.
+    """
+
+    def __init__(self):
+        self.paths: List[str] = []
+        self.errors: List[Tuple[str, str]] = []
+        self.columns: Dict[str, array] = {name: array(typecode) for name, typecode in COLUMNS}
+
+    def __len__(self) -> int:
+        return len(self.columns['file_id'])
+
+    @classmethod
+    def from_files(cls, paths: Iterable[str], workers: Optional[int] = None,
+                   limits: Optional[ParseLimits] = None) -> 'GblTagTable':
+        """
+        Builds a table from header-only scans of the files. workers=1 scans
+        in-process; otherwise chunks of files are scanned in worker
+        processes and their tables concatenated in order.
+        """
+        paths = list(paths)
+        if workers == 1 or len(paths) < 2:
+            return _table_for(paths, limits)
+
+        table = cls()
+        chunk_size = max(1, len(paths) // 64)
+        chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for part in executor.map(_table_for, chunks, [limits] * len(chunks)):
+                table.extend(part)
+        return table
+
+    def add_file(self, path: str, limits: Optional[ParseLimits] = None) -> int:
+        """
+        Memory-maps path and adds its tags from a header-only scan.
+        """
+        try:
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        except (OSError, ValueError) as e:
+            self.errors.append((path, str(e)))
+            return self._new_file(path)
+
+        try:
+            entries, _ = scan_tags(buffer, limits=limits)
+            return self.add_entries(path, entries, buffer)
+        except ParseLimitError as e:
+            self.errors.append((path, str(e)))
+            return self._new_file(path)
+        finally:
+            if isinstance(buffer, mmap.mmap):
+                buffer.close()
+
+    def add_entries(self, path: str, entries: List[TagIndexEntry], buffer) -> int:
+        """
+        Adds the result of scan_tags(buffer); only the fixed fields of PROG,
+        BOOTLOADER and APPLICATION tags are read from buffer.
+        """
+        file_id = self._new_file(path)
+        self._append(file_id, ((entry.offset, entry.id, entry.length, buffer, entry.data_offset)
+                               for entry in entries))
+        return file_id
+
+    def add_index(self, index: GblIndex, path: Optional[str] = None) -> int:
+        if index.source is None:
+            raise ValueError("Index is detached from its source data")
+        return self.add_entries(path if path is not None else index.path, index.entries, index.source)
+
+    def add_tags(self, path: str, tags: List[Tag]) -> int:
+        """
+        Adds parsed or built tags. Offsets are the parse offsets where known,
+        otherwise the offsets the tags would have when encoded.
+        """
+        rows = []
+        offset = 0
+        for tag in tags:
+            if not isinstance(tag, TagWithHeader):
+                continue
+            if tag.source_offset is not None:
+                offset = tag.source_offset
+            rows.append((offset, tag.tag_header.id, tag.tag_header.length, generate_tag_data(tag), 0))
+            offset += 8 + tag.tag_header.length
+
+        file_id = self._new_file(path)
+        self._append(file_id, rows)
+        return file_id
+
+    def extend(self, other: 'GblTagTable') -> None:
+        """
+        Appends the rows of other, renumbering its file ids.
+        """
+        base = len(self.paths)
+        self.paths.extend(other.paths)
+        self.errors.extend(other.errors)
+        for name, typecode in COLUMNS:
+            column = other.columns[name]
+            if name == 'file_id' and base:
+                column = array(typecode, [file_id + base for file_id in column])
+            self.columns[name].extend(column)
+
+    def to_numpy(self):
+        """
+        Returns the rows as a NumPy structured array with one field per
+        column. Raises ImportError when NumPy is not installed.
+        """
+        if numpy is None:
+            raise ImportError("to_numpy() needs NumPy")
+        table = numpy.empty(len(self), dtype=list(COLUMNS))
+        if len(self):
+            for name, typecode in COLUMNS:
+                table[name] = numpy.frombuffer(self.columns[name], dtype=typecode)
+        return table
+
+    def totals_by_type(self) -> Dict[int, Tuple[int, int]]:
+        """
+        Returns tag id -> (number of tags, total payload bytes).
+        """
+        tag_ids, lengths = self.columns['tag_id'], self.columns['length']
+        if numpy is not None and len(self):
+            unique, inverse = numpy.unique(numpy.frombuffer(tag_ids, dtype='I'), return_inverse=True)
+            counts = numpy.bincount(inverse, minlength=len(unique))
+            sizes = numpy.zeros(len(unique), dtype='Q')
+            numpy.add.at(sizes, inverse, numpy.frombuffer(lengths, dtype='I'))
+            return {int(tag_id): (int(count), int(size)) for tag_id, count, size in zip(unique, counts, sizes)}
+
+        totals: Dict[int, List[int]] = {}
+        for tag_id, length in zip(tag_ids, lengths):
+            total = totals.get(tag_id)
+            if total is None:
+                totals[tag_id] = [1, length]
+            else:
+                total[0] += 1
+                total[1] += length
+        return {tag_id: (count, size) for tag_id, (count, size) in totals.items()}
+
+    def _new_file(self, path: str) -> int:
+        self.paths.append(path)
+        return len(self.paths) - 1
+
+    def _append(self, file_id: int, rows: Iterable[Tuple[int, int, int, object, int]]) -> None:
+        (file_ids, positions, offsets, tag_ids, lengths, addresses,
+         app_types, app_versions, app_capabilities, app_product_ids) = (self.columns[name] for name, _ in COLUMNS)
+        application_id = GblType.APPLICATION.value
+        unpack_address = struct.Struct('<I').unpack_from
+        unpack_application = _APPLICATION.unpack_from
+
+        for position, (offset, tag_id, length, buffer, data_offset) in enumerate(rows):
+            file_ids.append(file_id)
+            positions.append(position)
+            offsets.append(offset)
+            tag_ids.append(tag_id)
+            lengths.append(length)
+
+            address_offset = FLASH_ADDRESS_OFFSETS.get(tag_id)
+            if address_offset is not None and length >= address_offset + 4:
+                addresses.append(unpack_address(buffer, data_offset + address_offset)[0])
+            else:
+                addresses.append(MISSING)
+
+            if tag_id == application_id and length >= _APPLICATION.size:
+                app_type, version, capabilities, product_id = unpack_application(buffer, data_offset)
+            else:
+                app_type = version = capabilities = product_id = MISSING
+            app_types.append(app_type)
+            app_versions.append(version)
+            app_capabilities.append(capabilities)
+            app_product_ids.append(product_id)
+
+
+def _table_for(paths: List[str], limits: Optional[ParseLimits] = None) -> GblTagTable:
+    """
+    Scans paths into a new table. Runs in worker processes.
+    """
+    table = GblTagTable()
+    for path in paths:
+        table.add_file(path, limits)
+    return table
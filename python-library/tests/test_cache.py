@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Tests for GblCache: hits for unchanged files, invalidation when a file
+changes or on request, digest checks and LRU eviction by size.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from gbl import GblBuilder, GblIndex, ParseResultFatal, ParseResultSuccess  # noqa: E402
+from gbl_cache import GblCache  # noqa: E402
+
+
+def image(version: int, size: int = 100) -> bytes:
+    return GblBuilder.create().application(version=version).prog(0, bytes(size)).build_to_byte_array()
+
+
+def version_of(result) -> int:
+    return result.result_list[1].application_data.version
+
+
+class CoarseTimestampCache(GblCache):
+    """A cache on a filesystem whose timestamps do not change on rewrites."""
+
+    @staticmethod
+    def _signature(st):
+        return st.st_size, 0, 0, st.st_ino
+
+
+class GblCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def write(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.root, name)
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+            f.write(data)
+            f.truncate()
+        return path
+
+    def test_hit(self):
+        cache = GblCache()
+        path = self.write("a.gbl", image(1))
+        first = cache.parse_file(path)
+        self.assertIsInstance(first, ParseResultSuccess)
+        self.assertIs(cache.parse_file(path), first)
+        # Another spelling of the same path shares the entry.
+        self.assertIs(cache.parse_file(os.path.join(self.root, ".", "a.gbl")), first)
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.entries), (2, 1, 1))
+        self.assertEqual(stats.current_bytes, len(image(1)))
+
+    def test_parse_and_index_are_separate(self):
+        cache = GblCache()
+        path = self.write("a.gbl", image(1))
+        parsed = cache.parse_file(path)
+        index = cache.index_file(path)
+        self.assertIsInstance(index, GblIndex)
+        self.assertIs(cache.index_file(path), index)
+        self.assertIs(cache.parse_file(path), parsed)
+        self.assertEqual(len(cache), 2)
+
+    def test_rewritten_file_is_parsed_again(self):
+        cache = GblCache()
+        path = self.write("a.gbl", image(1))
+        self.assertEqual(version_of(cache.parse_file(path)), 1)
+        self.write("a.gbl", image(2, size=200))
+        self.assertEqual(version_of(cache.parse_file(path)), 2)
+        stats = cache.stats()
+        self.assertEqual((stats.misses, stats.invalidations, stats.entries), (2, 1, 1))
+        self.assertEqual(stats.current_bytes, len(image(2, size=200)))
+
+    def test_replaced_file_is_parsed_again(self):
+        cache = GblCache()
+        path = self.write("a.gbl", image(1))
+        cache.parse_file(path)
+        os.replace(self.write("b.gbl", image(2)), path)
+        self.assertEqual(version_of(cache.parse_file(path)), 2)
+
+    def test_digest_catches_same_signature_rewrite(self):
+        for verify_digest, expected in ((False, 1), (True, 2)):
+            with self.subTest(verify_digest=verify_digest):
+                cache = CoarseTimestampCache(verify_digest=verify_digest)
+                path = self.write("a.gbl", image(1))
+                cache.parse_file(path)
+                # Same size, new content, written in place.
+                self.write("a.gbl", image(2))
+                self.assertEqual(version_of(cache.parse_file(path)), expected)
+
+    def test_invalidate(self):
+        cache = GblCache()
+        a = self.write("a.gbl", image(1))
+        b = self.write("b.gbl", image(2))
+        first = cache.parse_file(a)
+        cache.index_file(a)
+        cache.parse_file(b)
+
+        cache.invalidate(a)
+        self.assertEqual(len(cache), 1)
+        self.assertIsNot(cache.parse_file(a), first)
+        cache.invalidate()
+        stats = cache.stats()
+        self.assertEqual((stats.entries, stats.current_bytes, stats.invalidations), (0, 0, 4))
+
+    def test_lru_eviction(self):
+        size = len(image(1))
+        cache = GblCache(max_bytes=2 * size)
+        paths = [self.write(f"{i}.gbl", image(i)) for i in range(3)]
+        results = [cache.parse_file(path) for path in paths[:2]]
+        # Touch the first file so the second one is the least recently used.
+        cache.parse_file(paths[0])
+        cache.parse_file(paths[2])
+        self.assertEqual(cache.stats().evictions, 1)
+        self.assertIs(cache.parse_file(paths[0]), results[0])
+        self.assertIsNot(cache.parse_file(paths[1]), results[1])
+
+    def test_not_cached(self):
+        cache = GblCache(max_bytes=100)
+        large = self.write("large.gbl", image(1, size=200))
+        broken = self.write("broken.gbl", b'\x00' * 4)
+        cache.parse_file(large)
+        self.assertIsInstance(cache.parse_file(broken), ParseResultFatal)
+        self.assertEqual(len(cache), 0)
+
+    def test_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            GblCache().parse_file(os.path.join(self.root, "missing.gbl"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Tests for gbl_crypto: AES backends against the FIPS-197 and SP 800-38A
+vectors, and an encrypt -> encode -> parse -> edit -> encode -> decrypt
+round trip through real GBL images.
+"""
+
+import os
+import sys
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from gbl import (Gbl, GblBuilder, GblEncryptionInitAesCcm, GblType, ParseResultSuccess,  # noqa: E402
+                 TagContainer, TagHeader, encode_tags)
+from gbl_crypto import (BACKENDS, AesBackend, PythonBackend, counter_block, decrypt_tags,  # noqa: E402
+                        default_backend, encrypt_tags, self_test)
+
+# FIPS-197 appendix C: (key, plaintext, ciphertext) for single blocks.
+AES_TEST_VECTORS = (
+    ('000102030405060708090a0b0c0d0e0f',
+     '00112233445566778899aabbccddeeff', '69c4e0d86a7b0430d8cdb78070b4c55a'),
+    ('000102030405060708090a0b0c0d0e0f1011121314151617',
+     '00112233445566778899aabbccddeeff', 'dda97ca4864cdfe06eaf70a0ec0d7191'),
+    ('000102030405060708090a0b0c0d0e0f101112131415161718191a1b1c1d1e1f',
+     '00112233445566778899aabbccddeeff', '8ea2b7ca516745bfeafc49904b496089'),
+)
+
+# NIST SP 800-38A F.5.1 CTR-AES128: (key, initial counter block, plaintext, ciphertext).
+CTR_TEST_VECTORS = (
+    ('2b7e151628aed2a6abf7158809cf4f3c', 'f0f1f2f3f4f5f6f7f8f9fafbfcfdfeff',
+     '6bc1bee22e409f96e93d7e117393172aae2d8a571e03ac9c9eb76fac45af8e51'
+     '30c81c46a35ce411e5fbc1191a0a52eff69f2445df4f9b17ad2b417be66c3710',
+     '874d6191b620e3261bef6864990db6ce9806f66b7970fdff8617187bb9fffdff'
+     '5ae4df3edbd5d35e5b4f09020db03eab1e031dda2fbe03d1792170a0f3009cee'),
+)
+
+KEY = bytes.fromhex(CTR_TEST_VECTORS[0][0])
+NONCE = bytes(range(GblEncryptionInitAesCcm.NONCE_SIZE))
+
+
+def available_backends():
+    backends = []
+    for backend_class in BACKENDS:
+        try:
+            backends.append(backend_class())
+        except ImportError:
+            continue
+    return backends
+
+
+class BrokenBackend(AesBackend):
+    name = 'broken'
+
+    def ctr(self, key, counter_block):
+        return lambda data: bytes(len(data))
+
+
+class AesBackendTest(unittest.TestCase):
+
+    def test_block_vectors(self):
+        for backend in available_backends():
+            for key, plaintext, ciphertext in AES_TEST_VECTORS:
+                with self.subTest(backend=backend.name, key_bits=len(key) * 4):
+                    # A single ECB block is CTR over a zero block with the plaintext as counter.
+                    update = backend.ctr(bytes.fromhex(key), bytes.fromhex(plaintext))
+                    self.assertEqual(update(bytes(16)), bytes.fromhex(ciphertext))
+
+    def test_ctr_vectors_whole_and_split(self):
+        for backend in available_backends():
+            for key, counter, plaintext, ciphertext in CTR_TEST_VECTORS:
+                key, counter = bytes.fromhex(key), bytes.fromhex(counter)
+                plaintext, ciphertext = bytes.fromhex(plaintext), bytes.fromhex(ciphertext)
+                with self.subTest(backend=backend.name):
+                    self.assertEqual(backend.ctr(key, counter)(plaintext), ciphertext)
+                    update = backend.ctr(key, counter)
+                    split = update(plaintext[:5]) + update(plaintext[5:37]) + update(plaintext[37:])
+                    self.assertEqual(split, ciphertext)
+
+    def test_self_test(self):
+        for backend in available_backends():
+            self_test(backend)
+        with self.assertRaises(RuntimeError):
+            self_test(BrokenBackend())
+
+    def test_default_backend(self):
+        self.assertIs(default_backend(), default_backend())
+
+    def test_counter_block(self):
+        self.assertEqual(counter_block(NONCE), b'\x02' + NONCE + b'\x00\x00\x01')
+        with self.assertRaises(ValueError):
+            counter_block(NONCE[:8])
+
+
+class RoundTripTest(unittest.TestCase):
+
+    def round_trip(self, backend, chunk_size):
+        inner = GblBuilder.create().application().prog(0x1000, bytes(range(256)) * 3).metadata(b'inner').get()
+        plaintext = encode_tags([tag for tag in inner if tag.tag_type not in TagContainer.PROTECTED_TAG_TYPES])
+
+        outer = GblBuilder.create().metadata(b'outer').get()
+        image = Gbl().encode(outer[:1] + encrypt_tags(inner, KEY, NONCE, backend) + outer[1:])
+        tags = Gbl().parse_byte_array(image).result_list
+        # Re-generate every tag from its fields and change the outer metadata.
+        for tag in tags:
+            tag.mark_dirty()
+        metadata = tags[-2]
+        self.assertEqual(metadata.tag_type, GblType.METADATA)
+        metadata.meta_data = b'edited'
+        metadata.tag_header = TagHeader(metadata.tag_header.id, len(b'edited'))
+
+        edited = Gbl().encode(tags)
+        self.assertEqual(len(edited), len(image) + len(b'edited') - len(b'outer'))
+        result = decrypt_tags(Gbl().parse_byte_array(edited).result_list, KEY,
+                              backend=backend, chunk_size=chunk_size)
+        self.assertIsInstance(result, ParseResultSuccess)
+        self.assertIsNone(result.stop_reason)
+        self.assertEqual(encode_tags(result.result_list), plaintext)
+
+    def test_round_trip(self):
+        for backend in available_backends():
+            for chunk_size in (7, 64 * 1024):
+                with self.subTest(backend=backend.name, chunk_size=chunk_size):
+                    self.round_trip(backend, chunk_size)
+
+    def test_wrong_key_does_not_give_plaintext(self):
+        backend = PythonBackend()
+        inner = GblBuilder.create().application().metadata(b'inner').get()
+        image = Gbl().encode(GblBuilder.create().get()[:1] + encrypt_tags(inner, KEY, NONCE, backend))
+        result = decrypt_tags(Gbl().parse_byte_array(image).result_list, bytes(16), backend=backend)
+        plaintext = encode_tags([tag for tag in inner if tag.tag_type not in TagContainer.PROTECTED_TAG_TYPES])
+        self.assertFalse(isinstance(result, ParseResultSuccess) and result.stop_reason is None
+                         and encode_tags(result.result_list) == plaintext)
+
+
+if __name__ == "__main__":
+    unittest.main()
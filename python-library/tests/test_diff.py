@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Tests for gbl_diff: changed block ranges, fixed-field changes, flash
+addresses for PROG and BOOTLOADER, and added, removed and trailing data.
+"""
+
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from gbl import GblBuilder, GblType  # noqa: E402
+from gbl_diff import ADDRESSED_TAGS, FieldChange, changed_blocks, diff_bytes, diff_files, main  # noqa: E402
+
+PAYLOAD = bytes(range(256)) * 64
+
+
+def edit(data: bytes, offset: int, patch: bytes) -> bytes:
+    return data[:offset] + patch + data[offset + len(patch):]
+
+
+def prog_image(address: int, payload: bytes, version: int = 1) -> bytes:
+    return GblBuilder.create().application(version=version).prog(address, payload).build_to_byte_array()
+
+
+def find(diff, tag_type: GblType, occurrence: int = 0):
+    return next(tag for tag in diff.tags if tag.tag_id == tag_type.value and tag.occurrence == occurrence)
+
+
+class ChangedBlocksTest(unittest.TestCase):
+
+    def test_equal(self):
+        self.assertEqual(changed_blocks(PAYLOAD, bytes(PAYLOAD), 1024), [])
+
+    def test_blocks_are_aligned_and_merged(self):
+        new = edit(PAYLOAD, 1500, b'\xFF')
+        self.assertEqual(changed_blocks(PAYLOAD, new, 1024), [(1024, 2048)])
+        new = edit(new, 3000, b'\xFF' * 1200)
+        self.assertEqual(changed_blocks(PAYLOAD, new, 1024), [(1024, 5120)])
+        new = edit(edit(PAYLOAD, 0, b'\xFF'), 8000, b'\xFF')
+        self.assertEqual(changed_blocks(PAYLOAD, new, 1024), [(0, 1024), (7168, 8192)])
+
+    def test_length_difference(self):
+        self.assertEqual(changed_blocks(PAYLOAD, PAYLOAD + b'tail', 1024),
+                         [(len(PAYLOAD), len(PAYLOAD) + 4)])
+        self.assertEqual(changed_blocks(PAYLOAD, PAYLOAD[:1000], 1024), [(1000, len(PAYLOAD))])
+        # A changed last block merges with the tail.
+        self.assertEqual(changed_blocks(PAYLOAD, edit(PAYLOAD, 16000, b'\xFF') + b'x', 1024),
+                         [(15360, len(PAYLOAD) + 1)])
+
+    def test_partial_last_block(self):
+        old = PAYLOAD[:2500]
+        self.assertEqual(changed_blocks(old, edit(old, 2499, b'\xFF'), 1024), [(2048, 2500)])
+
+
+class DiffBytesTest(unittest.TestCase):
+
+    def test_identical(self):
+        image = prog_image(0x1000, PAYLOAD)
+        diff = diff_bytes(image, image)
+        self.assertTrue(diff.identical)
+        self.assertEqual(diff.changed(), [])
+        self.assertIn("identical", diff.format())
+
+    def test_prog_ranges_are_flash_addresses(self):
+        old = prog_image(0x1000, PAYLOAD)
+        new = prog_image(0x1000, edit(PAYLOAD, 5000, b'\xFF'))
+        prog = find(diff_bytes(old, new, 1024), GblType.PROG)
+        self.assertEqual(prog.status, 'changed')
+        self.assertTrue(prog.flash_addresses)
+        self.assertEqual(prog.ranges, [(0x1000 + 4096, 0x1000 + 5120)])
+        self.assertEqual(prog.fields, [])
+
+    def test_moved_prog_reports_field_and_payload_offsets(self):
+        old = prog_image(0x1000, PAYLOAD)
+        new = prog_image(0x2000, edit(PAYLOAD, 5000, b'\xFF'))
+        prog = find(diff_bytes(old, new, 1024), GblType.PROG)
+        self.assertEqual(prog.fields, [FieldChange('flash_start_address', 0x1000, 0x2000)])
+        self.assertFalse(prog.flash_addresses)
+        self.assertEqual(prog.ranges, [(4096, 5120)])
+
+    def test_bootloader_ranges_are_flash_addresses(self):
+        def image(payload):
+            return GblBuilder.create().bootloader(0x0102, 0x8000, payload).build_to_byte_array()
+
+        tag = find(diff_bytes(image(PAYLOAD), image(edit(PAYLOAD, 10, b'\xFF')), 1024), GblType.BOOTLOADER)
+        self.assertTrue(tag.flash_addresses)
+        self.assertEqual(tag.ranges, [(0x8000, 0x8000 + 1024)])
+        self.assertEqual(set(ADDRESSED_TAGS), {GblType.PROG.value, GblType.BOOTLOADER.value})
+
+    def test_fixed_field_change(self):
+        diff = diff_bytes(prog_image(0, PAYLOAD, 1), prog_image(0, PAYLOAD, 2))
+        application = find(diff, GblType.APPLICATION)
+        self.assertEqual(application.fields, [FieldChange('version', 1, 2)])
+        self.assertEqual(application.ranges, [])
+        self.assertEqual(find(diff, GblType.PROG).status, 'equal')
+        # The END CRC changes with the content.
+        self.assertEqual(find(diff, GblType.END).status, 'changed')
+
+    def test_added_and_removed(self):
+        old = GblBuilder.create().metadata(b'one').erase_prog().build_to_byte_array()
+        new = GblBuilder.create().metadata(b'one').prog(0, b'data').build_to_byte_array()
+        diff = diff_bytes(old, new)
+        self.assertEqual(find(diff, GblType.ERASEPROG).status, 'removed')
+        self.assertEqual(find(diff, GblType.PROG).status, 'added')
+        self.assertEqual(find(diff, GblType.METADATA).status, 'equal')
+        text = diff.format()
+        self.assertIn("- ERASEPROG[0]", text)
+        self.assertIn("+ PROG[0]", text)
+
+    def test_trailing_data(self):
+        image = prog_image(0, PAYLOAD)
+        diff = diff_bytes(image, image + b'junk')
+        self.assertTrue(diff.trailing_changed)
+        self.assertFalse(diff.identical)
+        self.assertEqual(diff.changed(), [])
+        self.assertFalse(diff_bytes(memoryview(image + b'a'), bytearray(image + b'a')).trailing_changed)
+
+    def test_to_dict(self):
+        result = diff_bytes(prog_image(0, PAYLOAD), prog_image(0, PAYLOAD, 2)).to_dict()
+        self.assertFalse(result['identical'])
+        self.assertEqual(result['old_size'], result['new_size'])
+
+
+class DiffFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def write(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.root, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_files_and_exit_codes(self):
+        old = self.write("old.gbl", prog_image(0x1000, PAYLOAD))
+        new = self.write("new.gbl", prog_image(0x1000, edit(PAYLOAD, 0, b'\xFF')))
+        empty = self.write("empty.gbl", b'')
+        self.assertEqual(find(diff_files(old, new), GblType.PROG).ranges, [(0x1000, 0x2000)])
+        self.assertEqual([tag.status for tag in diff_files(empty, old).tags], ['added'] * 4)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            codes = [main([old, old]), main([old, new, "--json"]),
+                     main([old, os.path.join(self.root, "missing.gbl")])]
+        self.assertEqual(codes, [0, 1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
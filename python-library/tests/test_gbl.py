@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Tests for gbl: byte-exact re-encoding of unmodified parses, passthrough of
+the original END tag, and a recomputed END CRC once tags are edited.
+"""
+
+import os
+import struct
+import sys
+import unittest
+import zlib
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from gbl import (Gbl, GblBuilder, GblEnd, GblType, ParseResultSuccess, TagHeader,  # noqa: E402
+                 passthrough_end_tag)
+
+ASSETS = os.path.join(HERE, os.pardir, os.pardir, "gbl-tool-cli", "src", "main", "assets")
+# Samples that end with an END tag.
+COMPLETE_SAMPLES = ["empty", "compressed_prog_gbl", "encrypted_gbl", "se_upgrade_gbl"]
+
+
+def sample(name: str) -> bytes:
+    with open(os.path.join(ASSETS, name + ".gbl"), 'rb') as f:
+        return f.read()
+
+
+def parse(image: bytes):
+    result = Gbl().parse_byte_array(image)
+    assert isinstance(result, ParseResultSuccess), result
+    return result.result_list
+
+
+def crc_valid(image: bytes) -> bool:
+    return zlib.crc32(image[:-4]) & 0xFFFFFFFF == struct.unpack_from('<I', image, len(image) - 4)[0]
+
+
+def image_with_prog() -> bytes:
+    return GblBuilder.create().application(version=7).prog(0x1000, bytes(range(64))).build_to_byte_array()
+
+
+def with_bad_crc(image: bytes) -> bytes:
+    return image[:-4] + struct.pack('<I', zlib.crc32(image[:-4]) ^ 0xFFFFFFFF)
+
+
+class PassthroughTest(unittest.TestCase):
+
+    def test_samples_encode_byte_exact(self):
+        for name in COMPLETE_SAMPLES:
+            with self.subTest(sample=name):
+                image = sample(name)
+                tags = parse(image)
+                self.assertIs(passthrough_end_tag(tags), tags[-1])
+                self.assertEqual(Gbl().encode(tags), image)
+
+    def test_unmodified_parse_keeps_wrong_crc(self):
+        image = with_bad_crc(image_with_prog())
+        self.assertEqual(Gbl().encode(parse(image)), image)
+
+    def test_edited_field_recomputes_crc(self):
+        image = with_bad_crc(image_with_prog())
+        tags = parse(image)
+        prog = next(tag for tag in tags if tag.tag_type == GblType.PROG)
+        prog.flash_start_address = 0x2000
+
+        self.assertIsNone(passthrough_end_tag(tags))
+        encoded = Gbl().encode(tags)
+        self.assertTrue(crc_valid(encoded))
+        self.assertEqual(parse(encoded)[2].flash_start_address, 0x2000)
+
+    def test_edited_payload_recomputes_crc(self):
+        tags = parse(image_with_prog())
+        prog = tags[2]
+        prog.data = b'\xAA' * 64
+        self.assertTrue(prog.is_dirty)
+        encoded = Gbl().encode(tags)
+        self.assertTrue(crc_valid(encoded))
+        self.assertEqual(parse(encoded)[2].data, b'\xAA' * 64)
+
+    def test_resized_metadata_recomputes_crc(self):
+        tags = parse(GblBuilder.create().metadata(b'old').build_to_byte_array())
+        metadata = tags[1]
+        metadata.meta_data = b'longer metadata'
+        metadata.tag_header = TagHeader(metadata.tag_header.id, len(metadata.meta_data))
+        encoded = Gbl().encode(tags)
+        self.assertTrue(crc_valid(encoded))
+        self.assertEqual(parse(encoded)[1].meta_data, b'longer metadata')
+
+    def test_mark_dirty_recomputes_same_bytes(self):
+        image = image_with_prog()
+        tags = parse(image)
+        for tag in tags:
+            tag.mark_dirty()
+        self.assertIsNone(passthrough_end_tag(tags))
+        self.assertEqual(Gbl().encode(tags), image)
+
+    def test_mark_dirty_fixes_wrong_crc(self):
+        image = image_with_prog()
+        tags = parse(with_bad_crc(image))
+        tags[-1].mark_dirty()
+        self.assertEqual(Gbl().encode(tags), image)
+
+    def test_removed_or_reordered_tags_recompute_crc(self):
+        tags = parse(image_with_prog())
+        without_application = [tag for tag in tags if tag.tag_type != GblType.APPLICATION]
+        self.assertIsNone(passthrough_end_tag(without_application))
+        self.assertTrue(crc_valid(Gbl().encode(without_application)))
+
+        reordered = [tags[0], tags[2], tags[1], tags[3]]
+        self.assertIsNone(passthrough_end_tag(reordered))
+        self.assertTrue(crc_valid(Gbl().encode(reordered)))
+
+    def test_tags_from_two_parses_recompute_crc(self):
+        image = image_with_prog()
+        first, second = parse(image), parse(image)
+        mixed = first[:2] + second[2:]
+        self.assertIsNone(passthrough_end_tag(mixed))
+        self.assertEqual(Gbl().encode(mixed), image)
+
+    def test_list_without_end_gets_one(self):
+        tags = parse(image_with_prog())[:-1]
+        encoded = Gbl().encode(tags)
+        self.assertIsInstance(parse(encoded)[-1], GblEnd)
+        self.assertTrue(crc_valid(encoded))
+
+
+class PayloadAccessorTest(unittest.TestCase):
+
+    def test_data_is_bytes_and_view_is_zero_copy(self):
+        tags = parse(image_with_prog())
+        prog = tags[2]
+        self.assertIsInstance(prog.data, bytes)
+        self.assertEqual(prog.data + b'x', bytes(range(64)) + b'x')
+        view = prog.data_view
+        self.assertIsInstance(view, memoryview)
+        self.assertEqual(view.obj, prog.tag_data)
+        self.assertEqual(bytes(view), prog.data)
+
+    def test_metadata_and_encryption_data(self):
+        tags = parse(sample("encrypted_gbl"))
+        data = next(tag for tag in tags if tag.tag_type == GblType.ENCRYPTION_DATA)
+        self.assertIsInstance(data.encrypted_gbl_data, bytes)
+        self.assertEqual(data.encrypted_gbl_data, bytes(data.tag_data))
+        self.assertEqual(bytes(data.encrypted_gbl_data_view), data.encrypted_gbl_data)
+
+        metadata = parse(GblBuilder.create().metadata(b'meta').build_to_byte_array())[1]
+        self.assertEqual(metadata.meta_data, b'meta')
+        self.assertEqual(bytes(metadata.meta_data_view), b'meta')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Tests for gbl_json: export/import round trips in every payload encoding,
+END CRC handling of loaded tags, and rejection of damaged records.
+"""
+
+import base64
+import io
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+import zlib
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from gbl import Gbl, GblBuilder, GblType  # noqa: E402
+from gbl_json import export_bytes, export_file, export_tags, load_builder, load_tags  # noqa: E402
+
+ASSETS = os.path.join(HERE, os.pardir, os.pardir, "gbl-tool-cli", "src", "main", "assets")
+
+
+def builder() -> GblBuilder:
+    return GblBuilder.create().application(version=5).prog(0x1000, bytes(range(100))).metadata(b'json')
+
+
+def with_bad_crc(image: bytes) -> bytes:
+    return image[:-4] + struct.pack('<I', zlib.crc32(image[:-4]) ^ 0xFFFFFFFF)
+
+
+def crc_valid(image: bytes) -> bool:
+    return zlib.crc32(image[:-4]) & 0xFFFFFFFF == struct.unpack_from('<I', image, len(image) - 4)[0]
+
+
+def export(image: bytes, **kwargs) -> str:
+    out = io.StringIO()
+    export_bytes(image, out, **kwargs)
+    return out.getvalue()
+
+
+def load(text: str, **kwargs):
+    return list(load_tags(io.StringIO(text), **kwargs))
+
+
+def edit_records(text: str, edit) -> str:
+    """Applies edit to every record of an NDJSON export."""
+    records = [json.loads(line) for line in text.splitlines()]
+    for record in records:
+        edit(record)
+    return "".join(json.dumps(record) + "\n" for record in records)
+
+
+class RoundTripTest(unittest.TestCase):
+
+    def test_encodings_and_chunk_sizes(self):
+        image = builder().build_to_byte_array()
+        for ndjson in (False, True):
+            for payload in ("base64", "hex"):
+                for chunk_size in (1, 5, 64):
+                    with self.subTest(ndjson=ndjson, payload=payload, chunk_size=chunk_size):
+                        text = export(image, ndjson=ndjson, payload=payload, chunk_size=chunk_size)
+                        self.assertEqual(Gbl().encode(load(text, ndjson=ndjson)), image)
+
+    def test_samples(self):
+        for name in sorted(os.listdir(ASSETS)):
+            with open(os.path.join(ASSETS, name), 'rb') as f:
+                image = f.read()
+            with self.subTest(sample=name):
+                tags = load(export(image, ndjson=True), ndjson=True, passthrough=True)
+                parsed = Gbl().parse_byte_array(image).result_list
+                self.assertEqual([bytes(tag.tag_data) for tag in tags], [bytes(tag.tag_data) for tag in parsed])
+
+    def test_records(self):
+        text = export(builder().build_to_byte_array(), ndjson=True)
+        records = [json.loads(line) for line in text.splitlines()]
+        self.assertEqual([record["tag_type"] for record in records],
+                         ["HEADER_V3", "APPLICATION", "METADATA", "PROG", "END"])
+        self.assertEqual([record["position"] for record in records], list(range(5)))
+        self.assertEqual(records[0]["offset"], 0)
+        self.assertEqual(records[3]["fields"], {"flash_start_address": 0x1000})
+        self.assertEqual(base64.b64decode(records[2]["payload"]), b'json')
+
+    def test_export_tags_matches_export_bytes(self):
+        image = builder().build_to_byte_array()
+        out = io.StringIO()
+        export_tags(Gbl().parse_byte_array(image).result_list, out, ndjson=True)
+        self.assertEqual(out.getvalue(), export(image, ndjson=True))
+
+    def test_export_file(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        for name, image in (("image.gbl", builder().build_to_byte_array()), ("empty.gbl", b'')):
+            path = os.path.join(root, name)
+            with open(path, 'wb') as f:
+                f.write(image)
+            out = io.StringIO()
+            export_file(path, out)
+            self.assertEqual(out.getvalue(), export(image))
+
+    def test_load_builder(self):
+        text = export(builder().build_to_byte_array())
+        self.assertEqual(load_builder(io.StringIO(text)).build_to_byte_array(), builder().build_to_byte_array())
+
+
+class EndCrcTest(unittest.TestCase):
+
+    def test_recomputed_by_default(self):
+        image = with_bad_crc(builder().build_to_byte_array())
+        encoded = Gbl().encode(load(export(image)))
+        self.assertTrue(crc_valid(encoded))
+        self.assertEqual(encoded[:-4], image[:-4])
+
+    def test_passthrough_keeps_original_bytes(self):
+        image = with_bad_crc(builder().build_to_byte_array())
+        self.assertEqual(Gbl().encode(load(export(image), passthrough=True)), image)
+
+    def test_edited_payload_is_recomputed(self):
+        image = with_bad_crc(builder().build_to_byte_array())
+
+        def edit(record):
+            if record["tag_type"] == "METADATA":
+                record["payload"] = base64.b64encode(b'JSON').decode('ascii')
+                del record["sha256"]
+
+        text = edit_records(export(image, ndjson=True), edit)
+        for passthrough in (False, True):
+            with self.subTest(passthrough=passthrough):
+                encoded = Gbl().encode(load(text, ndjson=True, passthrough=passthrough))
+                self.assertTrue(crc_valid(encoded))
+                metadata = Gbl().parse_byte_array(encoded).result_list[2]
+                self.assertEqual(metadata.tag_type, GblType.METADATA)
+                self.assertEqual(metadata.meta_data, b'JSON')
+
+    def test_record_without_offset_is_recomputed(self):
+        image = with_bad_crc(builder().build_to_byte_array())
+        text = edit_records(export(image, ndjson=True), lambda record: record.update(offset=None))
+        self.assertTrue(crc_valid(Gbl().encode(load(text, ndjson=True, passthrough=True))))
+
+
+class RejectTest(unittest.TestCase):
+
+    def assert_rejected(self, text: str, message: str, ndjson: bool = True):
+        with self.assertRaisesRegex(ValueError, message):
+            load(text, ndjson=ndjson)
+
+    def test_hash_mismatch(self):
+        def edit(record):
+            if record["tag_type"] == "METADATA":
+                record["payload"] = base64.b64encode(b'JSON').decode('ascii')
+
+        self.assert_rejected(edit_records(export(builder().build_to_byte_array(), ndjson=True), edit),
+                             "sha256 mismatch")
+
+    def test_length_mismatch(self):
+        def edit(record):
+            if record["tag_type"] == "METADATA":
+                record["length"] += 1
+
+        self.assert_rejected(edit_records(export(builder().build_to_byte_array(), ndjson=True), edit),
+                             "expected 5")
+
+    def test_hash_only_export(self):
+        self.assert_rejected(export(builder().build_to_byte_array(), ndjson=True, payload="hash"),
+                             "without its payload")
+
+    def test_document_header(self):
+        self.assert_rejected('{"format": "other", "tags": []}', "Not a gbl-json document", ndjson=False)
+        self.assert_rejected('{"format": "gbl-json", "version": 99, "tags": []}', "version", ndjson=False)
+
+    def test_unknown_encoding(self):
+        with self.assertRaises(ValueError):
+            export(builder().build_to_byte_array(), payload="base32")
+
+
+if __name__ == "__main__":
+    unittest.main()
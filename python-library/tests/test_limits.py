@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests for ParseLimits: every limit is rejected with its name and offset by
+each parser, and tag lengths are checked before payloads are copied.
+"""
+
+import os
+import struct
+import sys
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from gbl import (Gbl, GblBuilder, ParseLimitError, ParseLimits, ParseResultFatal,  # noqa: E402
+                 ParseResultSuccess, TagStreamParser, recover_tags, scan_tags)
+
+METADATA_ID = 0xF40A0AF4
+
+
+def image_with_metadata(count: int, size: int = 16) -> bytes:
+    builder = GblBuilder.create()
+    for i in range(count):
+        builder.metadata(bytes([i]) * size)
+    return builder.build_to_byte_array()
+
+
+def fatal_error(result) -> ParseLimitError:
+    assert isinstance(result, ParseResultFatal), result
+    assert isinstance(result.error, ParseLimitError), result.error
+    return result.error
+
+
+class ParseByteArrayTest(unittest.TestCase):
+
+    def test_no_limits_by_default(self):
+        result = Gbl().parse_byte_array(image_with_metadata(100))
+        self.assertIsInstance(result, ParseResultSuccess)
+        self.assertEqual(len(result.result_list), 102)
+
+    def test_max_tags(self):
+        image = image_with_metadata(10)
+        error = fatal_error(Gbl().parse_byte_array(image, ParseLimits(max_tags=5)))
+        self.assertEqual(error.limit, 'max_tags')
+        self.assertEqual(error.maximum, 5)
+        # The sixth tag: header (8 + 8) then four metadata tags of 8 + 16 bytes.
+        self.assertEqual(error.offset, 16 + 4 * 24)
+
+        result = Gbl().parse_byte_array(image, ParseLimits(max_tags=12))
+        self.assertIsInstance(result, ParseResultSuccess)
+
+    def test_max_total_bytes(self):
+        error = fatal_error(Gbl().parse_byte_array(image_with_metadata(10), ParseLimits(max_total_bytes=100)))
+        self.assertEqual(error.limit, 'max_total_bytes')
+        self.assertGreater(error.value, 100)
+
+    def test_max_tag_length(self):
+        image = image_with_metadata(3, size=4096)
+        error = fatal_error(Gbl().parse_byte_array(image, ParseLimits(max_tag_length=1024)))
+        self.assertEqual(error.limit, 'max_tag_length')
+        self.assertEqual(error.value, 4096)
+        self.assertEqual(error.offset, 16)
+
+    def test_limits_from_constructor(self):
+        image = image_with_metadata(10)
+        self.assertIsInstance(Gbl(limits=ParseLimits(max_tags=5)).parse_byte_array(image), ParseResultFatal)
+        # An explicit argument replaces the constructor limits.
+        result = Gbl(limits=ParseLimits(max_tags=5)).parse_byte_array(image, ParseLimits(max_tags=50))
+        self.assertIsInstance(result, ParseResultSuccess)
+
+    def test_deadline_checked_on_first_tag(self):
+        error = fatal_error(Gbl().parse_byte_array(image_with_metadata(1), ParseLimits(deadline=-1.0)))
+        self.assertEqual(error.limit, 'deadline')
+        self.assertEqual(error.offset, 0)
+
+    def test_truncated_tag_is_not_a_limit_error(self):
+        image = image_with_metadata(1) + struct.pack('<II', METADATA_ID, 1 << 30)
+        result = Gbl().parse_byte_array(image, ParseLimits(max_tag_length=1024))
+        self.assertIsInstance(result, ParseResultSuccess)
+        self.assertEqual(result.stopped_at, len(image) - 8)
+
+
+class OtherParsersTest(unittest.TestCase):
+
+    def test_scan_tags(self):
+        with self.assertRaises(ParseLimitError) as context:
+            scan_tags(image_with_metadata(10), limits=ParseLimits(max_tags=3))
+        self.assertEqual(context.exception.limit, 'max_tags')
+
+    def test_recover(self):
+        image = image_with_metadata(10)
+        with self.assertRaises(ParseLimitError) as context:
+            recover_tags(image, ParseLimits(max_total_bytes=50))
+        self.assertEqual(context.exception.limit, 'max_total_bytes')
+        self.assertEqual(fatal_error(Gbl().recover_byte_array(image, ParseLimits(max_tags=3))).limit, 'max_tags')
+
+    def test_index(self):
+        error = fatal_error(Gbl().index_byte_array(image_with_metadata(10), ParseLimits(max_tags=3)))
+        self.assertEqual(error.limit, 'max_tags')
+
+    def test_stream_checks_header_before_payload(self):
+        parser = TagStreamParser(ParseLimits(max_tag_length=1024))
+        header = image_with_metadata(0)[:16]
+        self.assertEqual(len(parser.feed(header)), 1)
+        with self.assertRaises(ParseLimitError) as context:
+            parser.feed(struct.pack('<II', METADATA_ID, 1 << 30))
+        self.assertEqual(context.exception.limit, 'max_tag_length')
+        self.assertEqual(context.exception.offset, 16)
+
+    def test_stream_max_tags(self):
+        parser = TagStreamParser(ParseLimits(max_tags=3))
+        with self.assertRaises(ParseLimitError):
+            for byte in image_with_metadata(10):
+                parser.feed(bytes([byte]))
+        self.assertEqual(parser.offset, 16 + 2 * 24)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Tests for recovery parsing: recover_tags and Gbl.recover_byte_array on
+clean, truncated and corrupted images.
+"""
+
+import os
+import struct
+import sys
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from gbl import (Gbl, GblBuilder, GblType, ParseResultFatal, ParseResultRecovered,  # noqa: E402
+                 recover_tags)
+
+# Tag boundaries of image(): header, application, metadata, prog and END.
+HEADER, APPLICATION, METADATA, PROG, END, SIZE = 0, 16, 37, 61, 85, 97
+
+
+def image() -> bytes:
+    return (GblBuilder.create().application(version=1)
+            .metadata(b'\x11' * 16).prog(0x1000, b'\x22' * 12).build_to_byte_array())
+
+
+def tag_types(tags):
+    return [tag.tag_type for tag in tags]
+
+
+ALL_TYPES = [GblType.HEADER_V3, GblType.APPLICATION, GblType.METADATA, GblType.PROG, GblType.END]
+
+
+class RecoverTagsTest(unittest.TestCase):
+
+    def test_layout(self):
+        self.assertEqual(len(image()), SIZE)
+
+    def test_clean_image(self):
+        data = image()
+        tags, damaged = recover_tags(data)
+        self.assertEqual(damaged, [])
+        self.assertEqual(tag_types(tags), ALL_TYPES)
+        # Recovered tags carry their origin, so they pass through unchanged.
+        self.assertEqual(Gbl().encode(tags), data)
+
+    def test_garbage_between_tags(self):
+        data = image()
+        data = data[:METADATA] + b'\xAB' * 10 + data[METADATA:]
+        tags, damaged = recover_tags(data)
+        self.assertEqual(damaged, [(METADATA, METADATA + 10)])
+        self.assertEqual(tag_types(tags), ALL_TYPES)
+        self.assertEqual(tags[2].meta_data, b'\x11' * 16)
+
+    def test_corrupted_length(self):
+        data = bytearray(image())
+        struct.pack_into('<I', data, METADATA + 4, 0xFFFF)
+        tags, damaged = recover_tags(bytes(data))
+        self.assertEqual(damaged, [(METADATA, PROG)])
+        self.assertEqual(tag_types(tags), ALL_TYPES[:2] + ALL_TYPES[3:])
+        self.assertEqual(tags[2].data, b'\x22' * 12)
+
+    def test_truncated(self):
+        data = image()[:-6]
+        tags, damaged = recover_tags(data)
+        self.assertEqual(damaged, [(END, SIZE - 6)])
+        self.assertEqual(tag_types(tags), ALL_TYPES[:-1])
+
+    def test_leading_garbage(self):
+        data = b'\x00' * 5 + image()
+        tags, damaged = recover_tags(data)
+        self.assertEqual(damaged, [(0, 5)])
+        self.assertEqual(tag_types(tags), ALL_TYPES)
+
+    def test_only_inconsistent_tag_ids(self):
+        # Known tag ids with lengths that never fit are not resynchronized on.
+        data = (struct.pack('<II', GblType.PROG.value, 0xFFFFFF00) + bytes(8)) * 64
+        tags, damaged = recover_tags(data)
+        self.assertEqual(tags, [])
+        self.assertEqual(damaged, [(0, len(data))])
+
+    def test_memoryview_input(self):
+        data = image()
+        data = data[:METADATA] + b'\xAB' * 10 + data[METADATA:]
+        self.assertEqual(recover_tags(memoryview(data))[1], recover_tags(data)[1])
+
+
+class RecoverByteArrayTest(unittest.TestCase):
+
+    def test_result(self):
+        data = image()[:-6]
+        result = Gbl().recover_byte_array(data)
+        self.assertIsInstance(result, ParseResultRecovered)
+        self.assertEqual(result.damaged_ranges, [(END, SIZE - 6)])
+        self.assertEqual(result.stopped_at, END)
+        self.assertEqual(result.stop_reason, "1 damaged range(s)")
+
+    def test_clean_result(self):
+        result = Gbl().recover_byte_array(image())
+        self.assertIsInstance(result, ParseResultRecovered)
+        self.assertIsNone(result.stopped_at)
+        self.assertIsNone(result.stop_reason)
+
+    def test_too_small(self):
+        self.assertIsInstance(Gbl().recover_byte_array(b'\x00' * 4), ParseResultFatal)
+
+    def test_parse_reports_where_it_stopped(self):
+        data = image()
+        data = data[:METADATA] + b'\xAB' * 10 + data[METADATA:]
+        result = Gbl().parse_byte_array(data)
+        self.assertEqual(result.stopped_at, METADATA)
+        self.assertIsNotNone(result.stop_reason)
+        self.assertEqual(tag_types(result.result_list), ALL_TYPES[:2])
+
+
+if __name__ == "__main__":
+    unittest.main()
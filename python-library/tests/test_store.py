@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Tests for GblStore: put/get round trips with fixed and content-defined
+chunking, deduplication across releases, and damage detection.
+"""
+
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+import zlib
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from gbl import GblBuilder  # noqa: E402
+from gbl_store import GblStore, StoreError, content_defined_chunks, fixed_chunks  # noqa: E402
+
+ASSETS = os.path.join(HERE, os.pardir, os.pardir, "gbl-tool-cli", "src", "main", "assets")
+
+
+def firmware(seed: int, size: int) -> bytes:
+    return random.Random(seed).getrandbits(size * 8).to_bytes(size, 'little')
+
+
+def release(address: int, payload: bytes, version: int = 1) -> bytes:
+    return (GblBuilder.create().application(version=version).prog(address, payload)
+            .metadata(b'release %d' % version).build_to_byte_array())
+
+
+class StoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def open(self, **kwargs) -> GblStore:
+        store = GblStore(os.path.join(self.root, "store"), **kwargs)
+        self.addCleanup(store.close)
+        return store
+
+
+class RoundTripTest(StoreTestCase):
+
+    def test_samples(self):
+        for chunking in ("fixed", "cdc"):
+            store = self.open(chunk_size=256, chunking=chunking, inline_limit=16)
+            for name in sorted(os.listdir(ASSETS)):
+                with open(os.path.join(ASSETS, name), 'rb') as f:
+                    data = f.read()
+                with self.subTest(chunking=chunking, sample=name):
+                    store.put(chunking + name, data)
+                    self.assertEqual(store.get_bytes(chunking + name, verify_chunks=True), data)
+
+    def test_put_path(self):
+        store = self.open()
+        path = os.path.join(self.root, "image.gbl")
+        data = release(0x1000, firmware(1, 50000))
+        for name, content in (("image", data), ("empty", b'')):
+            with open(path, 'wb') as f:
+                f.write(content)
+            stats = store.put(name, path)
+            self.assertEqual(stats.size, len(content))
+            self.assertEqual(store.get_bytes(name), content)
+
+    def test_get_file(self):
+        store = self.open()
+        data = release(0x1000, firmware(1, 20000))
+        store.put("image", data)
+        path = os.path.join(self.root, "out.gbl")
+        self.assertEqual(store.get_file("image", path), len(data))
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), data)
+        self.assertEqual(sorted(os.listdir(self.root)), ["out.gbl", "store"])
+
+    def test_original_bytes_kept(self):
+        store = self.open(chunk_size=1024)
+        data = release(0x1000, firmware(2, 10000))
+        # Wrong END CRC, then a second END tag and trailing bytes.
+        bad_crc = data[:-4] + struct.pack('<I', zlib.crc32(data[:-4]) ^ 1)
+        odd = bad_crc + data[-12:] + b'trailing'
+        for name, content in (("bad_crc", bad_crc), ("odd", odd)):
+            store.put(name, content)
+            self.assertEqual(store.get_bytes(name), content)
+
+    def test_names_delete_and_missing(self):
+        store = self.open()
+        store.put("b", release(0, b'b' * 1000))
+        store.put("a", release(0, b'a' * 1000))
+        self.assertEqual(store.names(), ["a", "b"])
+        self.assertTrue(store.delete("a"))
+        self.assertFalse(store.delete("a"))
+        self.assertEqual(store.names(), ["b"])
+        with self.assertRaises(KeyError):
+            store.get_bytes("a")
+
+    def test_reopen(self):
+        data = release(0x1000, firmware(3, 30000))
+        with GblStore(os.path.join(self.root, "store")) as store:
+            store.put("image", data)
+        self.assertEqual(self.open().get_bytes("image"), data)
+
+    def test_unknown_chunking(self):
+        with self.assertRaises(ValueError):
+            GblStore(os.path.join(self.root, "store"), chunking="rabin")
+
+
+class DeduplicationTest(StoreTestCase):
+
+    def test_same_payload_at_new_address(self):
+        payload = firmware(4, 64 * 1024)
+        store = self.open(chunk_size=4096)
+        first = store.put("v1", release(0x1000, payload, 1))
+        second = store.put("v2", release(0x8000, payload, 2))
+        self.assertEqual(first.new_chunks, 16)
+        self.assertEqual(second.chunks, 16)
+        self.assertEqual(second.new_chunks, 0)
+        stats = store.stats()
+        self.assertEqual(stats.files, 2)
+        self.assertEqual(stats.stored_bytes, len(payload))
+        self.assertEqual(store.get_bytes("v2"), release(0x8000, payload, 2))
+
+    def test_cdc_survives_insertion(self):
+        payload = firmware(5, 64 * 1024)
+        shifted = payload[:1000] + b'inserted' + payload[1000:]
+        fixed = self.open(chunk_size=4096)
+        fixed.put("v1", release(0, payload))
+        fixed_stats = fixed.put("v2", release(0, shifted))
+        fixed.close()
+
+        shutil.rmtree(os.path.join(self.root, "store"))
+        cdc = self.open(chunk_size=4096, chunking="cdc")
+        cdc.put("v1", release(0, payload))
+        cdc_stats = cdc.put("v2", release(0, shifted))
+
+        self.assertEqual(fixed_stats.new_chunks, fixed_stats.chunks)
+        self.assertLess(cdc_stats.new_bytes, len(payload) // 4)
+        self.assertEqual(cdc.get_bytes("v2", verify_chunks=True), release(0, shifted))
+
+
+class DamageTest(StoreTestCase):
+
+    def corrupt_pack(self):
+        packs = os.path.join(self.root, "store", "packs")
+        path = os.path.join(packs, sorted(os.listdir(packs))[0])
+        with open(path, 'r+b') as f:
+            f.seek(100)
+            byte = f.read(1)
+            f.seek(100)
+            f.write(bytes([byte[0] ^ 0xFF]))
+
+    def test_corrupted_chunk(self):
+        store = self.open(chunk_size=1024)
+        store.put("image", release(0, firmware(6, 10000)))
+        self.corrupt_pack()
+        with self.assertRaises(StoreError):
+            store.get_bytes("image")
+        with self.assertRaisesRegex(StoreError, "corrupted"):
+            store.get_bytes("image", verify_chunks=True)
+
+    def test_get_file_leaves_nothing_on_error(self):
+        store = self.open(chunk_size=1024)
+        store.put("image", release(0, firmware(7, 10000)))
+        self.corrupt_pack()
+        path = os.path.join(self.root, "out.gbl")
+        with self.assertRaises(StoreError):
+            store.get_file("image", path)
+        self.assertEqual(sorted(os.listdir(self.root)), ["store"])
+
+
+class ChunkingTest(unittest.TestCase):
+
+    def test_chunks_cover_payload(self):
+        payload = memoryview(firmware(8, 100000))
+        for split in (fixed_chunks, content_defined_chunks):
+            with self.subTest(split=split.__name__):
+                chunks = split(payload, 4096)
+                self.assertEqual(b''.join(chunks), payload)
+                self.assertEqual(split(memoryview(b''), 4096), [])
+
+    def test_cdc_bounds(self):
+        chunks = content_defined_chunks(memoryview(firmware(9, 200000)), 4096)
+        for chunk in chunks[:-1]:
+            self.assertGreaterEqual(len(chunk), 1024)
+            self.assertLessEqual(len(chunk), 4 * 4096)
+
+
+if __name__ == "__main__":
+    unittest.main()
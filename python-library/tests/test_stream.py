@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Tests for incremental parsing: TagStreamParser fed in pieces split at every
+byte, and the asyncio parse_stream / write_tags / write_builder API.
+"""
+
+import asyncio
+import os
+import struct
+import sys
+import unittest
+import zlib
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from gbl import (Gbl, GblBuilder, GblType, ParseLimits, ParseResultFatal,  # noqa: E402
+                 ParseResultSuccess, TagStreamParser, passthrough_end_tag)
+from gbl_async import parse_stream, write_builder, write_tags  # noqa: E402
+
+ASSETS = os.path.join(HERE, os.pardir, os.pardir, "gbl-tool-cli", "src", "main", "assets")
+
+
+def builder() -> GblBuilder:
+    return (GblBuilder.create().application(version=3).prog(0x1000, bytes(range(200)))
+            .metadata(b'stream').erase_prog())
+
+
+def image_with_bad_crc() -> bytes:
+    # A wrong END CRC only survives encoding when every tag keeps its source offset.
+    image = builder().build_to_byte_array()
+    return image[:-4] + struct.pack('<I', zlib.crc32(image[:-4]) ^ 0xFFFFFFFF)
+
+
+def encoded(tags):
+    return [(tag.tag_header.id, bytes(tag.tag_data)) for tag in tags]
+
+
+def feed_pieces(data: bytes, cuts, large_tag_size=None):
+    parser = TagStreamParser()
+    if large_tag_size is not None:
+        parser.LARGE_TAG_SIZE = large_tag_size
+    tags = []
+    start = 0
+    for cut in list(cuts) + [len(data)]:
+        tags += parser.feed(data[start:cut])
+        start = cut
+    parser.close()
+    return parser, tags
+
+
+class BytesWriter:
+    """Collects what is written, in the shape of an asyncio.StreamWriter."""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.drains = 0
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        self.drains += 1
+
+
+def reader_for(data: bytes) -> asyncio.StreamReader:
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+def parse(data: bytes, **kwargs):
+    async def run():
+        return await parse_stream(reader_for(data), **kwargs)
+    return asyncio.run(run())
+
+
+def write(func, *args, **kwargs) -> BytesWriter:
+    writer = BytesWriter()
+
+    async def run():
+        written = await func(writer, *args, **kwargs)
+        assert written == len(writer.data)
+    asyncio.run(run())
+    return writer
+
+
+class TagStreamParserTest(unittest.TestCase):
+
+    def test_split_at_every_byte(self):
+        data = image_with_bad_crc()
+        expected = encoded(Gbl().parse_byte_array(data).result_list)
+        for large_tag_size in (None, 16):
+            for cut in range(len(data) + 1):
+                with self.subTest(cut=cut, large_tag_size=large_tag_size):
+                    parser, tags = feed_pieces(data, [cut], large_tag_size)
+                    self.assertIsNone(parser.stop_reason)
+                    self.assertEqual(parser.offset, len(data))
+                    self.assertEqual(encoded(tags), expected)
+                    self.assertEqual(Gbl().encode(tags), data)
+
+    def test_one_byte_at_a_time(self):
+        data = image_with_bad_crc()
+        for large_tag_size in (None, 16):
+            with self.subTest(large_tag_size=large_tag_size):
+                parser, tags = feed_pieces(data, range(1, len(data)), large_tag_size)
+                self.assertIsNotNone(passthrough_end_tag(tags))
+                self.assertEqual(Gbl().encode(tags), data)
+
+    def test_samples(self):
+        for name in sorted(os.listdir(ASSETS)):
+            with open(os.path.join(ASSETS, name), 'rb') as f:
+                data = f.read()
+            with self.subTest(sample=name):
+                result = Gbl().parse_byte_array(data)
+                parser, tags = feed_pieces(data, range(7, len(data), 7))
+                self.assertEqual(encoded(tags), encoded(result.result_list))
+                self.assertEqual(parser.stop_reason, result.stop_reason)
+                self.assertEqual(parser.stopped_at, result.stopped_at)
+
+    def test_truncated_stream(self):
+        data = image_with_bad_crc()[:-3]
+        parser, tags = feed_pieces(data, [10, 50])
+        self.assertEqual(parser.stop_reason, "Invalid tag length: 4")
+        self.assertEqual(parser.stopped_at, len(data) - 9)
+        self.assertNotIn(GblType.END, [tag.tag_type for tag in tags])
+
+    def test_feed_after_close(self):
+        parser = TagStreamParser()
+        parser.close()
+        with self.assertRaises(ValueError):
+            parser.feed(b'\x00')
+
+    def test_signed_digest_matches_parse(self):
+        data = builder().signature_ecdsa_p256(1, 2).build_to_byte_array()
+        parser = TagStreamParser(signed_digest=True)
+        for start in range(0, len(data), 5):
+            parser.feed(data[start:start + 5])
+        parser.close()
+        self.assertEqual(parser.signed_digest, Gbl(signed_digest=True).parse_byte_array(data).signed_digest)
+        self.assertIsNotNone(parser.signed_digest)
+
+
+class AsyncTest(unittest.TestCase):
+
+    def test_parse_stream(self):
+        data = image_with_bad_crc()
+        for chunk_size in (1, 13, 64 * 1024):
+            with self.subTest(chunk_size=chunk_size):
+                result = parse(data, chunk_size=chunk_size, threshold=0)
+                self.assertIsInstance(result, ParseResultSuccess)
+                self.assertIsNone(result.stop_reason)
+                self.assertEqual(Gbl().encode(result.result_list), data)
+
+    def test_parse_stream_errors(self):
+        self.assertIsInstance(parse(b'\x00' * 4), ParseResultFatal)
+        result = parse(image_with_bad_crc(), limits=ParseLimits(max_tags=2))
+        self.assertIsInstance(result, ParseResultFatal)
+        self.assertEqual(result.error.limit, 'max_tags')
+
+    def test_parse_stream_signed_digest(self):
+        data = builder().signature_ecdsa_p256(1, 2).build_to_byte_array()
+        result = parse(data, chunk_size=9, signed_digest=True)
+        self.assertIsNotNone(result.signed_digest)
+        self.assertEqual(result.signed_digest, Gbl(signed_digest=True).parse_byte_array(data).signed_digest)
+
+    def test_write_builder_matches_build(self):
+        writer = write(write_builder, builder(), chunk_size=16)
+        self.assertEqual(bytes(writer.data), builder().build_to_byte_array())
+        self.assertGreater(writer.drains, 1)
+
+    def test_write_tags_passes_end_through(self):
+        data = image_with_bad_crc()
+        tags = Gbl().parse_byte_array(data).result_list
+        self.assertEqual(bytes(write(write_tags, tags, threshold=0).data), data)
+
+    def test_write_tags_recomputes_end_after_edit(self):
+        tags = Gbl().parse_byte_array(image_with_bad_crc()).result_list
+        next(tag for tag in tags if tag.tag_type == GblType.PROG).flash_start_address = 0x2000
+        data = bytes(write(write_tags, tags).data)
+        self.assertEqual(data, Gbl().encode(tags))
+        self.assertEqual(struct.unpack('<I', data[-4:])[0], zlib.crc32(data[:-4]))
+
+    def test_write_tags_signer(self):
+        digests = []
+
+        async def signer(digest):
+            digests.append(digest)
+            return 1, 2
+
+        data = bytes(write(write_tags, builder().get(), signer=signer).data)
+        result = Gbl(signed_digest=True).parse_byte_array(data)
+        self.assertEqual(digests, [result.signed_digest])
+        signature = result.result_list[-2]
+        self.assertEqual(signature.tag_type, GblType.SIGNATURE_ECDSA_P256)
+        self.assertEqual((signature.r, signature.s), (1, 2))
+        self.assertEqual(struct.unpack('<I', data[-4:])[0], zlib.crc32(data[:-4]))
+
+
+if __name__ == "__main__":
+    unittest.main()